@@ -0,0 +1,330 @@
+import importlib.util
+
+np = None  # numpy is imported when the analytics window first loads data
+
+import perf
+from db import require_connection
+from filters import as_date
+
+
+# ================== Sales / Purchase Analytics ==================
+# Trend series and top products for a date range, computed from the daily
+# roll-up (schema v5: one row per day / product / type, archived months
+# included), so millions of transactions arrive as a few thousand rows.
+# Those rows become numpy columns; resampling to days / weeks / months and
+# grouping by type or product is integer arithmetic on the day column plus
+# one np.bincount, no Python loop per row.  Changing frequency, metric or
+# product in the window recomputes in memory without going back to the DB.
+
+FREQUENCIES = ("day", "week", "month")
+METRICS = ("amount", "qty", "count")
+TOP_N = 10
+FETCH_CHUNK = 20000
+
+ROLLUP_SQL = """
+    SELECT day, product, transaction_type, cnt, qty, amount
+    FROM daily_rollup
+    WHERE day BETWEEN %s AND %s AND cnt <> 0
+"""
+
+
+def available():
+    return importlib.util.find_spec("numpy") is not None
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+def _codes(values, names, codes):
+    # Interned integer code per string, names[code] -> string
+    out = []
+    for value in values:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(names)
+            names.append(value)
+        out.append(code)
+    return out
+
+
+class RollupFrame:
+    # Columns of the roll-up rows between start and end (inclusive)
+
+    def __init__(self, start, end):
+        self.start = as_date(start)
+        self.end = as_date(end)
+        self.products, self.types = [], []
+        self.days = self.product_codes = self.type_codes = None
+        self.columns = {}
+
+    @classmethod
+    def fetch(cls, start, end):
+        # Worker side
+        _load_numpy()
+        frame = cls(start, end)
+        days, products, types, count, qty, amount = [], [], [], [], [], []
+        product_codes, type_codes = {}, {}
+
+        with perf.span("analytics.fetch") as span:
+            conn = require_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(ROLLUP_SQL, (frame.start, frame.end))
+                while True:
+                    rows = cursor.fetchmany(FETCH_CHUNK)
+                    if not rows:
+                        break
+                    batch_days, batch_products, batch_types, batch_count, batch_qty, batch_amount = zip(*rows)
+                    days += [str(day)[:10] for day in batch_days]
+                    products += _codes(batch_products, frame.products, product_codes)
+                    types += _codes(batch_types, frame.types, type_codes)
+                    count += batch_count
+                    qty += batch_qty
+                    amount += [float(value) for value in batch_amount]
+            finally:
+                conn.close()
+            span.rows = len(days)
+
+        frame.days = np.array(days, dtype="datetime64[D]")
+        frame.product_codes = np.array(products, dtype=np.int32)
+        frame.type_codes = np.array(types, dtype=np.int32)
+        frame.columns = {
+            "count": np.array(count, dtype=np.float64),
+            "qty": np.array(qty, dtype=np.float64),
+            "amount": np.array(amount, dtype=np.float64),
+        }
+        return frame
+
+    def __len__(self):
+        return 0 if self.days is None else len(self.days)
+
+    # ---- resampling ----
+    def _buckets(self, days, freq):
+        # Period start for each day: the day itself, its Monday, or its month
+        if freq == "day":
+            return days
+        if freq == "week":
+            weekday = (days.astype(np.int64) + 3) % 7   # 1970-01-01 was a Thursday
+            return days - weekday.astype("timedelta64[D]")
+        return days.astype("datetime64[M]")
+
+    def periods(self, freq):
+        # Every period start in the range (empty ones included, so lines don't skip)
+        first, last = self._buckets(np.array([self.start, self.end], dtype="datetime64[D]"), freq)
+        step = 7 if freq == "week" else 1
+        return np.arange(first, last + step, step)
+
+    def _period_index(self, freq, periods):
+        buckets = self._buckets(self.days, freq)
+        offset = (buckets - periods[0]).astype(np.int64)
+        return offset // 7 if freq == "week" else offset
+
+    def series(self, freq="day", metric="amount", by="type", product=None):
+        # -> (period start dates, {label: values per period})
+        # by="type": Sale / Purchase lines (optionally for one product)
+        # by="product": one line per top product (by the same metric)
+        _load_numpy()
+        periods = self.periods(freq)
+        if not len(self):
+            return [p.astype(object) for p in periods.astype("datetime64[D]")], {}
+
+        with perf.span("analytics.series", len(self)):
+            mask = np.ones(len(self), dtype=bool)
+            if product is not None:
+                if product not in self.products:
+                    mask[:] = False
+                else:
+                    mask &= self.product_codes == self.products.index(product)
+
+            if by == "type":
+                labels, codes = self.types, self.type_codes
+                keep = list(range(len(labels)))
+            else:
+                labels, codes = self.products, self.product_codes
+                keep = [self.products.index(name) for name, _ in self.top_products(TOP_N, metric)]
+
+            index = self._period_index(freq, periods)[mask]
+            values = self.columns[metric][mask]
+            width = len(periods)
+            grid = np.bincount(codes[mask].astype(np.int64) * width + index,
+                               weights=values, minlength=len(labels) * width).reshape(len(labels), width)
+
+        dates = [p.astype(object) for p in periods.astype("datetime64[D]")]
+        return dates, {labels[code]: grid[code] for code in keep}
+
+    def top_products(self, n=TOP_N, metric="amount", trans_type="Sale"):
+        # [(product, total)] largest first
+        _load_numpy()
+        if not len(self) or trans_type not in self.types:
+            return []
+        mask = self.type_codes == self.types.index(trans_type)
+        totals = np.bincount(self.product_codes[mask], weights=self.columns[metric][mask],
+                             minlength=len(self.products))
+        order = np.argsort(totals)[::-1][:n]
+        return [(self.products[code], float(totals[code])) for code in order if totals[code] > 0]
+
+    def totals(self, metric="amount"):
+        # {transaction_type: total} for the range
+        _load_numpy()
+        if not len(self):
+            return {}
+        sums = np.bincount(self.type_codes, weights=self.columns[metric], minlength=len(self.types))
+        return {name: float(sums[code]) for code, name in enumerate(self.types)}
+
+
+# ---------------- Charts (Tk canvas) ----------------
+COLORS = ("#1f77b4", "#d62728", "#2ca02c", "#ff7f0e", "#9467bd",
+          "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf")
+TYPE_COLORS = {"Sale": "blue", "Purchase": "green"}
+
+
+def _label(value):
+    if abs(value) >= 1e7:
+        return f"{value / 1e7:.1f}Cr"
+    if abs(value) >= 1e5:
+        return f"{value / 1e5:.1f}L"
+    if abs(value) >= 1e3:
+        return f"{value / 1e3:.1f}k"
+    return f"{value:.0f}"
+
+
+def _period_label(day, freq):
+    if freq == "month":
+        return day.strftime("%b %y")
+    return day.strftime("%d %b")
+
+
+def draw_line_chart(canvas, dates, series, freq="day", title=""):
+    canvas.delete("all")
+    width, height = max(canvas.winfo_width(), 200), max(canvas.winfo_height(), 120)
+    left, right, top, bottom = 60, 130, 25, 30
+    canvas.create_text(left, 12, text=title, anchor="w", font=("Arial", 10, "bold"))
+    if not series or not dates:
+        canvas.create_text(width / 2, height / 2, text="Is range me koi data nahi hai.", fill="gray")
+        return
+
+    high = max(float(values.max()) for values in series.values()) or 1.0
+    plot_w, plot_h = width - left - right, height - top - bottom
+    step = plot_w / max(len(dates) - 1, 1)
+
+    for i in range(5):
+        y = top + plot_h * i / 4
+        canvas.create_line(left, y, left + plot_w, y, fill="#e6e6e6")
+        canvas.create_text(left - 6, y, text=_label(high * (4 - i) / 4), anchor="e", font=("Arial", 8))
+
+    every = max(1, len(dates) // 10)
+    for i in range(0, len(dates), every):
+        x = left + i * step
+        canvas.create_text(x, top + plot_h + 12, text=_period_label(dates[i], freq), font=("Arial", 8))
+
+    for n, (label, values) in enumerate(series.items()):
+        color = TYPE_COLORS.get(label, COLORS[n % len(COLORS)])
+        points = []
+        for i, value in enumerate(values):
+            points += [left + i * step, top + plot_h * (1 - float(value) / high)]
+        if len(points) >= 4:
+            canvas.create_line(*points, fill=color, width=2)
+        else:
+            canvas.create_oval(points[0] - 3, points[1] - 3, points[0] + 3, points[1] + 3, fill=color, outline="")
+        y = top + 14 * n
+        canvas.create_line(width - right + 10, y, width - right + 30, y, fill=color, width=3)
+        canvas.create_text(width - right + 35, y, text=str(label)[:14], anchor="w", font=("Arial", 8))
+
+
+def draw_bar_chart(canvas, items, title=""):
+    # items: [(label, value)] drawn as horizontal bars, largest first
+    canvas.delete("all")
+    width, height = max(canvas.winfo_width(), 200), max(canvas.winfo_height(), 120)
+    left, right, top = 140, 70, 25
+    canvas.create_text(10, 12, text=title, anchor="w", font=("Arial", 10, "bold"))
+    if not items:
+        canvas.create_text(width / 2, height / 2, text="Is range me koi data nahi hai.", fill="gray")
+        return
+
+    high = max(value for _, value in items) or 1.0
+    bar_h = min(22, (height - top - 10) / len(items))
+    for i, (label, value) in enumerate(items):
+        y = top + i * bar_h
+        x = left + (width - left - right) * value / high
+        canvas.create_text(left - 6, y + bar_h / 2, text=str(label)[:20], anchor="e", font=("Arial", 8))
+        canvas.create_rectangle(left, y + 2, x, y + bar_h - 2, fill=COLORS[i % len(COLORS)], outline="")
+        canvas.create_text(x + 4, y + bar_h / 2, text=_label(value), anchor="w", font=("Arial", 8))
+
+
+# ---------------- Window ----------------
+def show_analytics_window(root, worker, start, end):
+    # Loads the range on the worker once; every control change redraws from memory
+    from tkinter import Toplevel, Frame, Label, Canvas, messagebox, ttk
+
+    if not available():
+        messagebox.showwarning("Analytics", "Analytics ke liye numpy install karo (pip install numpy).")
+        return None
+
+    window = Toplevel(root)
+    window.title(f"Analytics: {start} to {end}")
+    window.geometry("940x640")
+    state = {"frame": None}
+
+    controls = Frame(window)
+    controls.pack(fill="x", padx=8, pady=6)
+    Label(controls, text="Period:").pack(side="left")
+    freq_cb = ttk.Combobox(controls, values=FREQUENCIES, width=8, state="readonly")
+    freq_cb.set("day" if (as_date(end) - as_date(start)).days <= 92 else "week")
+    freq_cb.pack(side="left", padx=(2, 12))
+    Label(controls, text="Metric:").pack(side="left")
+    metric_cb = ttk.Combobox(controls, values=METRICS, width=8, state="readonly")
+    metric_cb.set("amount")
+    metric_cb.pack(side="left", padx=(2, 12))
+    Label(controls, text="Lines:").pack(side="left")
+    view_cb = ttk.Combobox(controls, width=24, state="readonly")
+    view_cb.pack(side="left", padx=2)
+    summary = Label(controls, text="⏳ Loading...", anchor="e")
+    summary.pack(side="right")
+
+    trend = Canvas(window, bg="white", height=330, highlightthickness=0)
+    trend.pack(fill="both", expand=True, padx=8, pady=(0, 6))
+    bars = Canvas(window, bg="white", height=230, highlightthickness=0)
+    bars.pack(fill="x", padx=8, pady=(0, 8))
+
+    def redraw(event=None):
+        frame = state["frame"]
+        if frame is None or not window.winfo_exists():
+            return
+        freq, metric, view = freq_cb.get(), metric_cb.get(), view_cb.get()
+        if view == "Top products":
+            dates, series = frame.series(freq, metric, by="product")
+            title = f"Top {TOP_N} products, {metric} per {freq}"
+        else:
+            product = None if view in ("", "All products") else view
+            dates, series = frame.series(freq, metric, by="type", product=product)
+            title = f"{product or 'All products'}: Sale / Purchase {metric} per {freq}"
+        draw_line_chart(trend, dates, series, freq, title)
+        draw_bar_chart(bars, frame.top_products(TOP_N, metric), f"Top {TOP_N} products by sale {metric}")
+
+        totals = frame.totals(metric)
+        summary.config(text="   ".join(f"{name}: {_label(value)}" for name, value in sorted(totals.items())))
+
+    def loaded(frame):
+        if not window.winfo_exists():
+            return
+        state["frame"] = frame
+        top = [name for name, _ in frame.top_products(TOP_N * 3)]
+        view_cb["values"] = ["All products", "Top products"] + top
+        view_cb.set("All products")
+        redraw()
+
+    def failed(e):
+        if window.winfo_exists():
+            summary.config(text=f"❌ {e}")
+
+    for widget in (freq_cb, metric_cb, view_cb):
+        widget.bind("<<ComboboxSelected>>", redraw)
+    trend.bind("<Configure>", redraw)
+    bars.bind("<Configure>", redraw)
+
+    worker.submit(RollupFrame.fetch, start, end, on_done=loaded, on_error=failed, key="analytics")
+    return window
@@ -0,0 +1,205 @@
+import os
+import json
+import shutil
+import socket
+from datetime import date
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from dashboard import DashboardTotals
+from filters import RANGE_COLUMNS
+from paged_view import PAGE_SIZE
+
+
+# ================== Inventory API Client ==================
+# Thin urllib client for server.py.  ApiClient has fetch_page() / count_rows(),
+# so it doubles as a PagedTreeView row source.  Set INVENTORY_API_URL (e.g.
+# http://127.0.0.1:8765) and the Tk app reads through the shared server and
+# follows its change feed; scripts can use ApiClient directly:
+#
+#   api = ApiClient("http://127.0.0.1:8765")
+#   api.create("Pen", 10, "2024-05-01", "Purchase", 5)
+#   for event in api.changes(since)["events"]: ...
+
+API_URL = os.environ.get("INVENTORY_API_URL", "")
+TIMEOUT = 30
+
+
+class ApiError(Exception):
+
+    def __init__(self, status, message, field=None):
+        super().__init__(message)
+        self.status = status
+        self.field = field
+
+
+def _params(flt):
+    # Filter dict (see filters.py) -> query parameters understood by the server
+    params = []
+    flt = flt or {}
+    for name in ("start", "end"):
+        if flt.get(name):
+            params.append((name, str(flt[name])))
+    for product in flt.get("products", ()):
+        params.append(("product", product))
+    if "products" in flt and not flt["products"]:
+        params.append(("product", ""))   # an empty IN list still means "no rows"
+    if flt.get("product_like"):
+        params.append(("product_like", flt["product_like"]))
+    if flt.get("trans_type"):
+        params.append(("type", flt["trans_type"]))
+    for column in RANGE_COLUMNS:
+        for bound in ("min", "max"):
+            if f"{bound}_{column}" in flt:
+                params.append((f"{bound}_{column}", flt[f"{bound}_{column}"]))
+    if flt.get("sort"):
+        params.append(("sort", flt["sort"]))
+    return params
+
+
+def _cursor_params(side, cursor):
+    # An id, or (sort value, id) for sorted pages (see filters.cursor_key)
+    if isinstance(cursor, tuple):
+        return [(f"{side}_id", cursor[1]), (f"{side}_value", str(cursor[0]))]
+    return [(f"{side}_id", cursor)]
+
+
+def parse_row(row):
+    # JSON row -> the tuple shape SQL returns (date as a date object)
+    trans_id, product, qty, trans_date, trans_type, rate, amount = row
+    return (trans_id, product, qty, date.fromisoformat(trans_date), trans_type, rate, amount)
+
+
+def parse_totals(payload):
+    totals = DashboardTotals()
+    totals.load_rows([
+        (trans_type, bucket["count"], bucket["amount"], bucket["qty"], bucket["value"])
+        for trans_type, bucket in payload["totals"].items()
+    ])
+    return totals
+
+
+class ApiClient:
+
+    def __init__(self, base_url=API_URL, timeout=TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method, path, params=(), body=None, timeout=None, raw=False):
+        url = self.base_url + path
+        if params:
+            url += "?" + urlencode(params)
+        data = None
+        headers = {"Accept": "application/json"}
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        request = Request(url, data=data, method=method, headers=headers)
+        try:
+            response = urlopen(request, timeout=timeout or self.timeout)
+        except HTTPError as e:
+            try:
+                error = json.loads(e.read() or b"{}")
+            except ValueError:
+                error = {}
+            raise ApiError(e.code, error.get("error") or str(e), error.get("field"))
+        except (URLError, socket.timeout) as e:
+            raise ApiError(None, f"Server se connect nahi ho paya: {getattr(e, 'reason', e)}")
+        if raw:
+            return response
+        with response:
+            return json.loads(response.read())
+
+    # ---- transactions ----
+    def fetch_page(self, flt=None, before_id=None, after_id=None, limit=PAGE_SIZE):
+        params = _params(flt) + [("limit", limit)]
+        if before_id is not None:
+            params += _cursor_params("before", before_id)
+        if after_id is not None:
+            params += _cursor_params("after", after_id)
+        return [parse_row(row) for row in self._request("GET", "/transactions", params)["rows"]]
+
+    def count_rows(self, flt=None):
+        return self._request("GET", "/transactions/count", _params(flt))["count"]
+
+    def get(self, trans_id):
+        return parse_row(self._request("GET", f"/transactions/{trans_id}")["row"])
+
+    def create(self, product, qty, trans_date, trans_type, rate, idempotency_key=None):
+        body = {"product": product, "qty": qty, "date": str(trans_date),
+                "transaction_type": trans_type, "rate": rate}
+        if idempotency_key:
+            body["idempotency_key"] = idempotency_key
+        return parse_row(self._request("POST", "/transactions", body=body)["row"])
+
+    def update(self, trans_id, product, qty, trans_date, trans_type, rate):
+        body = {"product": product, "qty": qty, "date": str(trans_date),
+                "transaction_type": trans_type, "rate": rate}
+        return parse_row(self._request("PUT", f"/transactions/{trans_id}", body=body)["row"])
+
+    def delete(self, trans_id):
+        return parse_row(self._request("DELETE", f"/transactions/{trans_id}")["row"])
+
+    # ---- aggregates ----
+    def dashboard_totals(self, start=None, end=None, product=None):
+        params = [(name, str(value)) for name, value in
+                  (("start", start), ("end", end), ("product", product)) if value]
+        return parse_totals(self._request("GET", "/dashboard", params))
+
+    def products(self, keyword, limit=20):
+        return self._request("GET", "/products", [("q", keyword), ("limit", limit)])["products"]
+
+    # ---- files ----
+    def download(self, file_path, path, params):
+        with self._request("GET", path, params, timeout=max(self.timeout, 600), raw=True) as response:
+            with open(file_path, "wb") as f:
+                shutil.copyfileobj(response, f)
+        return file_path
+
+    def export(self, file_path, flt=None, fmt=None):
+        if fmt is None:
+            lower = file_path.lower()
+            fmt = "csv.gz" if lower.endswith(".csv.gz") else "csv" if lower.endswith(".csv") else "xlsx"
+        return self.download(file_path, "/export", _params(flt) + [("format", fmt)])
+
+    def report(self, file_path, start, end):
+        return self.download(file_path, "/report", [("start", str(start)), ("end", str(end))])
+
+    # ---- change feed ----
+    def health(self):
+        return self._request("GET", "/health")
+
+    def changes(self, since=0, instance=None, timeout=25):
+        # Blocks up to timeout seconds; {"seq", "instance", "reset", "events"}
+        params = [("since", since), ("timeout", timeout)]
+        if instance:
+            params.append(("instance", instance))
+        result = self._request("GET", "/changes", params, timeout=timeout + 10)
+        for event in result["events"]:
+            if "row" in event:
+                event["row"] = parse_row(event["row"])
+        return result
+
+
+class ChangeCursor:
+    # Remembers the feed position between long polls (worker thread);
+    # poll() returns (reset, events)
+
+    def __init__(self, client, timeout=25):
+        self.client = client
+        self.timeout = timeout
+        self.seq = None
+        self.instance = None
+
+    def start(self):
+        # Position at "now"; call before the first full load so nothing is missed
+        health = self.client.health()
+        self.seq, self.instance = health["seq"], health["instance"]
+
+    def poll(self):
+        if self.seq is None:
+            self.start()
+        result = self.client.changes(self.seq, self.instance, self.timeout)
+        self.seq, self.instance = result["seq"], result["instance"]
+        return result["reset"], result["events"]
@@ -0,0 +1,491 @@
+import os
+import csv
+import gzip
+import json
+import heapq
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+
+import paged_view
+from catalog import canonical_names
+from changes import prune_changes
+from db import require_connection
+from dashboard import TRANSACTION_TYPES, _money
+from filters import row_matcher, as_date, sort_order, SORT_COLUMNS
+from paged_view import SELECT_COLUMNS, PAGE_SIZE
+
+
+# ================== Archive of Closed Months ==================
+# Whole months older than a cutoff are moved out of `transactions` into one
+# gzip CSV per month (archive/transactions_YYYY-MM_<stamp>.csv.gz, sorted by
+# id) and recorded in the archived_months table (schema v6) together with
+# their row count, id range, per-type totals, product names and the min /
+# max of every other sortable column (so sorted pages can skip months).
+#
+# The DB row in archived_months is written in the same transaction as the
+# DELETE, so a month is either still live or archived, never both / neither;
+# files without a row there are leftovers of a failed run and are ignored.
+#
+# Product names are read through the catalog (catalog.canonical_names), so
+# spellings archived before the v8 merge ("pen", "PEN ") come back as "Pen".
+#
+# Reads stay transparent: ArchiveSource merges archived rows into table
+# pages and counts, iter_archived_rows() into exports / PDF reports, and
+# archived_kpi_rows() into the dashboard totals.  The daily roll-up keeps
+# its rows for archived days, so range KPIs don't change either.
+#
+#   python archive.py run --months 12    archive months older than 12 months
+#   python archive.py list
+
+ARCHIVE_DIR = os.environ.get("INVENTORY_ARCHIVE_DIR", "archive")
+KEEP_MONTHS = 12          # default: the current month plus the 12 before it stay live
+ROW_CACHE_MONTHS = 6      # archived months kept parsed in memory
+DELETE_CHUNK = 1000        # ids per DELETE ... WHERE id IN (...)
+
+
+def month_bounds(month):
+    # "2024-03" -> (date(2024, 3, 1), date(2024, 3, 31))
+    year, number = (int(part) for part in month.split("-"))
+    first = date(year, number, 1)
+    following = date(year + number // 12, number % 12 + 1, 1)
+    return first, date.fromordinal(following.toordinal() - 1)
+
+
+def _month_key(day):
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+class ArchivedMonth:
+
+    def __init__(self, month, file, row_count, min_id, max_id, totals, products, ranges):
+        self.month = month
+        self.file = file
+        self.row_count = row_count
+        self.min_id = min_id
+        self.max_id = max_id
+        self.totals = totals        # type -> [count, amount, qty, value]
+        self.products = products
+        self.ranges = ranges        # column -> [min, max] for product / qty / type / rate / amount
+        self.start, self.end = month_bounds(month)
+
+    def bounds(self, column):
+        # Lowest and highest sort key (see ArchiveSource._merge) a row of this month can have
+        if column == "id":
+            return self.min_id, self.max_id
+        if column == "date":
+            low, high = self.start, self.end
+        else:
+            low, high = (_typed(column, value) for value in self.ranges[column])
+        return (low, self.min_id), (high, self.max_id)
+
+    def overlaps(self, flt):
+        # False when no row can match: outside the dates, or none of the products
+        return ((not flt.get("start") or self.end >= flt["start"])
+                and (not flt.get("end") or self.start <= flt["end"])
+                and ("products" not in flt or not set(flt["products"]).isdisjoint(self.products)))
+
+    def covered_by(self, flt):
+        # True when a plain date / product filter includes the whole month
+        return (set(flt) <= {"start", "end", "sort", "products"}
+                and (not flt.get("start") or flt["start"] <= self.start)
+                and (not flt.get("end") or self.end <= flt["end"])
+                and ("products" not in flt or set(self.products) <= set(flt["products"])))
+
+
+# ---------------- Month records ----------------
+_months = None
+_rows = OrderedDict()      # month -> parsed rows (LRU)
+_spellings = {}            # archived product name -> catalog spelling
+_lock = threading.Lock()
+
+
+def load_months(conn=None):
+    # month -> ArchivedMonth; cached until reload()
+    global _months, _spellings
+    if _months is not None:
+        return _months
+
+    own = conn is None
+    conn = conn or require_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT month, file, row_count, min_id, max_id, totals, products, ranges "
+                       "FROM archived_months")
+        months = {
+            month: ArchivedMonth(month, file, int(row_count), int(min_id), int(max_id),
+                                 json.loads(totals), json.loads(products), ranges and json.loads(ranges))
+            for month, file, row_count, min_id, max_id, totals, products, ranges in cursor.fetchall()
+        }
+        spellings = canonical_names(cursor, {name for record in months.values() for name in record.products})
+        for record in months.values():
+            record.products = sorted({spellings[name] for name in record.products})
+        with _lock:
+            _spellings = spellings
+        # months archived before v12 have no ranges yet: read each file once and store them
+        missing = [record for record in months.values() if record.ranges is None]
+        for record in missing:
+            record.ranges = _ranges(iter_file(record))
+            cursor.execute("UPDATE archived_months SET ranges = %s WHERE month = %s",
+                           (json.dumps(record.ranges), record.month))
+        if missing:
+            conn.commit()
+    finally:
+        if own:
+            conn.close()
+    with _lock:
+        _months = months
+    return months
+
+
+def reload():
+    # Forget cached month records / rows (after an archive run, or on refresh)
+    global _months
+    with _lock:
+        _months = None
+        _rows.clear()
+
+
+def has_archive():
+    return bool(load_months())
+
+
+def is_archived(day):
+    return _month_key(as_date(str(day)[:10])) in load_months()
+
+
+def months_for(flt):
+    flt = flt or {}
+    return [record for _, record in sorted(load_months().items()) if record.overlaps(flt)]
+
+
+# ---------------- Month files ----------------
+def _path(file):
+    return os.path.join(ARCHIVE_DIR, file)
+
+
+def _normalize(row):
+    # Same typed tuple whether the row came from MySQL, SQLite or a CSV file
+    trans_id, product, qty, trans_date, trans_type, rate, amount = row
+    return (int(trans_id), _spellings.get(product, product), int(qty), as_date(str(trans_date)[:10]),
+            trans_type, Decimal(str(rate)), Decimal(str(amount)))
+
+
+def _typed(column, value):
+    if column == "date":
+        return as_date(str(value)[:10])
+    if column in ("rate", "amount"):
+        return Decimal(str(value))
+    return int(value) if column == "qty" else value
+
+
+def iter_file(record):
+    # Streams the month's rows (id order) straight from the file
+    with gzip.open(_path(record.file), "rt", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for row in reader:
+            yield _normalize(row)
+
+
+def month_rows(record):
+    with _lock:
+        rows = _rows.get(record.month)
+        if rows is not None:
+            _rows.move_to_end(record.month)
+            return rows
+    rows = list(iter_file(record))
+    with _lock:
+        _rows[record.month] = rows
+        while len(_rows) > ROW_CACHE_MONTHS:
+            _rows.popitem(last=False)
+    return rows
+
+
+def _write_file(file, rows):
+    # Temp file + fsync + rename, so a file with the final name is always complete
+    path = _path(file)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(SELECT_COLUMNS.split(", "))
+        for trans_id, product, qty, trans_date, trans_type, rate, amount in rows:
+            writer.writerow((trans_id, product, qty, str(trans_date)[:10], trans_type, rate, amount))
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _totals(rows):
+    totals = {t: [0, Decimal(0), 0, Decimal(0)] for t in TRANSACTION_TYPES}
+    for _, _, qty, _, trans_type, rate, amount in rows:
+        bucket = totals.setdefault(trans_type, [0, Decimal(0), 0, Decimal(0)])
+        bucket[0] += 1
+        bucket[1] += _money(amount)
+        bucket[2] += int(qty)
+        bucket[3] += int(qty) * _money(rate)
+    return {t: [count, str(amount), qty, str(value)] for t, (count, amount, qty, value) in totals.items()}
+
+
+def _ranges(rows):
+    # {column: [min, max]} of the sortable columns without a known range (id and date have one)
+    ranges = {}
+    for row in rows:
+        for position, column in enumerate(SORT_COLUMNS):
+            if column in ("id", "date"):
+                continue
+            value = row[position]
+            low, high = ranges.setdefault(column, [value, value])
+            if value < low:
+                ranges[column][0] = value
+            elif value > high:
+                ranges[column][1] = value
+    return {column: [value if column == "qty" else str(value) for value in pair]
+            for column, pair in ranges.items()}
+
+
+# ---------------- Archiving ----------------
+def archive_month(conn, month):
+    # Moves one month's live rows into its archive file (merging with an
+    # earlier archive of the same month); returns the number of rows moved
+    start, end = month_bounds(month)
+    previous = load_months(conn).get(month)
+    cursor = conn.cursor()
+    # Lock the month until the commit: an edit or a late insert committed
+    # between this read and the DELETE would otherwise be lost
+    if conn.dialect == "sqlite":
+        if not conn.raw.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+        lock = ""
+    else:
+        lock = " FOR UPDATE"
+    cursor.execute(f"SELECT {SELECT_COLUMNS} FROM transactions WHERE date BETWEEN %s AND %s ORDER BY id{lock}",
+                   (start, end))
+    live = [_normalize(row) for row in cursor.fetchall()]
+    if not live:
+        conn.rollback()
+        return 0
+
+    rows = sorted(list(iter_file(previous)) + live if previous else live)
+    file = f"transactions_{month}_{int(time.time() * 1000)}.csv.gz"
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    _write_file(file, rows)
+
+    try:
+        # The delete fires the roll-up triggers; put the month's roll-up rows
+        # back afterwards so range KPIs still include the archived days
+        cursor.execute("SELECT day, product, transaction_type, cnt, qty, amount, value "
+                       "FROM daily_rollup WHERE day BETWEEN %s AND %s", (start, end))
+        rollup_rows = cursor.fetchall()
+
+        # only the rows now in the file, by id; anything else stays live
+        deleted = 0
+        for i in range(0, len(live), DELETE_CHUNK):
+            ids = [row[0] for row in live[i:i + DELETE_CHUNK]]
+            cursor.execute(f"DELETE FROM transactions WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+            deleted += cursor.rowcount
+        if deleted != len(live):
+            raise RuntimeError(f"{month}: deleted {deleted} of {len(live)} archived rows, archive rolled back")
+        cursor.execute("DELETE FROM daily_rollup WHERE day BETWEEN %s AND %s", (start, end))
+        if rollup_rows:
+            cursor.executemany("INSERT INTO daily_rollup (day, product, transaction_type, cnt, qty, amount, value) "
+                               "VALUES (%s, %s, %s, %s, %s, %s, %s)", rollup_rows)
+
+        cursor.execute("DELETE FROM archived_months WHERE month = %s", (month,))
+        # one marker for the whole move: change watchers reload instead of replaying deletes
+        cursor.execute("INSERT INTO transaction_changes (txn_id, op) VALUES (0, 'A')")
+        cursor.execute(
+            "INSERT INTO archived_months (month, file, row_count, min_id, max_id, totals, products, ranges) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            (month, file, len(rows), rows[0][0], rows[-1][0], json.dumps(_totals(rows)),
+             json.dumps(sorted({row[1] for row in rows})), json.dumps(_ranges(rows)))
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        os.remove(_path(file))
+        raise
+
+    if previous is not None and os.path.exists(_path(previous.file)):
+        os.remove(_path(previous.file))
+    reload()
+    return len(live)
+
+
+def archive_older_than(keep_months=KEEP_MONTHS, today=None, progress=None):
+    # Archives every month before (current month - keep_months); returns {month: rows}
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - keep_months
+    cutoff = date(index // 12, index % 12 + 1, 1)
+
+    moved = {}
+    conn = require_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT date FROM transactions WHERE date < %s", (cutoff,))
+        months = sorted({_month_key(date.fromisoformat(str(day)[:10])) for (day,) in cursor.fetchall()})
+        conn.commit()
+        for month in months:
+            moved[month] = archive_month(conn, month)
+            if progress:
+                progress(month, moved[month])
+        if moved:
+            prune_changes(conn)   # the moved rows' delete markers, once every reader has them
+    finally:
+        conn.close()
+    return moved
+
+
+# ---------------- Transparent reads ----------------
+def archived_kpi_rows():
+    # Dashboard rows (type, count, SUM(amount), SUM(qty), SUM(qty * rate)) of all archived months
+    sums = {}
+    for record in load_months().values():
+        for trans_type, (count, amount, qty, value) in record.totals.items():
+            bucket = sums.setdefault(trans_type, [0, Decimal(0), 0, Decimal(0)])
+            bucket[0] += count
+            bucket[1] += Decimal(amount)
+            bucket[2] += qty
+            bucket[3] += Decimal(value)
+    return [(trans_type, *bucket) for trans_type, bucket in sums.items()]
+
+
+def grouped_rows():
+    # {(day, product, type): [count, qty, amount, qty * rate]} over every archived row,
+    # what daily_rollup holds for archived days (see rollup.rebuild / verify)
+    groups = {}
+    for record in load_months().values():
+        for _, product, qty, trans_date, trans_type, rate, amount in iter_file(record):
+            bucket = groups.setdefault((str(trans_date), product, trans_type), [0, 0, Decimal(0), Decimal(0)])
+            bucket[0] += 1
+            bucket[1] += qty
+            bucket[2] += amount
+            bucket[3] += qty * rate
+    return groups
+
+
+def archived_products():
+    return sorted({name for record in load_months().values() for name in record.products})
+
+
+def count_archived(flt=None):
+    flt = flt or {}
+    total = 0
+    matches = row_matcher(flt)
+    for record in months_for(flt):
+        if record.covered_by(flt):
+            total += record.row_count   # precomputed, no file read
+        else:
+            total += sum(1 for row in month_rows(record) if matches(row))
+    return total
+
+
+def iter_archived_rows(flt=None, order_by="id"):
+    # Matching archived rows in the same order the export / report queries use
+    flt = flt or {}
+    matches = row_matcher(flt)
+    records = months_for(flt)
+    if order_by == "id":
+        # each file is id-sorted; merge them without loading whole months
+        streams = [(row for row in iter_file(record) if matches(row)) for record in records]
+        yield from heapq.merge(*streams)
+    else:
+        # "date, id": months don't overlap in dates, so one month at a time
+        for record in records:
+            yield from sorted((row for row in iter_file(record) if matches(row)),
+                              key=lambda row: (row[3], row[0]))
+
+
+def merge_chunks(live_chunks, flt=None, order_by="id", chunk_size=5000):
+    # Interleaves live DB chunks with archived rows, keeping the sort order
+    if not months_for(flt):
+        yield from live_chunks
+        return
+
+    if order_by == "id":
+        key = lambda row: row[0]
+    else:
+        key = lambda row: (date.fromisoformat(str(row[3])[:10]), row[0])
+    live = (row for chunk in live_chunks for row in chunk)
+
+    chunk = []
+    for row in heapq.merge(live, iter_archived_rows(flt, order_by), key=key):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ArchiveSource:
+    # Row source for PagedTreeView / CachedSource: pages and counts from the
+    # inner source (DB or local cache) plus the archived months they touch
+
+    def __init__(self, inner=None):
+        self.inner = inner if inner is not None else paged_view
+
+    def fetch_page(self, flt=None, before_id=None, after_id=None, limit=PAGE_SIZE):
+        live = self.inner.fetch_page(flt, before_id, after_id, limit)
+        records = months_for(flt)
+        if not records:
+            return live
+        return self._merge(live, records, flt, before_id, after_id, limit)
+
+    def _merge(self, live, records, flt, before_id, after_id, limit):
+        # Archived rows past the cursor merged with the live page, in display order
+        column, descending = sort_order(flt)
+        upwards = before_id is None and after_id is not None
+        cursor = before_id if before_id is not None else after_id
+        if column == "id":
+            key = lambda row: int(row[0])
+            cursor = None if cursor is None else int(cursor)
+        else:
+            # compare as the archive files store values (date / Decimal), whatever the live source returned
+            position = SORT_COLUMNS.index(column)
+            key = lambda row: (_typed(column, row[position]), int(row[0]))
+            if cursor is not None:
+                cursor = (_typed(column, cursor[0]), int(cursor[1]))
+        # rows on the requested side of the cursor, nearest first
+        below = descending != upwards
+        later = (lambda key: key < cursor) if below else (lambda key: key > cursor)
+
+        # every month knows its key range for the sort column: visit the months
+        # nearest the cursor first, skip the ones wholly on the wrong side of it,
+        # and stop once the next one can't reach a full page
+        records = sorted(records, key=lambda record: record.bounds(column)[1 if below else 0], reverse=below)
+        if cursor is not None:
+            records = [record for record in records
+                       if later(record.bounds(column)[0 if below else 1])]
+
+        matches = row_matcher(flt)
+        rows = sorted(live, key=key, reverse=below)[:limit]
+        for record in records:
+            if len(rows) == limit:
+                low, high = record.bounds(column)
+                edge = key(rows[-1])
+                if (high < edge) if below else (low > edge):
+                    break
+            rows += [row for row in month_rows(record) if matches(row) and (cursor is None or later(key(row)))]
+            rows = sorted(rows, key=key, reverse=below)[:limit]
+        return rows[::-1] if upwards else rows
+
+    def count_rows(self, flt=None):
+        return self.inner.count_rows(flt) + count_archived(flt)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "run":
+        keep = int(sys.argv[sys.argv.index("--months") + 1]) if "--months" in sys.argv else KEEP_MONTHS
+        moved = archive_older_than(keep, progress=lambda month, rows: print(f"📦 {month}: {rows} rows archived"))
+        print(f"✅ {sum(moved.values())} rows archived from {len(moved)} months")
+    elif command == "list":
+        for month, record in sorted(load_months().items()):
+            print(f"{month}  {record.row_count:>9} rows  ids {record.min_id}-{record.max_id}  {record.file}")
+    else:
+        print("Usage: python archive.py [list | run --months N]")
+        sys.exit(2)
@@ -0,0 +1,365 @@
+import os
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import contextlib
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import date, datetime, timedelta
+
+import paged_view
+from db import configure_pool, require_connection, close_pool
+from dashboard import DashboardTotals
+from export import export_xlsx
+from filters import make_filter
+from importer import INSERT_SQL
+from report import generate_report
+from schema import ensure_schema
+from search import ProductIndex
+from validation import validate_transaction
+
+
+# ================== Benchmark Suite ==================
+# Runs the app's data paths without Tk or MySQL: a synthetic transaction
+# history is written to a local SQLite file (reused across runs) and each
+# scenario below is timed through the same functions the UI calls.
+#
+#   python bench.py --rows 10k 100k 1M --repeat 5 --output results.json
+#   python bench.py --rows 100k --compare results.json
+#
+# Results are one JSON document, so runs from two versions can be diffed;
+# --compare exits with status 1 when a scenario got slower than allowed.
+
+RESULT_FORMAT = 1
+DATA_DIR = os.environ.get("INVENTORY_BENCH_DIR", "bench_data")
+GENERATE_BATCH = 10000
+END_DATE = date(2025, 12, 31)      # fixed so a given seed always yields the same data
+
+SCENARIOS = ("insert", "refresh", "dashboard", "date_filter", "product_filter",
+             "excel_export", "pdf_export")
+
+
+# ---------------- Synthetic data ----------------
+PRODUCT_BASES = ["Pen", "Pencil", "Notebook", "Register", "Eraser", "Sharpener", "Marker",
+                 "Stapler", "Glue Stick", "File Folder", "Scale", "Chalk", "Diary", "Envelope",
+                 "Highlighter", "Ink Bottle", "Tape", "Calculator", "Geometry Box", "Crayons"]
+PRODUCT_VARIANTS = ["Blue", "Black", "Red", "A4", "A5", "Small", "Large", "Pack of 10",
+                    "Premium", "Classic"]
+
+
+def parse_size(text):
+    # "10k" / "2.5M" / "10000" -> int
+    text = str(text).strip().lower().replace("_", "")
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    if scale > 1:
+        text = text[:-1]
+    return int(float(text) * scale)
+
+
+def make_catalog(rng):
+    # (name, base cost, popularity weight); popularity is roughly Zipf-shaped
+    names = [f"{base} {variant}" for base in PRODUCT_BASES for variant in PRODUCT_VARIANTS]
+    rng.shuffle(names)
+    return [(name, round(rng.uniform(5, 500), 2), 1.0 / rank)
+            for rank, name in enumerate(names, start=1)]
+
+
+def generate_transactions(count, seed=42, end=END_DATE):
+    # Yields (product, qty, date, transaction_type, rate, amount) in date order,
+    # about 70% sales at a markup and 30% larger purchases at cost
+    rng = random.Random(seed)
+    catalog = make_catalog(rng)
+    weights = [weight for _, _, weight in catalog]
+    days = max(30, min(3650, count // 50))   # ~50 rows a day, capped at 10 years
+    start = end - timedelta(days=days - 1)
+
+    for i in range(count):
+        day = start + timedelta(days=i * days // count)
+        product, cost, _ = rng.choices(catalog, weights)[0]
+        if rng.random() < 0.3:
+            trans_type, qty, rate = "Purchase", rng.randint(10, 200), cost
+        else:
+            trans_type, qty, rate = "Sale", rng.randint(1, 20), round(cost * rng.uniform(1.1, 1.4), 2)
+        yield product, qty, day, trans_type, rate, round(qty * rate, 2)
+
+
+def prepare_database(rows, seed=42, data_dir=DATA_DIR, progress=None):
+    # Points the pool at bench_<rows>_<seed>.db, generating it on first use
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"bench_{rows}_{seed}.db")
+    configure_pool(backend="sqlite", sqlite_path=path)
+    ensure_schema()
+
+    if paged_view.count_rows() == rows:
+        return path
+
+    conn = require_connection()
+    try:
+        conn.raw.execute("PRAGMA synchronous = OFF")  # bulk load only; nothing to lose here
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM transactions")
+        batch, done = [], 0
+        for row in generate_transactions(rows, seed):
+            batch.append(row)
+            if len(batch) == GENERATE_BATCH:
+                cursor.executemany(INSERT_SQL, batch)
+                done += len(batch)
+                batch = []
+                if progress:
+                    progress(done, rows)
+        if batch:
+            cursor.executemany(INSERT_SQL, batch)
+        cursor.execute("DELETE FROM transaction_changes")
+        conn.commit()
+        conn.raw.execute("PRAGMA synchronous = FULL")
+        cursor.execute("ANALYZE")
+    finally:
+        conn.close()
+    return path
+
+
+# ---------------- Scenarios ----------------
+# Each scenario is a class with optional setup() / teardown() (untimed) and
+# run() (timed); run() returns the number of operations it performed.
+
+class Scenario:
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    def setup(self):
+        pass
+
+    def teardown(self):
+        pass
+
+
+class InsertScenario(Scenario):
+    # Single-row inserts exactly like add_transaction(): validate, insert, commit
+    def setup(self):
+        self.ids = []
+
+    def run(self):
+        conn = require_connection()
+        try:
+            cursor = conn.cursor()
+            for i in range(self.ctx["inserts"]):
+                product, trans_type, qty, rate = validate_transaction(
+                    "Bench Product", "Sale", str(i % 20 + 1), "12.50")
+                cursor.execute(INSERT_SQL, (product, qty, END_DATE, trans_type, rate, round(qty * rate, 2)))
+                conn.commit()
+                self.ids.append(cursor.lastrowid)
+        finally:
+            conn.close()
+        return self.ctx["inserts"]
+
+    def teardown(self):
+        conn = require_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("DELETE FROM transactions WHERE id = %s", [(i,) for i in self.ids])
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class RefreshScenario(Scenario):
+    # refresh_data(): dashboard totals, first table page + count, product index
+    def run(self):
+        conn = require_connection()
+        try:
+            DashboardTotals().load(conn)
+            ProductIndex().load(conn)
+        finally:
+            conn.close()
+        paged_view.fetch_page()
+        paged_view.count_rows()
+        return 1
+
+
+class DashboardScenario(Scenario):
+    def run(self):
+        conn = require_connection()
+        try:
+            totals = DashboardTotals()
+            totals.load(conn)
+            totals.kpis()
+        finally:
+            conn.close()
+        return 1
+
+
+class DateFilterScenario(Scenario):
+    # filter_report_by_date(): first page + total for the last 30 days
+    def run(self):
+        flt = make_filter(END_DATE - timedelta(days=29), END_DATE)
+        paged_view.fetch_page(flt)
+        paged_view.count_rows(flt)
+        return 1
+
+
+class ProductFilterScenario(Scenario):
+    # apply_filter() with a product keyword resolved through the search index
+    def setup(self):
+        conn = require_connection()
+        try:
+            self.index = ProductIndex()
+            self.index.load(conn)
+        finally:
+            conn.close()
+
+    def run(self):
+        flt = make_filter(**self.index.product_filter(self.ctx["keyword"]))
+        paged_view.fetch_page(flt)
+        paged_view.count_rows(flt)
+        return 1
+
+
+class ExcelExportScenario(Scenario):
+    def run(self):
+        return export_xlsx(os.path.join(self.ctx["tmp_dir"], "bench.xlsx"), self.ctx["export_filter"])
+
+
+class PdfExportScenario(Scenario):
+    def run(self):
+        flt = self.ctx["export_filter"]
+        start = flt.get("start", date.min)
+        return generate_report(os.path.join(self.ctx["tmp_dir"], "bench.pdf"), start, END_DATE)
+
+
+SCENARIO_CLASSES = {
+    "insert": InsertScenario,
+    "refresh": RefreshScenario,
+    "dashboard": DashboardScenario,
+    "date_filter": DateFilterScenario,
+    "product_filter": ProductFilterScenario,
+    "excel_export": ExcelExportScenario,
+    "pdf_export": PdfExportScenario,
+}
+
+
+def time_scenario(name, ctx, repeat):
+    scenario = SCENARIO_CLASSES[name](ctx)
+    timings, ops = [], 0
+    scenario.setup()
+    try:
+        for _ in range(repeat):
+            gc.collect()
+            started = time.perf_counter()
+            ops = scenario.run()
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        scenario.teardown()
+
+    return {
+        "scenario": name,
+        "repeat": repeat,
+        "ops": ops,
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "max_ms": round(max(timings), 3),
+    }
+
+
+# ---------------- Results ----------------
+def _version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(sizes, scenarios=SCENARIOS, repeat=5, seed=42, inserts=100, keyword="pen",
+              export_days=90, data_dir=DATA_DIR, log=None):
+    log = log or (lambda message: None)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in sizes:
+            log(f"⏳ Preparing {rows} rows...")
+            prepare_database(rows, seed, data_dir,
+                             progress=lambda done, total: log(f"   generated {done}/{total}"))
+            ctx = {
+                "rows": rows,
+                "inserts": inserts,
+                "keyword": keyword,
+                "tmp_dir": tmp_dir,
+                "export_filter": make_filter(END_DATE - timedelta(days=export_days - 1), END_DATE)
+                if export_days else {},
+            }
+            for name in scenarios:
+                result = time_scenario(name, ctx, repeat)
+                result["rows"] = rows
+                results.append(result)
+                log(f"   {name:<15} median {result['median_ms']:>10.1f} ms")
+            close_pool()
+
+    return {
+        "format": RESULT_FORMAT,
+        "version": _version(),
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "export_days": export_days,
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance=0.2):
+    # -> list of (rows, scenario, baseline_ms, current_ms) that got slower than tolerance
+    old = {(r["rows"], r["scenario"]): r["median_ms"] for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = old.get((result["rows"], result["scenario"]))
+        if before and result["median_ms"] > before * (1 + tolerance):
+            regressions.append((result["rows"], result["scenario"], before, result["median_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks against a local SQLite copy")
+    parser.add_argument("--rows", nargs="+", default=["10k"], help="dataset sizes, e.g. 10k 1M 10M")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--inserts", type=int, default=100, help="rows per insert run")
+    parser.add_argument("--keyword", default="pen", help="product filter keyword")
+    parser.add_argument("--export-days", type=int, default=90, help="export range; 0 = whole table")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    # the app's own status prints (schema migrations etc.) must not end up in the JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_suite(
+            [parse_size(size) for size in args.rows], args.scenarios, args.repeat, args.seed,
+            args.inserts, args.keyword, args.export_days, args.data_dir,
+            log=lambda message: print(message, file=sys.stderr)
+        )
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for rows, name, before, after in regressions:
+            print(f"⚠️ {name} @ {rows} rows: {before:.1f} ms -> {after:.1f} ms", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
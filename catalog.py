@@ -0,0 +1,186 @@
+import threading
+from bisect import bisect_left
+
+from db import require_connection
+
+
+# ================== Product Catalog ==================
+# The products table (schema v8): integer id, name, SKU / barcode and
+# reorder level.  transactions.product_id points at it (kept by triggers for
+# every writer); product filters and per-product history reads use it, so
+# those lookups compare integers.  The daily roll-up is still keyed by name.
+#
+# In memory the whole catalog is a few dicts plus a sorted list of folded
+# names, so the entry form's autocomplete is a binary search per keystroke.
+# New products (created by the triggers when a new name is saved) are picked
+# up incrementally by sync(): only ids above the last one seen are read.
+#
+# Every writer stores a product under its catalog spelling ("pen " -> "Pen"):
+# the entry form through ProductCatalog.canonical(), the importer, journal
+# and API server through canonical_names() per batch.  The triggers would
+# give "PEN" the same product_id anyway, but the roll-up, archives and text
+# grouping read transactions.product.
+
+PRODUCT_COLUMNS = "id, name, sku, reorder_level"
+SUGGESTIONS = 20
+
+
+def product_key(name):
+    # "  pen  Blue" and "Pen blue" are the same product
+    return " ".join(str(name).split()).casefold()
+
+
+def tidy_name(name):
+    return " ".join(str(name).split())
+
+
+def canonical_names(cursor, names, chunk_size=500):
+    # {name: spelling to store}: the catalog's spelling for known products
+    # (products.name compares case-insensitively), otherwise the first
+    # tidied spelling of that product in names
+    tidy = {name: tidy_name(name) for name in names}
+    wanted = sorted(set(tidy.values()))
+    stored = {}
+    for i in range(0, len(wanted), chunk_size):
+        chunk = wanted[i:i + chunk_size]
+        cursor.execute(f"SELECT name FROM products WHERE name IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        stored.update((product_key(name), name) for (name,) in cursor.fetchall())
+    return {name: stored.setdefault(product_key(clean), clean) for name, clean in tidy.items()}
+
+
+def canonical_rows(cursor, rows):
+    # Rows with the product name first, renamed through canonical_names()
+    names = canonical_names(cursor, [row[0] for row in rows])
+    return [(names[row[0]],) + tuple(row[1:]) for row in rows]
+
+
+class Product:
+    __slots__ = ("id", "name", "sku", "reorder_level")
+
+    def __init__(self, product_id, name, sku=None, reorder_level=0):
+        self.id = int(product_id)
+        self.name = name
+        self.sku = sku or None
+        self.reorder_level = int(reorder_level or 0)
+
+
+class ProductCatalog:
+
+    def __init__(self):
+        self.loaded = False
+        self.last_id = 0
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._by_key = {}     # product_key(name) -> Product
+        self._by_sku = {}     # sku -> Product
+        self._sorted = []     # sorted product keys for prefix lookups
+
+    def load(self, conn):
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {PRODUCT_COLUMNS} FROM products ORDER BY id")
+        rows = cursor.fetchall()
+        cursor.close()
+        with self._lock:
+            self._by_id, self._by_key, self._by_sku, self._sorted = {}, {}, {}, []
+            self.last_id = 0
+            for row in rows:
+                self._add(Product(*row))
+            self.loaded = True
+        return self
+
+    def sync(self, conn):
+        # New products since the last load / sync; returns how many
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {PRODUCT_COLUMNS} FROM products WHERE id > %s ORDER BY id", (self.last_id,))
+        rows = cursor.fetchall()
+        cursor.close()
+        with self._lock:
+            for row in rows:
+                self._add(Product(*row))
+        return len(rows)
+
+    def put(self, product):
+        # A product saved from this app (SKU / reorder level edits)
+        with self._lock:
+            self._add(product)
+
+    def _add(self, product):
+        old = self._by_id.get(product.id)
+        if old is not None and old.sku:
+            self._by_sku.pop(old.sku, None)
+        key = product_key(product.name)
+        if key not in self._by_key:
+            self._sorted.insert(bisect_left(self._sorted, key), key)
+        self._by_id[product.id] = product
+        self._by_key[key] = product
+        if product.sku:
+            self._by_sku[product.sku] = product
+        self.last_id = max(self.last_id, product.id)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    # ---- lookups (UI thread) ----
+    def get(self, name):
+        return self._by_key.get(product_key(name))
+
+    def by_id(self, product_id):
+        return self._by_id.get(product_id)
+
+    def by_sku(self, sku):
+        return self._by_sku.get(str(sku).strip())
+
+    def canonical(self, name):
+        # Stored spelling of a known product, otherwise the name tidied up
+        product = self.get(name)
+        return product.name if product is not None else tidy_name(name)
+
+    def prefix(self, text, limit=SUGGESTIONS):
+        # Names starting with text; a scanned barcode / SKU comes first
+        key = product_key(text)
+        names = []
+        product = self.by_sku(text) if text else None
+        if product is not None:
+            names.append(product.name)
+        start = bisect_left(self._sorted, key)
+        for candidate in self._sorted[start:start + limit]:
+            if not candidate.startswith(key):
+                break
+            name = self._by_key[candidate].name
+            if name not in names:
+                names.append(name)
+        return names[:limit]
+
+    def names(self, limit=None):
+        keys = self._sorted if limit is None else self._sorted[:limit]
+        return [self._by_key[key].name for key in keys]
+
+
+def load_catalog():
+    # Worker side; the caller swaps the fresh catalog in on the UI thread
+    conn = require_connection()
+    try:
+        return ProductCatalog().load(conn)
+    finally:
+        conn.close()
+
+
+def save_product(name, sku=None, reorder_level=0):
+    # Create or update a catalog entry; returns the stored Product
+    sku = (sku or "").strip() or None
+    conn = require_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM products WHERE name = %s", (name,))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute("INSERT INTO products (name, sku, reorder_level) VALUES (%s, %s, %s)",
+                           (tidy_name(name), sku, int(reorder_level)))
+        else:
+            cursor.execute("UPDATE products SET sku = %s, reorder_level = %s WHERE id = %s",
+                           (sku, int(reorder_level), row[0]))
+        conn.commit()
+        cursor.execute(f"SELECT {PRODUCT_COLUMNS} FROM products WHERE name = %s", (name,))
+        return Product(*cursor.fetchone())
+    finally:
+        conn.close()
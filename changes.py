@@ -0,0 +1,293 @@
+import os
+import time
+import socket
+
+from db import require_connection
+from paged_view import SELECT_COLUMNS
+
+
+# ================== Change Version ==================
+# Every write to transactions leaves a marker in transaction_changes: UPDATE
+# and DELETE since schema v4, INSERT since v9, and archiving a month adds one
+# 'A' marker.  MAX(change_id) is therefore a version number for the whole
+# table that moves on every write, from any counter, the importer or the
+# archiver.  Checking it is a single primary-key lookup:
+#
+#   version unchanged    nothing to do
+#   version moved        read the markers after the last version, then only
+#                        the rows they name (one IN (...) query per 1000 ids)
+#   'A', log rebuilt or  reload instead of replaying row by row
+#   > MAX_EVENTS markers
+#
+#   INVENTORY_POLL_MS=3000    how often the app checks (0 = only the refresh button)
+#
+# Since v11 a marker also carries the product / date the row had before the
+# write, so a reader can drop just that product's and that day's results.
+# Every reader records how far it has read in change_readers; prune_changes()
+# deletes the markers all of them are past.  A reader that was away longer
+# than READER_DAYS may find its markers gone (below the floor) and reloads.
+# Positions are written at most once per REPORT_SECONDS per reader: polls
+# stay reads, and a position that lags only means pruning keeps more.
+
+POLL_MS = int(os.environ.get("INVENTORY_POLL_MS", "3000"))
+MAX_EVENTS = 2000
+RESET = "reset"
+READER_DAYS = 7
+FLOOR = "(pruned)"   # change_readers row: markers up to its change_id are deleted
+GAP_WINDOW = 1000    # ids / change_ids below a new watermark checked for gaps
+GAP_SECONDS = 600    # how long a gap is re-checked before it counts as a hole
+REPORT_SECONDS = 60  # min time between two change_readers writes of one reader
+
+VERSION_SQL = "SELECT MAX(change_id) FROM transaction_changes"
+
+
+def current_version(cursor=None):
+    if cursor is None:
+        conn = require_connection()
+        try:
+            return current_version(conn.cursor())
+        finally:
+            conn.close()
+    cursor.execute(VERSION_SQL)
+    return cursor.fetchone()[0] or 0
+
+
+# ---------------- Readers / pruning ----------------
+def reader_name(kind):
+    return f"{kind}@{socket.gethostname()}:{os.getpid()}"
+
+
+_reported = {}   # reader -> (change_id, time) of its last write from this process
+
+
+def report_position(cursor, reader, change_id, force=False):
+    # The reader has applied every marker up to change_id (caller commits).
+    # Skipped, returning False, when it was written less than REPORT_SECONDS
+    # ago, or hasn't moved since a write within the last day (seen_at still
+    # fresh for prune_changes), unless force is set
+    now = time.time()
+    last = _reported.get(reader)
+    if not force and last is not None:
+        age = now - last[1]
+        if age < REPORT_SECONDS or (last[0] == change_id and age < 86400):
+            return False
+    cursor.execute("DELETE FROM change_readers WHERE reader = %s", (reader,))
+    cursor.execute("INSERT INTO change_readers (reader, change_id, seen_at) VALUES (%s, %s, %s)",
+                   (reader, change_id, int(now)))
+    _reported[reader] = (change_id, now)
+    return True
+
+
+def pruned_floor(cursor):
+    # Markers up to this change_id are gone; a reader behind it has to reload
+    cursor.execute("SELECT change_id FROM change_readers WHERE reader = %s", (FLOOR,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def prune_changes(conn):
+    # Deletes the markers every reader seen in the last READER_DAYS is past.
+    # The newest marker always stays, so MAX(change_id) never goes back.
+    cursor = conn.cursor()
+    version = current_version(cursor)
+    cursor.execute("SELECT MIN(change_id) FROM change_readers WHERE reader <> %s AND seen_at >= %s",
+                   (FLOOR, int(time.time()) - READER_DAYS * 86400))
+    lowest = cursor.fetchone()[0]
+    floor = min(version if lowest is None else lowest, version - 1)
+    if floor <= pruned_floor(cursor):
+        return 0
+    cursor.execute("DELETE FROM transaction_changes WHERE change_id <= %s", (floor,))
+    pruned = cursor.rowcount
+    report_position(cursor, FLOOR, floor, force=True)
+    cursor.execute("DELETE FROM change_readers WHERE reader <> %s AND change_id < %s", (FLOOR, floor))
+    conn.commit()
+    return pruned
+
+
+class Gaps:
+    # Auto-increment values are handed out at insert time but become visible
+    # at commit, so on MySQL a concurrent writer's row (or change marker) can
+    # show up below a watermark that already moved past it.  note() records
+    # the ids a watermark skipped; readers re-read due() with their next sync
+    # until the id shows up (filled) or GAP_SECONDS pass (a rolled-back or
+    # deleted row leaves a hole that never fills).
+
+    def __init__(self, pending=None):
+        self.pending = dict(pending or {})   # id -> when it was first missing
+
+    def __bool__(self):
+        return bool(self.pending)
+
+    def note(self, low, high, seen):
+        # ids in (low, high] near the top that weren't in seen
+        now = time.time()
+        for missing in range(max(low, high - GAP_WINDOW) + 1, high + 1):
+            if missing not in seen:
+                self.pending.setdefault(missing, now)
+        if len(self.pending) > GAP_WINDOW:   # keep the re-read small: newest ids win
+            self.pending = {key: self.pending[key] for key in sorted(self.pending)[-GAP_WINDOW:]}
+
+    def due(self):
+        cutoff = time.time() - GAP_SECONDS
+        self.pending = {key: since for key, since in self.pending.items() if since >= cutoff}
+        return sorted(self.pending)
+
+    def filled(self, ids):
+        for key in ids:
+            self.pending.pop(int(key), None)
+
+    def clear(self):
+        self.pending.clear()
+
+
+def gaps_below(cursor, table, column, high, low=0):
+    # A watermark read straight from MAX(): ids just below it that aren't
+    # visible yet may still commit
+    low = max(low, high - GAP_WINDOW)
+    cursor.execute(f"SELECT {column} FROM {table} WHERE {column} > %s AND {column} <= %s", (low, high))
+    gaps = Gaps()
+    gaps.note(low, high, {int(value) for (value,) in cursor.fetchall()})
+    return gaps
+
+
+def change_position(cursor=None):
+    # -> (current_version, Gaps below it) for a reader starting from scratch
+    if cursor is None:
+        conn = require_connection()
+        try:
+            return change_position(conn.cursor())
+        finally:
+            conn.close()
+    version = current_version(cursor)
+    return version, gaps_below(cursor, "transaction_changes", "change_id", version, pruned_floor(cursor))
+
+
+def in_list(column, ids):
+    # -> (" OR column IN (...)", params) for the late ids, or ("", [])
+    if not ids:
+        return "", []
+    return f" OR {column} IN ({', '.join(['%s'] * len(ids))})", list(ids)
+
+
+def was(markers):
+    # {txn_id: [(product, date), ...]}: what the rows looked like before the
+    # (txn_id, op, product, trans_date) update / delete markers; v11 markers
+    # only, older ones carry no product
+    before = {}
+    for txn_id, op, product, trans_date in markers:
+        if op in ("U", "D") and product is not None:
+            pair = (product, str(trans_date)[:10])
+            if pair not in before.setdefault(int(txn_id), []):
+                before[int(txn_id)].append(pair)
+    return before
+
+
+class ChangeWatcher:
+    # poll() runs on the worker (reads, and records how far the watcher got);
+    # accept() on the UI thread moves the version and turns the markers into
+    # feed-style events ({"op": "insert" | "update" | "delete", "id", "row",
+    # "was"}, see api_client; "was": [(product, date), ...] before the write).
+    #
+    # The app's own writes are already on screen: record() them when they
+    # finish and accept() drops their markers.  A marker that arrives before
+    # its record() is treated like anyone else's write, so applying events
+    # has to be idempotent.
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.max_events = max_events
+        self.reader = reader_name("watch")
+        self.version = None
+        self.generation = 0   # polls started; dates the own-write records
+        self._own = {}        # (op, txn_id) -> generation when recorded
+        self.gaps = Gaps()    # change_ids skipped below the version
+
+    def rebase(self, version, gaps=None):
+        # The caller's data is current as of this version (see change_position)
+        self.version = version
+        self._own.clear()
+        self.gaps = gaps or Gaps()
+
+    def record(self, op, *txn_ids):
+        # UI thread, after one of this app's writes committed (op: I / U / D)
+        if self.version is not None:
+            for txn_id in txn_ids:
+                self._own[(op, int(txn_id))] = self.generation
+
+    # ---- worker ----
+    def poll(self):
+        self.generation += 1
+        result = {"since": self.version, "generation": self.generation, "markers": [], "rows": {}, "was": {}}
+        conn = require_connection()
+        try:
+            cursor = conn.cursor()
+            version = result["version"] = current_version(cursor)
+            since = result["since"]
+            late = self.gaps.due()
+            if since is None or (version == since and not late):
+                return result
+            if report_position(cursor, self.reader, since):
+                conn.commit()
+            if version < since or since < pruned_floor(cursor):
+                result["reset"] = True   # change log emptied / pruned past us / different database
+                return result
+
+            extra, params = in_list("change_id", late)
+            cursor.execute(
+                "SELECT change_id, txn_id, op, product, trans_date FROM transaction_changes "
+                f"WHERE (change_id > %s AND change_id <= %s){extra} ORDER BY change_id LIMIT %s",
+                tuple([since, version] + params + [self.max_events + 1])
+            )
+            rows = cursor.fetchall()
+            markers = [(op, int(txn_id)) for _, txn_id, op, _, _ in rows]
+            if len(markers) > self.max_events or any(op == "A" for op, _ in markers):
+                result["reset"] = True   # bulk import / archiving: cheaper to reload
+                return result
+            seen = {int(row[0]) for row in rows}
+            self.gaps.filled(seen)
+            self.gaps.note(since, version, seen)
+            result["was"] = was([row[1:] for row in rows])
+
+            ids = sorted({txn_id for _, txn_id in markers})
+            for start in range(0, len(ids), 1000):
+                chunk = ids[start:start + 1000]
+                cursor.execute(
+                    f"SELECT {SELECT_COLUMNS} FROM transactions WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+                    tuple(chunk)
+                )
+                result["rows"].update((int(row[0]), row) for row in cursor.fetchall())
+            result["markers"] = markers
+        finally:
+            conn.close()
+        return result
+
+    # ---- UI thread ----
+    def accept(self, result):
+        # None: stale result (rebased meanwhile); RESET: reload everything;
+        # otherwise the events of other writers, in marker order
+        if result["since"] != self.version:
+            return None
+        if result.get("reset"):
+            self.rebase(result["version"])
+            return RESET
+        self.version = result["version"]
+
+        ops = {}
+        for marker in result["markers"]:
+            if self._own.pop(marker, None) is None:
+                ops.setdefault(marker[1], []).append(marker[0])
+        # what a poll started after the write didn't see is not coming
+        self._own = {marker: generation for marker, generation in self._own.items()
+                     if generation >= result["generation"]}
+
+        events = []
+        for txn_id, txn_ops in ops.items():
+            row = result["rows"].get(txn_id)
+            before = result["was"].get(txn_id, [])
+            if row is None:
+                if "I" not in txn_ops:   # inserted and deleted in between: nothing to show
+                    events.append({"op": "delete", "id": txn_id, "was": before})
+            elif "I" in txn_ops:
+                events.append({"op": "insert", "id": txn_id, "row": row})
+            else:
+                events.append({"op": "update", "id": txn_id, "row": row, "was": before})
+        return events
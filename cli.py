@@ -0,0 +1,207 @@
+import os
+import re
+import sys
+import csv
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+from archive import month_bounds
+from db import close_pool
+from export import export_transactions, export_xlsx, export_csv, iter_transaction_chunks
+from filters import make_filter
+from report import generate_report
+
+
+# ================== Headless Reports / Exports ==================
+# The report and export code without Tk, for scripts and month-end runs:
+#
+#   python cli.py export transactions.xlsx [--start D] [--end D] [--product P] [--type Sale]
+#   python cli.py report report.pdf --start 2024-04-01 --end 2024-04-30 [--product P]
+#   python cli.py month-end 2024-04 [--out month_end] [--formats pdf,xlsx] [--workers N]
+#
+# month-end reads the month once, in (date, id) order (archived months
+# included), splits the rows by product and hands each product's rows to a
+# process pool that writes its PDF / Excel files.  Every file comes from that
+# one read, so they all agree with each other and with summary.csv, and the
+# workers never touch the database.
+
+FORMATS = ("pdf", "xlsx", "csv")
+SUMMARY_HEADERS = ["Product", "Rows", "Purchase Qty", "Purchase Amount", "Sale Qty", "Sale Amount", "Files"]
+
+
+def _date(text):
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{text!r} is not a YYYY-MM-DD date")
+
+
+def _month(text):
+    if not re.fullmatch(r"\d{4}-\d{2}", text) or not 1 <= int(text[5:]) <= 12:
+        raise argparse.ArgumentTypeError(f"{text!r} is not a YYYY-MM month")
+    return text
+
+
+def safe_name(product):
+    return re.sub(r"[^\w.-]+", "_", product).strip("_") or "product"
+
+
+def file_names(products):
+    # {product: file name stem}; products whose safe names would clash ("Pen/Blue"
+    # and "Pen Blue", or "Pen" and "pen" on a case-insensitive disk) get a short
+    # hash of the real name appended, so parallel workers never share a file
+    groups = {}
+    for product in products:
+        groups.setdefault(safe_name(product).casefold(), []).append(product)
+    names = {}
+    for clashing in groups.values():
+        for product in clashing:
+            name = safe_name(product)
+            if len(clashing) > 1:
+                name += "_" + hashlib.sha1(product.encode("utf-8")).hexdigest()[:8]
+            names[product] = name
+    return names
+
+
+def _progress(label):
+    def show(done, total):
+        print(f"\r{label}: {done}" + (f" / {total}" if total else "") + " rows", end="", file=sys.stderr, flush=True)
+    return show
+
+
+# ---------------- Month-end ----------------
+def read_snapshot(start, end, products=None):
+    # {product: [rows in date, id order]} for the range, from a single read
+    flt = make_filter(start, end, products)
+    by_product = {}
+    for rows in iter_transaction_chunks(flt, order_by="date, id"):
+        for row in rows:
+            by_product.setdefault(row[1], []).append(row)
+    return by_product
+
+
+def render_product(product, rows, month, out_dir, formats, name=None):
+    # Runs in a pool process: writes one product's files from its rows
+    started = time.perf_counter()
+    start, end = month_bounds(month)
+    base = os.path.join(out_dir, f"{name or safe_name(product)}_{month}")
+    files = []
+    if "pdf" in formats:
+        generate_report(base + ".pdf", start, end, chunks=[rows], subtitle=f"Product: {product}")
+        files.append(base + ".pdf")
+    if "xlsx" in formats:
+        export_xlsx(base + ".xlsx", chunks=[rows])
+        files.append(base + ".xlsx")
+    if "csv" in formats:
+        export_csv(base + ".csv", chunks=[rows])
+        files.append(base + ".csv")
+
+    totals = {"Purchase": [0, 0], "Sale": [0, 0]}
+    for _, _, qty, _, trans_type, _, amount in rows:
+        if trans_type in totals:
+            totals[trans_type][0] += int(qty)
+            totals[trans_type][1] += float(amount)
+    return {"product": product, "rows": len(rows), "files": files, "totals": totals,
+            "seconds": time.perf_counter() - started}
+
+
+def month_end(month, out_dir, formats=("pdf", "xlsx"), workers=None, products=None):
+    # Returns (results, failures); failures: [(product, error)]
+    start, end = month_bounds(month)
+    os.makedirs(out_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    snapshot = read_snapshot(start, end, products)
+    close_pool()  # the pool processes must not inherit open DB connections
+    total_rows = sum(len(rows) for rows in snapshot.values())
+    print(f"📦 {month}: {total_rows} rows, {len(snapshot)} products read in "
+          f"{time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    results, failures = [], []
+    # biggest products first, so one large product doesn't finish last
+    order = sorted(snapshot, key=lambda product: len(snapshot[product]), reverse=True)
+    names = file_names(order)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(render_product, product, snapshot[product], month, out_dir, tuple(formats),
+                        names[product]): product
+            for product in order
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            product = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures.append((product, e))
+                print(f"❌ [{done}/{len(futures)}] {product}: {e}", file=sys.stderr)
+                continue
+            results.append(result)
+            print(f"✅ [{done}/{len(futures)}] {product}: {result['rows']} rows, {result['seconds']:.1f}s",
+                  file=sys.stderr)
+
+    results.sort(key=lambda result: result["product"])
+    with open(os.path.join(out_dir, "summary.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(SUMMARY_HEADERS)
+        for result in results:
+            purchase, sale = result["totals"]["Purchase"], result["totals"]["Sale"]
+            writer.writerow([result["product"], result["rows"], purchase[0], f"{purchase[1]:.2f}",
+                             sale[0], f"{sale[1]:.2f}", " ".join(os.path.basename(f) for f in result["files"])])
+
+    print(f"🏁 {len(results)} products, {sum(len(r['files']) for r in results)} files in "
+          f"{time.perf_counter() - started:.1f}s -> {os.path.abspath(out_dir)}", file=sys.stderr)
+    return results, failures
+
+
+# ---------------- Main ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inventory reports and exports without the GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Excel / CSV export (.xlsx, .csv, .csv.gz)")
+    export.add_argument("file")
+    report = commands.add_parser("report", help="PDF report for a date range")
+    report.add_argument("file")
+    for command in (export, report):
+        command.add_argument("--start", type=_date, required=command is report)
+        command.add_argument("--end", type=_date, required=command is report)
+        command.add_argument("--product", action="append", help="exact product name (repeatable)")
+    export.add_argument("--type", choices=["Sale", "Purchase"])
+
+    month = commands.add_parser("month-end", help="one PDF + Excel file per product for a month")
+    month.add_argument("month", type=_month, help="YYYY-MM")
+    month.add_argument("--out", help="output folder (default month_end/<month>)")
+    month.add_argument("--formats", default="pdf,xlsx", help=f"comma-separated, from {', '.join(FORMATS)}")
+    month.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    month.add_argument("--product", action="append", help="only these products (repeatable)")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "export":
+            flt = make_filter(args.start, args.end, args.product, trans_type=args.type)
+            rows = export_transactions(args.file, flt, progress=_progress("Export"))
+            print(f"\n✅ {rows} rows -> {args.file}", file=sys.stderr)
+        elif args.command == "report":
+            flt = make_filter(products=args.product) if args.product else None
+            rows = generate_report(args.file, args.start, args.end, progress=_progress("Report"), flt=flt,
+                                   subtitle=", ".join(args.product) if args.product else None)
+            print(f"\n✅ {rows} rows -> {args.file}", file=sys.stderr)
+        else:
+            formats = [name.strip().lower() for name in args.formats.split(",") if name.strip()]
+            unknown = set(formats) - set(FORMATS)
+            if unknown:
+                parser.error(f"unknown format(s): {', '.join(sorted(unknown))}")
+            out_dir = args.out or os.path.join("month_end", args.month)
+            _, failures = month_end(args.month, out_dir, formats, args.workers, args.product)
+            if failures:
+                return 1
+    finally:
+        close_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
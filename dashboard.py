@@ -0,0 +1,123 @@
+from decimal import Decimal
+
+
+# ================== Dashboard Totals Engine ==================
+# All dashboard KPIs come from one grouped scan (load) and are then kept
+# current in memory from the delta of every add / update / delete.
+
+TRANSACTION_TYPES = ("Purchase", "Sale")
+
+KPI_SQL = """
+    SELECT transaction_type, COUNT(*), SUM(amount), SUM(qty), SUM(qty * rate)
+    FROM transactions
+    GROUP BY transaction_type
+"""
+
+CENT = Decimal("0.01")
+
+
+def _money(value):
+    # Floats (SQLite sums, Python-side amounts) are snapped to paise so the
+    # running totals don't drift from what a fresh SUM() would report
+    if value is None:
+        return Decimal(0)
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENT)
+
+
+class DashboardTotals:
+
+    def __init__(self):
+        self.loaded = False
+        self.reset()
+
+    def reset(self):
+        # per type: row count, SUM(amount), SUM(qty), SUM(qty * rate)
+        self.totals = {
+            t: {"count": 0, "amount": Decimal(0), "qty": 0, "value": Decimal(0)}
+            for t in TRANSACTION_TYPES
+        }
+
+    def load(self, conn):
+        cursor = conn.cursor()
+        cursor.execute(KPI_SQL)
+        rows = cursor.fetchall()
+        cursor.close()
+        self.load_rows(rows)
+
+    def load_rows(self, rows):
+        # rows: (transaction_type, count, SUM(amount), SUM(qty), SUM(qty * rate))
+        self.reset()
+        for trans_type, count, amount, qty, value in rows:
+            if trans_type not in self.totals:
+                continue
+            self.totals[trans_type] = {
+                "count": int(count or 0),
+                "amount": _money(amount),
+                "qty": int(qty or 0),
+                "value": _money(value),
+            }
+        self.loaded = True
+
+    def add_rows(self, rows):
+        # Add more KPI rows (same shape as load_rows), e.g. archived months
+        for trans_type, count, amount, qty, value in rows:
+            bucket = self.totals.get(trans_type)
+            if bucket is None:
+                continue
+            bucket["count"] += int(count or 0)
+            bucket["amount"] += _money(amount)
+            bucket["qty"] += int(qty or 0)
+            bucket["value"] += _money(value)
+
+    def update_from(self, other):
+        # Adopt totals loaded elsewhere (e.g. by a background worker)
+        self.totals = other.totals
+        self.loaded = other.loaded
+
+    # ---- incremental updates ----
+    def _apply(self, trans_type, qty, rate, amount, sign):
+        bucket = self.totals.get(trans_type)
+        if bucket is None:
+            return
+        qty = int(qty)
+        bucket["count"] += sign
+        bucket["qty"] += sign * qty
+        bucket["amount"] += sign * _money(amount)
+        bucket["value"] += sign * qty * _money(rate)
+
+    def add(self, trans_type, qty, rate, amount):
+        self._apply(trans_type, qty, rate, amount, 1)
+
+    def remove(self, trans_type, qty, rate, amount):
+        self._apply(trans_type, qty, rate, amount, -1)
+
+    def replace(self, old, new):
+        # old / new: (trans_type, qty, rate, amount)
+        self.remove(*old)
+        self.add(*new)
+
+    # ---- derived KPIs ----
+    def row_count(self):
+        return sum(bucket["count"] for bucket in self.totals.values())
+
+    def kpis(self):
+        purchase = self.totals["Purchase"]
+        sale = self.totals["Sale"]
+        return {
+            "purchase_total": purchase["amount"],
+            "sale_total": sale["amount"],
+            "profit": sale["amount"] - purchase["amount"],
+            "inventory_qty": purchase["qty"] - sale["qty"],
+            "inventory_amt": purchase["value"] - sale["value"],
+        }
+
+
+def fetch_delta_row(cursor, trans_id):
+    # (trans_type, qty, rate, amount) of a stored row, read before it is changed
+    cursor.execute(
+        "SELECT transaction_type, qty, rate, amount FROM transactions WHERE id = %s",
+        (trans_id,)
+    )
+    return cursor.fetchone()
@@ -0,0 +1,377 @@
+import os
+import time
+import queue
+import sqlite3
+import threading
+import configparser
+from datetime import date, datetime
+from decimal import Decimal
+
+import perf
+
+
+# ================== Configuration ==================
+# Settings come from db_config.ini ([database] section) and can be overridden
+# with INVENTORY_DB_* environment variables, e.g. INVENTORY_DB_PASSWORD.
+CONFIG_FILE = os.environ.get("INVENTORY_DB_CONFIG", "db_config.ini")
+
+DEFAULT_CONFIG = {
+    "backend": "mysql",          # mysql | sqlite (local stand-in)
+    "host": "127.0.0.1",
+    "port": "3306",
+    "user": "root",
+    "password": "",
+    "database": "champs",
+    "sqlite_path": "inventory.db",
+    "connection_timeout": "5",
+    "pool_size": "5",
+    "pool_timeout": "10",        # seconds to wait for a free connection
+    "health_check_interval": "30",  # ping connections idle longer than this
+}
+
+
+def load_db_config(path=None):
+    config = dict(DEFAULT_CONFIG)
+
+    parser = configparser.ConfigParser()
+    if parser.read(path or CONFIG_FILE) and parser.has_section("database"):
+        config.update(parser["database"])
+
+    for key in DEFAULT_CONFIG:
+        env_value = os.environ.get("INVENTORY_DB_" + key.upper())
+        if env_value is not None:
+            config[key] = env_value
+
+    return config
+
+
+# ================== SQLite Stand-in ==================
+# The app's SQL is written for mysql.connector (%s placeholders, date/Decimal
+# values).  These adapters let the same statements run against SQLite.
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_adapter(Decimal, float)
+
+
+class SQLiteCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(sql.replace("%s", "?"), tuple(params or ()))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(sql.replace("%s", "?"), seq_of_params)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+
+def is_duplicate_key(error):
+    # A unique index rejected the write (MySQL ER_DUP_ENTRY / SQLite UNIQUE constraint)
+    if isinstance(error, sqlite3.IntegrityError):
+        return "UNIQUE" in str(error)
+    return getattr(error, "errno", None) == 1062
+
+
+def _open_mysql(config):
+    import mysql.connector
+
+    return mysql.connector.connect(
+        host=config["host"],
+        port=int(config["port"]),
+        user=config["user"],
+        password=config["password"],
+        database=config["database"],
+        use_pure=True,
+        connection_timeout=int(config["connection_timeout"])
+    )
+
+
+def _open_sqlite(config):
+    return sqlite3.connect(
+        config["sqlite_path"],
+        timeout=int(config["connection_timeout"]),
+        check_same_thread=False  # pooled connections move between threads
+    )
+
+
+# ================== Pooled Connection ==================
+class PooledConnection:
+    # Behaves like a mysql.connector connection, but close() hands the
+    # underlying connection back to the pool instead of disconnecting.
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._cursors = []
+        self.dialect = pool.dialect
+
+    def cursor(self, *args, **kwargs):
+        if self.dialect == "sqlite":
+            cursor = SQLiteCursor(self._raw.cursor())
+        else:
+            cursor = self._raw.cursor(*args, **kwargs)
+        if perf.ENABLED:
+            cursor = perf.TimedCursor(cursor)
+        self._cursors.append(cursor)
+        return cursor
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def close(self):
+        if self._raw is None:
+            return
+        raw, self._raw = self._raw, None
+        cursors, self._cursors = self._cursors, []
+        self._pool._release(raw, cursors)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._raw is not None:
+            try:
+                self._raw.rollback()
+            except Exception:
+                pass
+        self.close()
+
+    def __del__(self):
+        # Safety net for handlers that bail out before calling close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+# ================== Connection Pool ==================
+class ConnectionPool:
+
+    def __init__(self, config=None):
+        self.config = config or load_db_config()
+        self.dialect = self.config["backend"].lower()
+        if self.dialect not in ("mysql", "sqlite"):
+            raise ValueError(f"Unknown database backend: {self.dialect}")
+
+        self.size = max(1, int(self.config["pool_size"]))
+        self.timeout = float(self.config["pool_timeout"])
+        self.health_check_interval = float(self.config["health_check_interval"])
+
+        self._idle = queue.LifoQueue()  # most recently used first (warmest)
+        self._lock = threading.Lock()
+        self._open_count = 0
+        self._stats = {
+            "created": 0,
+            "borrowed": 0,
+            "returned": 0,
+            "reconnects": 0,
+            "discarded": 0,
+            "failures": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    # ---- raw connection helpers ----
+    def _open(self):
+        if self.dialect == "sqlite":
+            raw = _open_sqlite(self.config)
+        else:
+            raw = _open_mysql(self.config)
+        with self._lock:
+            self._stats["created"] += 1
+        return raw
+
+    def _is_alive(self, raw):
+        try:
+            if self.dialect == "sqlite":
+                raw.execute("SELECT 1").fetchone()
+            else:
+                raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open_count -= 1
+            self._stats["discarded"] += 1
+
+    # ---- borrow / return ----
+    def get(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        entry = None
+
+        try:
+            entry = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._open_count < self.size
+                if can_open:
+                    self._open_count += 1
+            if can_open:
+                try:
+                    entry = (self._open(), time.monotonic())
+                except Exception:
+                    with self._lock:
+                        self._open_count -= 1
+                        self._stats["failures"] += 1
+                    raise
+            else:
+                with self._lock:
+                    self._stats["waits"] += 1
+                try:
+                    entry = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats["failures"] += 1
+                    raise TimeoutError(f"No free database connection within {timeout}s")
+
+        raw, last_used = entry
+
+        # Health check: only ping connections that sat idle for a while
+        if time.monotonic() - last_used > self.health_check_interval and not self._is_alive(raw):
+            self._discard(raw)
+            with self._lock:
+                self._open_count += 1
+                self._stats["reconnects"] += 1
+            try:
+                raw = self._open()
+            except Exception:
+                with self._lock:
+                    self._open_count -= 1
+                    self._stats["failures"] += 1
+                raise
+
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._stats["borrowed"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+        perf.record("db.pool_wait", waited * 1000)
+
+        return PooledConnection(self, raw)
+
+    def _release(self, raw, cursors=()):
+        try:
+            for cursor in cursors:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+            # End any open transaction so the next borrower doesn't see a stale snapshot
+            raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+
+        with self._lock:
+            self._stats["returned"] += 1
+        self._idle.put((raw, time.monotonic()))
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["open"] = self._open_count
+        snapshot["idle"] = self._idle.qsize()
+        snapshot["in_use"] = snapshot["open"] - snapshot["idle"]
+        snapshot["size"] = self.size
+        return snapshot
+
+    def close_all(self):
+        while True:
+            try:
+                raw, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(raw)
+
+
+# ================== Module-level Pool ==================
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def configure_pool(config=None, **overrides):
+    # Replace the shared pool, e.g. to point the app at a local SQLite file
+    global _pool
+    config = dict(config or load_db_config())
+    config.update({key: str(value) for key, value in overrides.items()})
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = ConnectionPool(config)
+        return _pool
+
+
+def connect_db():
+    try:
+        return get_pool().get()
+    except Exception as err:
+        print("⛔ DB connection error:", err)
+        return None
+
+
+def require_connection():
+    # Like connect_db(), but raises instead of returning None (for worker jobs)
+    return get_pool().get()
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
@@ -0,0 +1,101 @@
+import csv
+import gzip
+
+import perf
+from archive import ArchiveSource, merge_chunks
+from db import require_connection
+from filters import where_sql
+from paged_view import SELECT_COLUMNS
+
+
+# ================== Streaming Export ==================
+# Rows are streamed from an unbuffered cursor in chunks and written straight
+# to disk, so memory stays flat no matter how large the table is.  Rows of
+# archived months (see archive.py) are merged in, in the same order.
+
+EXPORT_HEADERS = ["ID", "Product", "Qty", "Date", "Type", "Rate", "Amount"]
+CHUNK_SIZE = 5000
+
+
+def count_rows(flt=None):
+    return ArchiveSource().count_rows(flt)
+
+
+def iter_transaction_chunks(flt=None, chunk_size=CHUNK_SIZE, order_by="id"):
+    return merge_chunks(_iter_live_chunks(flt, chunk_size, order_by), flt, order_by, chunk_size)
+
+
+def _iter_live_chunks(flt=None, chunk_size=CHUNK_SIZE, order_by="id"):
+    where, params = where_sql(flt)
+    conn = require_connection()
+    try:
+        # Unbuffered: mysql.connector reads rows off the socket as they are fetched
+        cursor = conn.cursor(buffered=False) if conn.dialect == "mysql" else conn.cursor()
+        cursor.execute(
+            f"SELECT {SELECT_COLUMNS} FROM transactions{where} ORDER BY {order_by}",
+            tuple(params)
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+@perf.timed("export.xlsx")
+def export_xlsx(file_path, flt=None, progress=None, chunk_size=CHUNK_SIZE, chunks=None):
+    # chunks: rows already read (e.g. a batch run's snapshot) instead of a query
+    import openpyxl
+
+    total = count_rows(flt) if progress and chunks is None else None
+    if chunks is None:
+        chunks = iter_transaction_chunks(flt, chunk_size)
+
+    # Write-only workbook: rows are flushed to a temp file instead of kept as cells
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Transactions")
+    ws.append(EXPORT_HEADERS)
+
+    done = 0
+    for rows in chunks:
+        for row in rows:
+            ws.append(row)
+        done += len(rows)
+        if progress:
+            progress(done, total)
+
+    wb.save(file_path)
+    return done
+
+
+@perf.timed("export.csv")
+def export_csv(file_path, flt=None, progress=None, chunk_size=CHUNK_SIZE, chunks=None):
+    # Fast path for very large dumps; "*.gz" paths are gzip-compressed
+    total = count_rows(flt) if progress and chunks is None else None
+    if chunks is None:
+        chunks = iter_transaction_chunks(flt, chunk_size)
+
+    if file_path.endswith(".gz"):
+        f = gzip.open(file_path, "wt", newline="", encoding="utf-8")
+    else:
+        f = open(file_path, "w", newline="", encoding="utf-8")
+
+    done = 0
+    with f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_HEADERS)
+        for rows in chunks:
+            writer.writerows(rows)
+            done += len(rows)
+            if progress:
+                progress(done, total)
+    return done
+
+
+def export_transactions(file_path, flt=None, progress=None):
+    lower = file_path.lower()
+    if lower.endswith(".csv") or lower.endswith(".csv.gz"):
+        return export_csv(file_path, flt, progress)
+    return export_xlsx(file_path, flt, progress)
@@ -0,0 +1,178 @@
+from datetime import date, datetime
+
+
+# ================== Transaction Filters ==================
+# A filter is a plain dict, e.g. {"start": date, "end": date, "products": [...]}.
+# The same dict is turned into SQL here, evaluated directly by the local
+# cache, and used as a cache key, so every layer agrees on what it means.
+#
+#   start / end    inclusive date range (either side optional)
+#   products       exact product names (resolved by the search index); in
+#                  SQL they become catalog ids (transactions.product_id)
+#   product_like   substring match, when the index can't resolve a keyword
+#   trans_type     "Sale" / "Purchase"
+#   min_<col> / max_<col>   inclusive bounds on id, qty, rate or amount
+#   sort           column to order by, "-" prefix for descending; not a
+#                  condition on rows (default "-id", newest first)
+
+# Transaction columns in SELECT order; a row's sort value is row[SORT_COLUMNS.index(column)]
+SORT_COLUMNS = ("id", "product", "qty", "date", "transaction_type", "rate", "amount")
+RANGE_COLUMNS = ("id", "qty", "rate", "amount")
+DEFAULT_SORT = "-id"
+
+def as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), "%Y-%m-%d").date()
+
+
+def make_filter(start=None, end=None, products=None, product_like=None, trans_type=None, ranges=None, sort=None):
+    # ranges: {column: (low, high)}, either bound may be None
+    flt = {}
+    if start:
+        flt["start"] = as_date(start)
+    if end:
+        flt["end"] = as_date(end)
+    if products is not None:
+        flt["products"] = sorted(set(products))
+    if product_like:
+        flt["product_like"] = product_like
+    if trans_type:
+        # stored values are capitalised; an exact match can use idx_type_date
+        flt["trans_type"] = trans_type.strip().capitalize()
+    for column, (low, high) in (ranges or {}).items():
+        if column not in RANGE_COLUMNS:
+            raise ValueError(f"{column} has no range filter")
+        cast = float if column in ("rate", "amount") else int
+        if low is not None:
+            flt[f"min_{column}"] = cast(low)
+        if high is not None:
+            flt[f"max_{column}"] = cast(high)
+    if sort and sort != DEFAULT_SORT:
+        if sort.lstrip("-") not in SORT_COLUMNS:
+            raise ValueError(f"Can't sort by {sort}")
+        flt["sort"] = sort
+    return flt
+
+
+def parse_range(text, cast=float):
+    # "10..50" / "10-50" / "10 to 50" / ">=10" / "<=50" / "10" -> inclusive
+    # (low, high), either side may be None; raises ValueError
+    text = text.strip()
+    for prefix, side in ((">=", 0), ("<=", 1), (">", 0), ("<", 1)):
+        if text.startswith(prefix):
+            value = cast(text[len(prefix):].strip())
+            return (value, None) if side == 0 else (None, value)
+    for separator in ("..", " to ", "-"):
+        low, found, high = text.partition(separator)
+        if found and low.strip() and high.strip():
+            try:
+                return cast(low.strip()), cast(high.strip())
+            except ValueError:
+                continue   # "-" inside a date
+    value = cast(text)
+    return value, value
+
+
+def sort_order(flt):
+    # -> (column, descending)
+    sort = (flt or {}).get("sort", DEFAULT_SORT)
+    return sort.lstrip("-"), sort.startswith("-")
+
+
+def without_sort(flt):
+    # The row conditions only (counts, totals and exports don't depend on the order)
+    return {key: value for key, value in (flt or {}).items() if key != "sort"}
+
+
+def cursor_key(flt, row):
+    # Keyset paging position of a row: its id in the default order, otherwise
+    # (sort value, id); ties are broken by id in the sort's direction
+    column, _ = sort_order(flt)
+    if column == "id":
+        return int(row[0])
+    return (row[SORT_COLUMNS.index(column)], int(row[0]))
+
+
+def filter_sql(flt):
+    # -> (clauses, params) for a WHERE on transactions
+    flt = flt or {}
+    clauses, params = [], []
+
+    if "start" in flt and "end" in flt:
+        clauses.append("date BETWEEN %s AND %s")
+        params += [flt["start"], flt["end"]]
+    elif "start" in flt:
+        clauses.append("date >= %s")
+        params.append(flt["start"])
+    elif "end" in flt:
+        clauses.append("date <= %s")
+        params.append(flt["end"])
+
+    if "products" in flt:
+        if flt["products"]:
+            # names -> catalog ids once, then integer lookups on idx_product_id_date
+            marks = ", ".join(["%s"] * len(flt["products"]))
+            clauses.append(f"product_id IN (SELECT id FROM products WHERE name IN ({marks}))")
+            params += flt["products"]
+        else:
+            clauses.append("1 = 0")
+
+    if "product_like" in flt:
+        clauses.append("product LIKE %s")
+        params.append(f"%{flt['product_like']}%")
+
+    if "trans_type" in flt:
+        clauses.append("transaction_type = %s")
+        params.append(flt["trans_type"])
+
+    for column in RANGE_COLUMNS:
+        if f"min_{column}" in flt:
+            clauses.append(f"{column} >= %s")
+            params.append(flt[f"min_{column}"])
+        if f"max_{column}" in flt:
+            clauses.append(f"{column} <= %s")
+            params.append(flt[f"max_{column}"])
+
+    return clauses, params
+
+
+def where_sql(flt):
+    clauses, params = filter_sql(flt)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def row_matcher(flt):
+    # Python predicate with the same meaning as filter_sql(), for rows that
+    # don't come from SQL (archive files); rows are in SELECT_COLUMNS order
+    flt = flt or {}
+    start = flt.get("start")
+    end = flt.get("end")
+    products = set(flt["products"]) if "products" in flt else None
+    like = flt["product_like"].lower() if "product_like" in flt else None
+    trans_type = flt.get("trans_type")
+    bounds = [
+        (SORT_COLUMNS.index(column), flt.get(f"min_{column}"), flt.get(f"max_{column}"))
+        for column in RANGE_COLUMNS if f"min_{column}" in flt or f"max_{column}" in flt
+    ]
+
+    def matches(row):
+        _, product, _, trans_date, row_type, _, _ = row
+        return ((start is None or trans_date >= start)
+                and (end is None or trans_date <= end)
+                and (products is None or product in products)
+                and (like is None or like in product.lower())
+                and (trans_type is None or row_type == trans_type)
+                and all((low is None or row[index] >= low) and (high is None or row[index] <= high)
+                        for index, low, high in bounds))
+    return matches
+
+
+def filter_key(flt):
+    # Hashable, order-independent form of a filter
+    return tuple(sorted(
+        (key, tuple(value) if isinstance(value, list) else value)
+        for key, value in (flt or {}).items()
+    ))
@@ -0,0 +1,133 @@
+import csv
+import os
+
+import perf
+from catalog import canonical_rows
+from db import require_connection
+from validation import validate_transaction, parse_date, ValidationError
+
+
+# ================== Bulk Import ==================
+# Reads supplier invoices / POS exports (CSV or .xlsx), validates every row
+# with the same rules as the entry form and inserts the good rows with
+# batched executemany() calls, one transaction per batch.
+
+BATCH_SIZE = 1000
+
+INSERT_SQL = """
+    INSERT INTO transactions (product, qty, date, transaction_type, rate, amount)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+# Accepted header spellings -> field name
+HEADER_ALIASES = {
+    "product": "product",
+    "item": "product",
+    "qty": "qty",
+    "quantity": "qty",
+    "date": "date",
+    "type": "trans_type",
+    "transaction type": "trans_type",
+    "transaction_type": "trans_type",
+    "rate": "rate",
+    "price": "rate",
+}
+REQUIRED_FIELDS = ("product", "qty", "date", "trans_type", "rate")
+
+
+def _read_csv(file_path):
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.reader(f)
+
+
+def _read_xlsx(file_path):
+    import openpyxl
+
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def read_rows(file_path):
+    # Yields (line_number, {field: value}) for every data row
+    if file_path.lower().endswith((".xlsx", ".xlsm")):
+        rows = _read_xlsx(file_path)
+    else:
+        rows = _read_csv(file_path)
+
+    header = next(rows, None)
+    if header is None:
+        return
+
+    columns = {}
+    for index, name in enumerate(header):
+        field = HEADER_ALIASES.get(str(name or "").strip().lower())
+        if field and field not in columns:
+            columns[field] = index
+
+    missing = [field for field in REQUIRED_FIELDS if field not in columns]
+    if missing:
+        raise ValueError(f"Missing column(s) in {os.path.basename(file_path)}: {', '.join(missing)}")
+
+    for line_number, row in enumerate(rows, start=2):
+        if not row or all(value in (None, "") for value in row):
+            continue  # blank line
+        yield line_number, {
+            field: (row[index] if index < len(row) else None)
+            for field, index in columns.items()
+        }
+
+
+@perf.timed("import.file")
+def import_transactions(file_path, batch_size=BATCH_SIZE, progress=None):
+    # Returns {"inserted": n, "rejected": [(line_number, reason, raw_row), ...]}
+    inserted = 0
+    rejected = []
+    batch = []
+
+    conn = require_connection()
+    try:
+        cursor = conn.cursor()
+
+        def flush():
+            nonlocal inserted
+            cursor.executemany(INSERT_SQL, canonical_rows(cursor, batch))
+            conn.commit()
+            inserted += len(batch)
+            batch.clear()
+            if progress:
+                progress(inserted, len(rejected))
+
+        for line_number, raw in read_rows(file_path):
+            try:
+                product, trans_type, qty, rate = validate_transaction(
+                    raw["product"], raw["trans_type"], raw["qty"], raw["rate"]
+                )
+                trans_date = parse_date(raw["date"])
+            except ValidationError as e:
+                rejected.append((line_number, str(e), raw))
+                continue
+
+            batch.append((product, qty, trans_date, trans_type, rate, round(qty * rate, 2)))
+            if len(batch) >= batch_size:
+                flush()
+
+        if batch:
+            flush()
+    finally:
+        conn.close()
+
+    return {"inserted": inserted, "rejected": rejected}
+
+
+def write_rejects(file_path, rejected):
+    # Rejected rows go next to the source file so they can be fixed and re-imported
+    rejects_path = os.path.splitext(file_path)[0] + "_rejected.csv"
+    with open(rejects_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Line", "Reason"] + list(REQUIRED_FIELDS))
+        for line_number, reason, raw in rejected:
+            writer.writerow([line_number, reason] + [raw.get(field) for field in REQUIRED_FIELDS])
+    return rejects_path
@@ -0,0 +1,213 @@
+import os
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import date
+
+from catalog import canonical_names
+from db import require_connection
+from dashboard import TRANSACTION_TYPES
+from filters import as_date
+
+
+# ================== Write-behind Journal ==================
+# New transactions are written to a local SQLite file (WAL mode, fsync on
+# commit) first, so "Add" never waits on - or fails because of - the main
+# database.  JournalFlusher drains the file into MySQL in batched
+# transactions in the background and keeps retrying with backoff while the
+# DB is slow or down; whatever is left is replayed on the next start.
+#
+# Every entry carries an idempotency key that is stored with the row
+# (transactions.idempotency_key, unique, schema v7), so a batch that was
+# committed but not acknowledged (timeout, crash) is never inserted twice.
+
+JOURNAL_FILE = os.environ.get("INVENTORY_JOURNAL_FILE", "journal.db")
+FLUSH_BATCH = 500
+FLUSH_MS = 300            # delay before flushing after a write
+RETRY_MS = (1000, 2000, 5000, 10000, 30000)   # backoff while the DB is unreachable
+
+INSERT_SQL = """
+    INSERT INTO transactions (product, qty, date, transaction_type, rate, amount, idempotency_key)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+class WriteJournal:
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        # lock: short SQLite calls only, so append() from the Tk thread never
+        # waits on the main database.  moving: held (worker threads only) while
+        # a batch is in flight from the journal to the DB, so readers that
+        # combine "DB + pending" (dashboard totals) never count a row twice.
+        self.lock = threading.RLock()
+        self.moving = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = FULL")   # an accepted sale survives a power cut
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                payload TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        """)
+
+    def append(self, product, qty, trans_date, trans_type, rate, amount):
+        # Durable once this returns; returns the entry's idempotency key
+        key = uuid.uuid4().hex
+        payload = json.dumps([product, qty, as_date(trans_date).isoformat(), trans_type, rate, amount])
+        with self.lock:
+            self._conn.execute("INSERT INTO pending (idempotency_key, payload) VALUES (?, ?)", (key, payload))
+        return key
+
+    def pending_count(self):
+        with self.lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def entries(self, limit=None):
+        # [(key, (product, qty, date, trans_type, rate, amount)), ...] oldest first
+        sql = "SELECT idempotency_key, payload FROM pending ORDER BY seq"
+        params = ()
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (limit,)
+        with self.lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        entries = []
+        for key, payload in rows:
+            product, qty, trans_date, trans_type, rate, amount = json.loads(payload)
+            entries.append((key, (product, qty, date.fromisoformat(trans_date), trans_type, rate, amount)))
+        return entries
+
+    def pending_kpi_rows(self):
+        # Dashboard rows (type, count, SUM(amount), SUM(qty), SUM(qty * rate)) of unflushed entries
+        sums = {t: [0, 0.0, 0, 0.0] for t in TRANSACTION_TYPES}
+        for _, (_, qty, _, trans_type, rate, amount) in self.entries():
+            bucket = sums.setdefault(trans_type, [0, 0.0, 0, 0.0])
+            bucket[0] += 1
+            bucket[1] += amount
+            bucket[2] += qty
+            bucket[3] += qty * rate
+        return [(trans_type, *bucket) for trans_type, bucket in sums.items() if bucket[0]]
+
+    # ---- flushing (worker thread) ----
+    def flush(self, batch_size=FLUSH_BATCH):
+        # Moves everything pending into the DB, one transaction per batch.
+        # Returns {"applied": [(id, row), ...], "duplicates": n, "error": e}.
+        # On a DB error the failed batch stays in the journal and "error" is
+        # set; the batches committed before it are still in "applied".
+        result = {"applied": [], "duplicates": 0, "error": None}
+        while True:
+            batch = self.entries(batch_size)
+            if not batch:
+                break
+            with self.moving:
+                try:
+                    ids, already, batch = self._apply(batch)
+                except Exception as e:
+                    with self.lock:
+                        self._conn.execute(
+                            f"UPDATE pending SET attempts = attempts + 1, last_error = ? "
+                            f"WHERE idempotency_key IN ({', '.join('?' * len(batch))})",
+                            [str(e)] + [key for key, _ in batch]
+                        )
+                    result["error"] = e
+                    break
+                with self.lock:
+                    self._conn.executemany("DELETE FROM pending WHERE idempotency_key = ?",
+                                           [(key,) for key, _ in batch])
+            result["duplicates"] += already
+            result["applied"] += [(ids[key], row) for key, row in batch if key in ids]
+        return result
+
+    def _apply(self, batch):
+        keys = [key for key, _ in batch]
+        marks = ", ".join(["%s"] * len(keys))
+        conn = require_connection()
+        try:
+            cursor = conn.cursor()
+            # Retries of a batch that did commit: those keys are already there
+            cursor.execute(f"SELECT idempotency_key FROM transactions WHERE idempotency_key IN ({marks})",
+                           tuple(keys))
+            done = {key for (key,) in cursor.fetchall()}
+            # stored under the catalog spelling; "applied" reports it too
+            names = canonical_names(cursor, [row[0] for _, row in batch])
+            batch = [(key, (names[row[0]],) + tuple(row[1:])) for key, row in batch]
+            new_rows = [row + (key,) for key, row in batch if key not in done]
+            if new_rows:
+                cursor.executemany(INSERT_SQL, new_rows)
+            conn.commit()
+
+            cursor.execute(f"SELECT idempotency_key, id FROM transactions WHERE idempotency_key IN ({marks})",
+                           tuple(keys))
+            ids = {key: trans_id for key, trans_id in cursor.fetchall()}
+        finally:
+            conn.close()
+        return ids, len(done), batch
+
+    def close(self):
+        with self.lock:
+            self._conn.close()
+
+
+class JournalFlusher:
+    # Schedules journal.flush() on the BackgroundWorker from the Tk thread:
+    # shortly after each write, and with backoff while the DB is down.
+    #   on_applied(result)      UI thread, after rows reached the DB
+    #   on_status(pending, error)  UI thread, for the "pending / offline" label
+
+    def __init__(self, root, worker, journal, on_applied=None, on_status=None, before_flush=None):
+        self.root = root
+        self.worker = worker
+        self.journal = journal
+        self.on_applied = on_applied
+        self.on_status = on_status
+        self.before_flush = before_flush    # runs on the worker first, e.g. a schema check
+        self._after_id = None
+        self._failures = 0
+        self._running = False
+
+    def kick(self, delay_ms=FLUSH_MS):
+        # (Re)schedule a flush; an earlier scheduled one is replaced
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+        self._after_id = self.root.after(delay_ms, self._flush)
+
+    def _flush(self):
+        self._after_id = None
+        if self._running:
+            return self.kick()
+        self._running = True
+        self.worker.submit(self._job, on_done=self._done, on_error=self._failed, key="journal_flush")
+
+    def _job(self):
+        if self.before_flush is not None:
+            self.before_flush()
+        return self.journal.flush()
+
+    def _done(self, result):
+        if self.on_applied is not None and (result["applied"] or result["duplicates"]):
+            self.on_applied(result)   # also the batches before a failed one
+        if result["error"] is not None:
+            return self._failed(result["error"])
+        self._running = False
+        self._failures = 0
+        self._report(None)
+        if self.journal.pending_count():
+            self.kick()  # added while this flush was running
+
+    def _failed(self, error):
+        self._running = False
+        delay = RETRY_MS[min(self._failures, len(RETRY_MS) - 1)]
+        self._failures += 1
+        self._report(error)
+        self.kick(delay)
+
+    def _report(self, error):
+        if self.on_status is not None:
+            self.on_status(self.journal.pending_count(), error)
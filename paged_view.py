@@ -0,0 +1,417 @@
+import sys
+
+import perf
+from db import require_connection
+from filters import where_sql, sort_order, cursor_key, DEFAULT_SORT
+
+
+# ================== Paged Transactions Query ==================
+# Rows are read newest-first by default and paged with keyset conditions on
+# id (id < last seen / id > first seen) so every page is an index range scan,
+# no matter how deep the user has scrolled.  With a sort column in the
+# filter the keyset is (column, id) and the cursors passed as before_id /
+# after_id are filters.cursor_key() values; each sortable column has a
+# (column, id) index (schema v10), so sorted pages are range scans too.
+
+SELECT_COLUMNS = "id, product, qty, date, transaction_type, rate, amount"
+PAGE_SIZE = 200
+
+
+def _keyset(column, cursor, op):
+    # Rows past the cursor in one direction; the leading column bound keeps it sargable
+    if column == "id":
+        return f"id {op} %s", [cursor]
+    value, trans_id = cursor
+    return f"{column} {op}= %s AND ({column} {op} %s OR id {op} %s)", [value, value, trans_id]
+
+
+def fetch_page(flt=None, before_id=None, after_id=None, limit=PAGE_SIZE):
+    # before_id: the page shown below that row, after_id: the page above it
+    where, params = where_sql(flt)
+    column, descending = sort_order(flt)
+
+    # Scan in display order downwards, against it upwards (then flip the page)
+    upwards = before_id is None and after_id is not None
+    order = "DESC" if descending != upwards else "ASC"
+    cursor = before_id if before_id is not None else after_id
+    if cursor is not None:
+        clause, values = _keyset(column, cursor, "<" if order == "DESC" else ">")
+        where += (" AND " if where else " WHERE ") + clause
+        params += values
+
+    order_by = f"id {order}" if column == "id" else f"{column} {order}, id {order}"
+    sql = f"SELECT {SELECT_COLUMNS} FROM transactions{where} ORDER BY {order_by} LIMIT %s"
+    params.append(limit)
+
+    conn = require_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, tuple(params))
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    # Pages fetched upwards come back in reverse display order
+    if upwards:
+        rows.reverse()
+    return rows
+
+
+def count_rows(flt=None):
+    where, params = where_sql(flt)
+    conn = require_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM transactions{where}", tuple(params))
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+
+# ================== Virtualized Treeview ==================
+class PagedTreeView:
+    # Keeps only a window of rows (a few pages) inside the Treeview; more
+    # pages are fetched as the user scrolls towards either edge and the far
+    # side is trimmed so the widget never holds the whole table.
+    #
+    # Items are keyed by transaction id (iid = str(id)).  Reloads are diffed
+    # against what is shown, so only added / changed / removed rows touch the
+    # widget and selection + scroll position survive; single-row updates are
+    # queued and applied together on the next Tk idle cycle.
+    #
+    # Clicking a bound heading sorts by that column (again: reversed) and
+    # filter_column() adds a per-column condition; both stay in place when
+    # load() is called with a new base filter (search box, date range).
+
+    def __init__(self, tree, scrollbar, status_label=None, page_size=PAGE_SIZE, window_pages=3,
+                 worker=None, on_error=None, source=None):
+        # source: anything with fetch_page() / count_rows() like this module's
+        # SQL versions (e.g. the local transaction cache); defaults to the DB
+        self.source = source
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.status_label = status_label
+        self.worker = worker
+        self.on_error = on_error
+        self.page_size = page_size
+        self.max_rows = page_size * window_pages
+
+        self.filter = {}
+        self.base_filter = {}
+        self.sort = None             # e.g. "amount" / "-amount"; None = newest first
+        self.column_filters = {}     # column -> filter fields (see filters.make_filter)
+        self.headings = {}           # heading -> column, see bind_headings()
+        self._shown_filter = None
+        self._values = {}        # iid -> values tuple currently in the widget
+        self._pending = []       # (op, row) applied on the next idle cycle
+        self._waiters = []       # on_loaded callbacks of load(); a newer load supersedes
+                                 # the worker task, so they run when whichever load finishes
+        self.total = 0
+        self.more_above = False
+        self.more_below = False
+        self._loading = False
+
+        tree.configure(yscrollcommand=self._on_scroll)
+
+    # ---- public API ----
+    def load(self, flt=None, total=None, on_loaded=None):
+        # on_loaded() runs on the UI thread once the first page is shown
+        # (this load's or a newer one's)
+        if on_loaded is not None:
+            self._waiters.append(on_loaded)
+        self.base_filter = dict(flt or {})
+        self.filter = flt = self._combined()
+        if self.column_filters:
+            total = None  # the caller's count doesn't know about the column filters
+        source, limit = self._source(), self.page_size
+
+        def fetch():
+            rows = source.fetch_page(flt, limit=limit)
+            count = source.count_rows(flt) if total is None else total
+            return rows, flt, count
+
+        self._loading = True  # ignore scroll-triggered fetches until the new rows arrive
+        self._run(fetch, self._show_first_page)
+
+    def prepend(self, row):
+        # New transaction: show it on top if the window is at the head of the
+        # list (sorted: where it belongs, if that is inside the window)
+        self.total += 1
+        if not self.more_above or self.sort:
+            self._queue("prepend", row)
+        self._update_status()
+
+    def update_row(self, row):
+        # Changed transaction: patch its item in place (no reload)
+        if str(row[0]) in self._values:
+            self._queue("update", row)
+
+    def shown(self, trans_id):
+        return str(trans_id) in self._values
+
+    def values(self, trans_id):
+        # Row as currently shown, or None
+        return self._values.get(str(trans_id))
+
+    def remove(self, item):
+        # Immediate, so a following selection check can't see the deleted row
+        self._delete([item])
+        self.total = max(0, self.total - 1)
+        self._update_status()
+
+    # ---- sorting / column filters ----
+    def bind_headings(self, headings):
+        # headings: {heading text: filters.SORT_COLUMNS name}; a click sorts
+        self.headings = dict(headings)
+        for heading, column in self.headings.items():
+            self.tree.heading(heading, command=lambda column=column: self.sort_by(column))
+        self._update_headings()
+
+    def sort_by(self, column):
+        # Text columns start A-Z, numbers and dates largest / newest first
+        current, descending = sort_order(self.filter)
+        if column == current:
+            sort = column if descending else "-" + column
+        else:
+            sort = column if column in ("product", "transaction_type") else "-" + column
+        self.sort = None if sort == DEFAULT_SORT else sort
+        self._update_headings()
+        self.load(self.base_filter, total=None if self.column_filters else self.total)
+
+    def filter_column(self, column, fields):
+        # fields: make_filter() output for this column, {} clears it
+        if fields:
+            self.column_filters[column] = dict(fields)
+        else:
+            self.column_filters.pop(column, None)
+        self._update_headings()
+        self.load(self.base_filter)
+
+    def _combined(self):
+        # Base filter narrowed by the column filters, plus the sort order
+        flt = dict(self.base_filter)
+        for fields in self.column_filters.values():
+            for key, value in fields.items():
+                if key in flt and (key == "start" or key.startswith("min_")):
+                    flt[key] = max(flt[key], value)
+                elif key in flt and (key == "end" or key.startswith("max_")):
+                    flt[key] = min(flt[key], value)
+                elif key in flt and key == "products":
+                    flt[key] = sorted(set(flt[key]) & set(value))
+                else:
+                    flt[key] = value
+        if self.sort:
+            flt["sort"] = self.sort
+        return flt
+
+    def _update_headings(self):
+        column, descending = sort_order({"sort": self.sort} if self.sort else None)
+        for heading, name in self.headings.items():
+            text = heading
+            if name == column and self.sort:
+                text += " ▼" if descending else " ▲"
+            if name in self.column_filters:
+                text += " *"
+            self.tree.heading(heading, text=text)
+
+    # ---- internals ----
+    def _source(self):
+        if self.source is None:
+            return sys.modules[__name__]
+        return self.source
+
+    def _run(self, func, on_done):
+        # All table loads share one key, so a new filter supersedes a running one
+        if self.worker is None:
+            try:
+                on_done(func())
+            except Exception as e:
+                self._failed(e)
+            return
+        self.worker.submit(func, on_done=on_done, on_error=self._failed, key="table")
+
+    def _failed(self, error):
+        self._loading = False   # load() waiters stay for the next load
+        if self.on_error is not None:
+            self.on_error(error)
+        else:
+            raise error
+
+    def _show_first_page(self, result):
+        rows, flt, self.total = result
+        self._loading = False
+
+        self._sync_rows(rows)
+        self.more_above = False
+        self.more_below = len(rows) == self.page_size
+        if flt != self._shown_filter:
+            self.tree.yview_moveto(0)  # new filter starts at the top; a refresh stays put
+        self._shown_filter = flt
+        self._update_status()
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            waiter()
+
+    def _sync_rows(self, rows):
+        # Diff by transaction id: delete what's gone, patch what changed,
+        # insert what's new, and move only items that are out of place
+        with perf.span("ui.tree_sync", rows=len(rows)):
+            self._sync_tree(rows)
+
+    def _sync_tree(self, rows):
+        wanted = {str(row[0]) for row in rows}
+        self._delete([iid for iid in self.tree.get_children() if iid not in wanted])
+
+        order = list(self.tree.get_children())
+        for index, row in enumerate(rows):
+            iid, values = str(row[0]), tuple(row)
+            if iid not in self._values:
+                self.tree.insert("", index, iid=iid, values=values)
+                self._values[iid] = values
+                order.insert(index, iid)
+                continue
+            if self._values[iid] != values:
+                self.tree.item(iid, values=values)
+                self._values[iid] = values
+            if order[index] != iid:
+                self.tree.move(iid, "", index)
+                order.remove(iid)
+                order.insert(index, iid)
+
+    def _queue(self, op, row):
+        if not self._pending:
+            self.tree.after_idle(self._flush)
+        self._pending.append((op, row))
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        with perf.span("ui.tree_patch", rows=len(pending)):
+            self._apply_pending(pending)
+        self._update_status()
+
+    def _apply_pending(self, pending):
+        for op, row in pending:
+            iid, values = str(row[0]), tuple(row)
+            if iid in self._values:
+                if self._values[iid] != values:
+                    self.tree.item(iid, values=values)
+                    self._values[iid] = values
+            elif op == "prepend":
+                index = self._insert_index(row)
+                if index is not None:
+                    self.tree.insert("", index, iid=iid, values=values)
+                    self._values[iid] = values
+
+    def _insert_index(self, row):
+        # Where a new row goes in the window; None when it belongs to a page not shown
+        if not self.sort:
+            return 0
+        _, descending = sort_order(self.filter)
+        children = self.tree.get_children()
+        try:
+            key = cursor_key(self.filter, row)
+            index = 0
+            for index, iid in enumerate(children):
+                shown = self._cursor(iid)
+                if (key > shown) if descending else (key < shown):
+                    break
+            else:
+                index = len(children)
+        except TypeError:
+            return None   # e.g. str vs date from different sources: leave it to the next load
+        if (index == 0 and self.more_above) or (index == len(children) and self.more_below):
+            return None
+        return index
+
+    def _insert_rows(self, rows, index):
+        with perf.span("ui.tree_insert", rows=len(rows)):
+            for row in (rows if index == "end" else reversed(rows)):
+                iid, values = str(row[0]), tuple(row)
+                if iid in self._values:
+                    continue  # already shown (e.g. prepended while the page was loading)
+                self.tree.insert("", index, iid=iid, values=values)
+                self._values[iid] = values
+
+    def _delete(self, items):
+        items = [item for item in items if item in self._values]
+        if items:
+            self.tree.delete(*items)
+        for item in items:
+            del self._values[item]
+
+    def _cursor(self, item):
+        return cursor_key(self.filter, self._values[item])
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self._loading:
+            return
+        if float(last) >= 0.95 and self.more_below:
+            self._loading = True
+            self.tree.after_idle(self._load_below)
+        elif float(first) <= 0.05 and self.more_above:
+            self._loading = True
+            self.tree.after_idle(self._load_above)
+
+    def _load_below(self):
+        children = self.tree.get_children()
+        if not children:
+            self._loading = False
+            return
+        last = self._cursor(children[-1])
+        source, flt, limit = self._source(), self.filter, self.page_size
+        self._run(lambda: source.fetch_page(flt, before_id=last, limit=limit), self._append_page)
+
+    def _append_page(self, rows):
+        self._loading = False
+        self.more_below = len(rows) == self.page_size
+        if not rows:
+            return
+
+        anchor = self.tree.identify_row(0)
+        self._insert_rows(rows, "end")
+
+        children = self.tree.get_children()
+        extra = len(children) - self.max_rows
+        if extra > 0:
+            self._delete(children[:extra])
+            self.more_above = True
+        self._keep_anchor(anchor)
+
+    def _load_above(self):
+        children = self.tree.get_children()
+        if not children:
+            self._loading = False
+            return
+        first = self._cursor(children[0])
+        source, flt, limit = self._source(), self.filter, self.page_size
+        self._run(lambda: source.fetch_page(flt, after_id=first, limit=limit), self._prepend_page)
+
+    def _prepend_page(self, rows):
+        self._loading = False
+        self.more_above = len(rows) == self.page_size
+        if not rows:
+            return
+
+        anchor = self.tree.identify_row(0)
+        self._insert_rows(rows, 0)
+
+        children = self.tree.get_children()
+        extra = len(children) - self.max_rows
+        if extra > 0:
+            self._delete(children[-extra:])
+            self.more_below = True
+        self._keep_anchor(anchor)
+
+    def _keep_anchor(self, anchor):
+        # Rows have a fixed height, so the old top row's index gives the scroll offset
+        children = self.tree.get_children()
+        if anchor and self.tree.exists(anchor) and children:
+            self.tree.yview_moveto(self.tree.index(anchor) / len(children))
+        self._update_status()
+
+    def _update_status(self):
+        if self.status_label is None:
+            return
+        shown = len(self.tree.get_children())
+        self.status_label.config(text=f"Showing {shown} of {self.total} transactions")
@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import time
+import threading
+from bisect import bisect_left
+from functools import wraps
+
+
+# ================== Performance Instrumentation ==================
+# Histograms of how long the hot paths take: SQL statements (and the rows
+# they fetch), pool waits, worker jobs and their UI callbacks, Treeview
+# inserts, exports.  Off by default; every hook starts with a check of
+# ENABLED, so the cost when it's off is one attribute lookup.
+#
+#   INVENTORY_PERF=1          collect from startup
+#   INVENTORY_PERF_LOG=path   where dump() appends JSON lines (perf.jsonl)
+#
+# F12 in the app opens the stats window (and switches collection on).
+
+ENABLED = os.environ.get("INVENTORY_PERF", "").lower() in ("1", "true", "yes", "on")
+LOG_FILE = os.environ.get("INVENTORY_PERF_LOG", "perf.jsonl")
+
+# bucket upper bounds in ms (roughly x2.5 steps); the last bucket is open-ended
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = 0.0
+        self.rows = 0
+
+    def add(self, ms, rows=0):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.min_ms = ms if self.min_ms is None else min(self.min_ms, ms)
+        self.max_ms = max(self.max_ms, ms)
+        self.rows += rows
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the given fraction of samples
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "min_ms": round(self.min_ms or 0.0, 3),
+            "p50_ms": round(self.percentile(0.5), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+            "buckets": self.counts,
+        }
+
+
+_histograms = {}
+_lock = threading.Lock()
+_started = time.time()
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def record(name, ms, rows=0):
+    if not ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(ms, rows)
+
+
+class _Span:
+    # with perf.span("export.xlsx") as s: ...; s.rows = n
+    __slots__ = ("name", "rows", "_started")
+
+    def __init__(self, name, rows=0):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, (time.perf_counter() - self._started) * 1000, self.rows)
+
+
+class _NoSpan:
+    __slots__ = ()
+    rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, rows=0):
+    return _Span(name, rows) if ENABLED else _NO_SPAN
+
+
+def timed(name):
+    # Decorator form of span()
+    def wrap(func):
+        @wraps(func)
+        def timed_call(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return timed_call
+    return wrap
+
+
+# ---------------- SQL statements ----------------
+_TABLE = re.compile(r"\b(?:FROM|INTO|TABLE|ON)\s+(\w+)", re.I)
+
+
+def statement_name(sql):
+    # "SELECT ... FROM transactions WHERE ..." -> "sql.select transactions"
+    words = sql.split(None, 2)
+    if not words:
+        return "sql.other"
+    verb = words[0].lower()
+    if verb == "update" and len(words) > 1:
+        table = words[1]
+    else:
+        match = _TABLE.search(sql)
+        table = match.group(1) if match else None
+    return f"sql.{verb} {table}" if table else f"sql.{verb}"
+
+
+class TimedCursor:
+    # Wraps a DB cursor; execute time goes to "sql.<verb> <table>", fetched
+    # rows to the same histogram's row count.  Only used while ENABLED.
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._name = "sql.other"
+
+    def execute(self, sql, params=()):
+        self._name = statement_name(sql)
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params)
+        finally:
+            record(self._name, (time.perf_counter() - started) * 1000)
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        self._name = statement_name(sql)
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq_of_params)
+        finally:
+            record(self._name + " (many)", (time.perf_counter() - started) * 1000, len(seq_of_params))
+
+    def _fetched(self, started, rows):
+        record(self._name + " fetch", (time.perf_counter() - started) * 1000, rows)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        # lastrowid, rowcount, description, close, ...
+        return getattr(self._cursor, name)
+
+
+# ---------------- Startup ----------------
+startup_times = {}   # stage -> ms since the app started (always kept, it's a handful of values)
+
+
+def mark_startup(stage, started):
+    # started: time.perf_counter() taken at the very top of project.py
+    ms = (time.perf_counter() - started) * 1000
+    startup_times[stage] = round(ms, 1)
+    record(f"startup.{stage}", ms)
+    return ms
+
+
+# ---------------- Snapshots ----------------
+def snapshot():
+    # name -> summary dict, sorted by total time spent
+    with _lock:
+        items = [(name, histogram.summary()) for name, histogram in _histograms.items()]
+    items.sort(key=lambda item: item[1]["total_ms"], reverse=True)
+    return dict(items)
+
+
+def reset():
+    global _started
+    with _lock:
+        _histograms.clear()
+        _started = time.time()
+
+
+def dump(path=None, extra=None):
+    # Appends one JSON line per metric; returns the number of lines written
+    stats = snapshot()
+    now = time.time()
+    with open(path or LOG_FILE, "a", encoding="utf-8") as f:
+        for name, summary in stats.items():
+            line = {"ts": round(now, 3), "since": round(_started, 3), "metric": name}
+            line.update(summary)
+            if extra:
+                line.update(extra)
+            f.write(json.dumps(line) + "\n")
+    return len(stats)
+
+
+# ---------------- Stats window ----------------
+STATS_COLUMNS = ("metric", "count", "mean_ms", "p50_ms", "p95_ms", "max_ms", "total_ms", "rows")
+
+
+def show_stats_window(root, extra_stats=None, refresh_ms=1000):
+    # Live table of the histograms; extra_stats() may return more
+    # name -> value pairs (pool / cache stats) shown underneath
+    from tkinter import Toplevel, Label, Button, StringVar, ttk
+
+    enable()
+    window = Toplevel(root)
+    window.title("Performance Stats")
+    window.geometry("820x420")
+
+    table = ttk.Treeview(window, columns=STATS_COLUMNS, show="headings", height=14)
+    for column in STATS_COLUMNS:
+        table.heading(column, text=column)
+        table.column(column, width=260 if column == "metric" else 75, anchor="w" if column == "metric" else "e")
+    table.pack(fill="both", expand=True, padx=8, pady=(8, 4))
+
+    extra_text = StringVar()
+    Label(window, textvariable=extra_text, justify="left", anchor="w", font=("Consolas", 9)).pack(fill="x", padx=8)
+
+    def refresh():
+        if not window.winfo_exists():
+            return
+        table.delete(*table.get_children())
+        for name, summary in snapshot().items():
+            table.insert("", "end", values=(name,) + tuple(summary[column] for column in STATS_COLUMNS[1:]))
+        if extra_stats is not None:
+            extra_text.set("\n".join(f"{key}: {value}" for key, value in extra_stats().items()))
+        window.after(refresh_ms, refresh)
+
+    def dump_now():
+        written = dump(extra={"source": "stats-window"})
+        dump_text.set(f"✅ {written} metrics appended to {os.path.abspath(LOG_FILE)}")
+
+    # own label: refresh() rewrites extra_text every tick
+    dump_text = StringVar()
+    Button(window, text="Reset", width=10, command=reset).pack(side="left", padx=8, pady=6)
+    Button(window, text="Dump to log", width=12, command=dump_now).pack(side="left", pady=6)
+    Label(window, textvariable=dump_text, anchor="w", font=("Consolas", 9)).pack(side="left", padx=8)
+    refresh()
+    return window
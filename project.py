@@ -1,25 +1,123 @@
+import sys
+import json
+import time
+startup_started = time.perf_counter()  # startup-time measurement, see on_first_paint()
+
 from tkinter import *
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog, simpledialog
 from tkcalendar import DateEntry
 from datetime import datetime
-import mysql.connector
 
 
 # ================== Database Connection ==================
-def connect_db():
-    try:
-        conn = mysql.connector.connect(
-            host="127.0.0.1",
-            port=3306,
-            user="root",
-            password="Shyam123",
-            database="champs",
-            use_pure=True,
-            connection_timeout=5
-        )
-        return conn
-    except mysql.connector.Error as err:
-        return None
+# require_connection() borrows from a shared connection pool (see db.py);
+# calling close() on the returned connection hands it back to the pool.
+from db import require_connection, close_pool, pool_stats
+from dashboard import DashboardTotals, fetch_delta_row
+from paged_view import PagedTreeView
+from worker import BackgroundWorker
+from export import export_transactions
+from validation import validate_transaction, ValidationError
+from importer import import_transactions, write_rejects
+from schema import ensure_schema
+from filters import make_filter, row_matcher, parse_range, as_date, SORT_COLUMNS
+from txn_cache import TransactionCache, available as cache_available
+from query_cache import QueryCache, CachedSource
+from search import ProductIndex, load_product_index
+from catalog import ProductCatalog, load_catalog, save_product
+from rollup import RollupIndex
+from valuation import ValuationEngine, show_stock_window
+from analytics import show_analytics_window
+from journal import WriteJournal, JournalFlusher
+from api_client import ApiClient, ChangeCursor, API_URL
+from changes import ChangeWatcher, change_position, prune_changes, POLL_MS, RESET
+import archive
+import perf
+
+# KPIs are loaded in one grouped pass, then kept current from each write's delta
+dashboard_totals = DashboardTotals()
+# on_loaded callbacks of update_dashboard(); a newer load supersedes the
+# worker task, so they wait here and run when whichever load finishes
+dashboard_waiters = []
+dashboard_loading = False
+
+# Distinct product names, resolved in memory so product filters become IN (...) lookups
+product_index = ProductIndex()
+
+# Products table (ids, SKU, reorder level) for the entry form's autocomplete
+product_catalog = ProductCatalog()
+
+# Columnar copy of transactions (needs numpy): filters, paging and dashboard
+# totals are answered locally after a cheap delta sync
+txn_cache = TransactionCache() if cache_available() else None
+
+
+# Page / count results per filter; writes only drop the date ranges they touch
+query_cache = QueryCache()
+
+# Prefix sums over the daily roll-up: KPIs for any date range in O(log days)
+rollup_index = RollupIndex()
+
+# Per-product stock and cost layers (FIFO / moving average): COGS-based
+# profit and stock value for the dashboard, kept current row by row
+valuation = ValuationEngine()
+valuation_summary = None
+
+# Date range the dashboard KPIs are scoped to (set by the report filter); None = all time
+dashboard_range = None
+range_totals = DashboardTotals()
+
+# INVENTORY_API_URL set: table pages and KPIs come from the shared server
+# (server.py) and its change feed keeps this window current; writes still go
+# to the DB, where the server's watcher picks them up for every client
+api = ApiClient(API_URL) if API_URL else None
+change_cursor = ChangeCursor(api) if api is not None else None
+
+# Without the server: a timer checks the change version (one tiny query) and
+# only when it moved patches in the rows other counters changed, see changes.py
+change_watcher = ChangeWatcher() if api is None and POLL_MS > 0 else None
+
+
+class RowGone(ValueError):
+    # The row was deleted (by another counter) after this window loaded it
+    pass
+
+
+def ensure_live(old_row, trans_date):
+    # Worker side: a row missing from the live table may sit in an archived
+    # (closed) month, or was deleted by someone else meanwhile
+    if old_row is None and archive.is_archived(trans_date):
+        raise ValueError(f"🔒 {str(trans_date)[:7]} archive ho chuka hai, closed month ki entry change nahi hogi.")
+    if old_row is None:
+        raise RowGone("Ye transaction ab database mein nahi hai (kisi aur counter ne delete kar di). Table reload ho rahi hai.")
+
+
+def ensure_deleted(cursor, trans_id):
+    # Worker side, right after a DELETE by id: 0 rows means it vanished after ensure_live()
+    if cursor.rowcount == 0:
+        raise RowGone(f"Transaction {trans_id} pehle hi delete ho chuki hai. Table reload ho rahi hai.")
+
+
+def write_failed(title, message, error):
+    # UI thread: an update / delete failed; a vanished row means the view is stale
+    messagebox.showerror(title, message)
+    if isinstance(error, RowGone):
+        refresh_data()
+
+
+def own_write(op, *txn_ids):
+    # This app's write is on screen already: the change watcher skips its markers
+    if change_watcher is not None:
+        change_watcher.record(op, *txn_ids)
+
+
+def data_changed(*dates):
+    # Local write on these dates: cached filter results covering them are
+    # dropped and the next cached query pulls the delta first
+    query_cache.invalidate_dates(*dates)
+    rollup_index.mark_stale()
+    if txn_cache is not None:
+        txn_cache.mark_stale()
 
 
 root = Tk()
@@ -27,70 +125,49 @@ root.title("Inventory Management System")
 root.geometry("1000x700")
 root.configure(bg="skyblue")
 
-# ✅ Treeview Style Configuration
-style = ttk.Style()
-style.theme_use("default")
+# ✅ Background worker: DB work, exports and PDFs run off the Tk thread
+busy_label = Label(root, text="", bg="skyblue", fg="darkred", font=("Arial", 9, "bold"))
+busy_label.place(x=860, y=645)
+worker = BackgroundWorker(root, busy_label=busy_label)
 
-style.configure("Custom.Treeview",
-    background="black",
-    foreground="blue",
-    fieldbackground="black",
-    rowheight=25)
+# ✅ Write-behind journal: adds are saved locally first and flushed to the DB in batches
+sync_label = Label(root, text="", bg="skyblue", font=("Arial", 9, "bold"))
+sync_label.place(x=700, y=645)
+journal = WriteJournal()
+schema_ready = False
 
-style.configure("Custom.Treeview.Heading",
-    background="gray20",
-    foreground="white",
-    font=('Arial', 10, 'bold'))
 
-# ✅ Table Frame
-table_frame = Frame(root, bg="white")
-table_frame.place(x=20, y=360, width=960, height=280)
+def ensure_schema_once():
+    # Runs before each flush until the schema check has succeeded once (the DB
+    # may have been down at startup; the journal needs schema v7)
+    global schema_ready
+    if not schema_ready:
+        ensure_schema()
+        schema_ready = True
 
-# ✅ Treeview Columns
-columns = ("ID", "Product", "Qty", "Date", "Transaction Type", "Rate", "Amount")
-tree = ttk.Treeview(table_frame, columns=columns, show="headings", style="Custom.Treeview")
-tree.pack(fill=BOTH, expand=1)
 
-# ✅ Define Headings
-for col in columns:
-    tree.heading(col, text=col)
-    tree.column(col, anchor=CENTER, width=120)
+journal_flusher = JournalFlusher(root, worker, journal, on_applied=lambda result: on_journal_applied(result),
+                                 on_status=lambda pending, error: show_sync_status(pending, error),
+                                 before_flush=ensure_schema_once)
+
+# ✅ ttk theme (the table itself is built once, in the Table Frame section)
+style = ttk.Style()
+style.theme_use("default")
 
 
 # ================== Add Data Function ==================
 def add_transaction():
 
-    # ---- 1) Read & validate inputs ----
-    product = product_cb.get().strip()
-    trans_type = trans_cb.get().strip()
-
-    if not product:
-        messagebox.showwarning("Validation", "Product select/enter karo.")
-        product_cb.focus_set()
-        return
-
-    if trans_type not in ("Sale", "Purchase"):
-        messagebox.showwarning("Validation", "Transaction Type select karo (Sale / Purchase).")
-        trans_cb.focus_set()
-        return
-
+    # ---- 1) Read & validate inputs (same rules as the bulk importer) ----
     try:
-        qty = int(qty_entry.get())
-        if qty <= 0:
-            raise ValueError
-    except ValueError:
-        messagebox.showwarning("Validation", "Quantity valid positive integer hona chahiye.")
-        qty_entry.focus_set()
-        return
-
-    try:
-        rate = float(rate_entry.get())
-        if rate <= 0:
-            raise ValueError
-    except ValueError:
-        messagebox.showwarning("Validation", "Rate valid positive number hona chahiye.")
-        rate_entry.focus_set()
+        product, trans_type, qty, rate = validate_transaction(
+            product_cb.get(), trans_cb.get(), qty_entry.get(), rate_entry.get()
+        )
+    except ValidationError as e:
+        messagebox.showwarning("Validation", str(e))
+        {"product": product_cb, "trans_type": trans_cb, "qty": qty_entry, "rate": rate_entry}[e.field].focus_set()
         return
+    product = product_catalog.canonical(product)  # "pen " -> "Pen", so one product stays one product
 
     # tkcalendar ka DateEntry safest: get_date() (python date object deta hai)
     try:
@@ -103,43 +180,51 @@ def add_transaction():
     amount = round(qty * rate, 2)
 
 
-    # ---- 2) DB work ----
-    conn = None
-    cursor = None
+    # ---- 2) Local journal first: the sale is safe even if the DB is slow / down ----
     try:
-        conn = connect_db()
-        if conn is None:
-            print("⛔ DB connection is None, aborting insert.")
-            return
-
-        cursor = conn.cursor()
-        sql = """
-            INSERT INTO transactions (product, qty, date, transaction_type, rate, amount)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        cursor.execute(sql, (product, qty, date_obj, trans_type, rate, amount))
-        conn.commit()
+        journal.append(product, qty, date_obj, trans_type, rate, amount)
+    except Exception as e:
+        print("❌ Exception occurred:", e)
+        messagebox.showerror("Error", f"Error: {e}")
+        return
 
-        inserted_id = cursor.lastrowid
-        print("✅ Data inserted with ID:", inserted_id)
+    # ---- 3) UI update right away; the row reaches the DB (and the table) on the next flush ----
+    dashboard_totals.add(trans_type, qty, rate, amount)
+    product_index.add(product)
+    clear_fields()
+    update_dashboard()
+    journal_flusher.kick()
 
-        # Treeview me insert — make sure your columns start with ID
-        tree.insert("", "end", values=(inserted_id, product, qty, date_obj, trans_type, rate, amount))
 
-        clear_fields()
-        update_dashboard()
+def on_journal_applied(result):
+    # Journaled rows are in the DB now: show them with their real IDs
+    for inserted_id, (product, qty, date_obj, trans_type, rate, amount) in result["applied"]:
+        print("✅ Data inserted with ID:", inserted_id)
+        data_changed(date_obj)
+        # Treeview me insert — newest rows are shown on top
+        row = (inserted_id, product, qty, date_obj, trans_type, rate, amount)
+        if api is None:  # with the server, its change feed brings the row
+            valuation.add(row)
+            if not table_view.shown(inserted_id):  # the change watcher may have been faster
+                table_view.prepend(row)
+    own_write("I", *(inserted_id for inserted_id, _ in result["applied"]))
+    sync_catalog()  # new names got catalog rows from the insert trigger
+    # duplicates: committed by an earlier run that crashed before clearing its journal
+    update_dashboard(reload=bool(result["duplicates"]))
+
+
+def show_sync_status(pending, error):
+    if error is not None:
+        sync_label.config(text=f"⚠️ DB offline, {pending} pending", fg="darkred")
+    elif pending:
+        sync_label.config(text=f"🕒 {pending} syncing", fg="black")
+    else:
+        sync_label.config(text="")
 
-    except Exception as e:
-        import traceback
-        print("❌ Exception occurred:")
-        traceback.print_exc()
-        messagebox.showerror("Error", f"Error: {e}")
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+def live_row_count():
+    # Rows the table can show: the dashboard also counts journaled, unflushed ones
+    return dashboard_totals.row_count() - journal.pending_count()
 
 
 def update_transaction():
@@ -153,7 +238,7 @@ def update_transaction():
         print("🟢 Step 2: Collecting input values")
 
         # ✅ Collect inputs
-        product = product_cb.get().strip()
+        product = product_catalog.canonical(product_cb.get().strip())
         qty_text = qty_entry.get().strip()
         rate_text = rate_entry.get().strip()
         trans_type = trans_cb.get().strip()
@@ -185,21 +270,44 @@ def update_transaction():
             messagebox.showinfo("No Changes", "ℹ️ No changes detected to update.")
             return
 
-        # ✅ Update in database
-        conn = connect_db()
-        cursor = conn.cursor()
-        query = """
-            UPDATE transactions 
-            SET product=%s, qty=%s, date=%s, transaction_type=%s, rate=%s, amount=%s 
-            WHERE id=%s
-        """
-        cursor.execute(query, (product, qty, date_str, trans_type, rate, amount, transaction_id))
-        conn.commit()
-        conn.close()
+        # ✅ Update in database (background worker)
+        def save_update():
+            conn = require_connection()
+            try:
+                cursor = conn.cursor()
+                old_row = fetch_delta_row(cursor, transaction_id)
+                ensure_live(old_row, values[3])
+                query = """
+                    UPDATE transactions 
+                    SET product=%s, qty=%s, date=%s, transaction_type=%s, rate=%s, amount=%s 
+                    WHERE id=%s
+                """
+                cursor.execute(query, (product, qty, date_str, trans_type, rate, amount, transaction_id))
+                # MySQL counts changed rows only: 0 can also mean "same values", so look again
+                if cursor.rowcount == 0 and fetch_delta_row(cursor, transaction_id) is None:
+                    raise RowGone(f"Transaction {transaction_id} update se pehle delete ho gayi. Table reload ho rahi hai.")
+                conn.commit()
+                return old_row
+            finally:
+                conn.close()
 
-        messagebox.showinfo("Success", "✅ Transaction updated successfully.")
-        refresh_data()
-        clear_fields()
+        def on_updated(old_row):
+            own_write("U", transaction_id)
+            if old_row:
+                dashboard_totals.replace(old_row, (trans_type, qty, rate, amount))
+            valuation.changed(values[1], product)  # replays both products' cost layers
+            product_index.add(product)
+            data_changed(values[3], date_str)  # old and new date
+
+            # Only this row changed: patch it in place instead of reloading everything
+            table_view.update_row((transaction_id, product, qty, date_str, trans_type, rate, amount))
+            update_dashboard()
+
+            messagebox.showinfo("Success", "✅ Transaction updated successfully.")
+            clear_fields()
+
+        worker.submit(save_update, on_done=on_updated,
+                      on_error=lambda e: write_failed("Update Error", f"❌ Error: {e}", e))
 
     except ValueError:
         messagebox.showerror("Conversion Error", "❌ Quantity and Rate must be valid numbers.")
@@ -221,18 +329,36 @@ def delete_transaction():
 
         item = tree.item(selected)
         trans_id = item['values'][0]  # assuming 1st column is ID
+        trans_date = item['values'][3]
+        product = item['values'][1]
 
-        conn = connect_db()
-        cursor = conn.cursor()
-
-        cursor.execute("DELETE FROM transactions WHERE id = %s", (trans_id,))
-        conn.commit()
-        conn.close()
+        def delete_row():
+            conn = require_connection()
+            try:
+                cursor = conn.cursor()
+                old_row = fetch_delta_row(cursor, trans_id)
+                ensure_live(old_row, trans_date)
+                cursor.execute("DELETE FROM transactions WHERE id = %s", (trans_id,))
+                ensure_deleted(cursor, trans_id)
+                conn.commit()
+                return old_row
+            finally:
+                conn.close()
 
-        tree.delete(selected)
-        update_dashboard()
-        clear_fields()
-        messagebox.showinfo("Deleted", "Transaction deleted successfully!")
+        def on_deleted(old_row):
+            own_write("D", trans_id)
+            data_changed(trans_date)
+            if old_row:
+                dashboard_totals.remove(*old_row)
+            valuation.changed(product)
+            for item in selected:
+                table_view.remove(item)
+            update_dashboard()
+            clear_fields()
+            messagebox.showinfo("Deleted", "Transaction deleted successfully!")
+
+        worker.submit(delete_row, on_done=on_deleted,
+                      on_error=lambda e: write_failed("Delete Error", str(e), e))
 
     except Exception as e:
         messagebox.showerror("Delete Error", str(e))
@@ -243,35 +369,75 @@ def export_to_excel():
 
 
 def refresh_data():
-    try:
-        # Step 1: Clear Treeview
-        tree.delete(*tree.get_children())
+    # With the change watcher the version is read first: writes that land
+    # while reloading come back as (repeated, harmless) events afterwards
+    if change_watcher is not None:
+        worker.submit(change_position, on_done=lambda position: reload_data(*position),
+                      on_error=lambda e: reload_data(), key="change_version")
+    else:
+        reload_data()
+
+
+def reload_data(version=None, gaps=None):
+    # Other counters may have written anything: start the result cache over
+    global dashboard_range
+    if version is not None:
+        change_watcher.rebase(version, gaps)
+    query_cache.clear()
+    archive.reload()
+    rollup_index.mark_stale()
+    dashboard_range = None  # the table goes back to all rows, so do the KPIs
+
+    # Step 1: Regroup the dashboard in the background (picks up other counters' writes)
+    # Step 2: Load only the newest page; older pages are fetched on scroll.
+    #         The dashboard already knows the row count, so no COUNT(*) is needed.
+    def load_table():
+        table_view.load(total=live_row_count())
+        print("🔄 Data refreshed successfully.")
 
-        # Step 2: Fetch fresh data from DB
-        conn = connect_db()
-        cursor = conn.cursor()
+    update_dashboard(reload=True, on_loaded=load_table)
+    refresh_product_index()
+    refresh_catalog()
 
-        cursor.execute("SELECT id, product, qty, date, transaction_type, rate, amount FROM transactions ORDER BY id DESC")
-        rows = cursor.fetchall()
 
-        for row in rows:
-            tree.insert("", "end", values=(row[0], row[1], row[2], row[3], row[4], row[5], row[6]))
+def refresh_product_index():
+    def adopt(fresh):
+        global product_index
+        product_index = fresh
 
-        conn.close()
+    worker.submit(load_product_index, on_done=adopt,
+                  on_error=lambda e: print("⚠️ Product index load error:", e), key="product_index")
 
-        # Step 3: Update dashboard too
-        update_dashboard()
 
-        print("🔄 Data refreshed successfully.")
+def refresh_catalog():
+    def adopt(fresh):
+        global product_catalog
+        product_catalog = fresh
+        on_product_typed()
 
-    except Exception as e:
-        print("❌ Refresh Error:", e)
-        messagebox.showerror("Error", f"Refresh Error:\n{e}")
+    worker.submit(load_catalog, on_done=adopt,
+                  on_error=lambda e: print("⚠️ Product catalog load error:", e), key="catalog")
+
+
+def sync_catalog():
+    # Only products with ids above the last one seen
+    def job():
+        conn = require_connection()
+        try:
+            return product_catalog.sync(conn)
+        finally:
+            conn.close()
+
+    worker.submit(job, on_done=lambda added: added and on_product_typed(),
+                  on_error=lambda e: print("⚠️ Product catalog sync error:", e), key="catalog_sync")
 
 
 
 def clear_fields():
     selected = tree.selection()
+    trans_id = None
+    trans_date = None
+    product = None
     
     if selected:
         confirm = messagebox.askyesno("Confirm Delete", "⚠️ Selected row delete karna chahte ho?")
@@ -279,18 +445,8 @@ def clear_fields():
             item = tree.item(selected)
             values = item['values']
             trans_id = values[0]  # Assuming 1st column is ID
-
-            try:
-                conn = connect_db()
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM transactions WHERE id = %s", (trans_id,))
-                conn.commit()
-                conn.close()
-
-                tree.delete(selected)
-                messagebox.showinfo("Deleted", "✅ Row deleted successfully.")
-            except Exception as e:
-                messagebox.showerror("Error", f"❌ DB Delete Error: {e}")
+            trans_date = values[3]
+            product = values[1]
 
     # Clear form fields (always do this)
     product_cb.set("")
@@ -300,23 +456,61 @@ def clear_fields():
     rate_entry.delete(0, END)
     tree.selection_remove(tree.selection())
 
-    # 🟡 Optional: Check if all rows are deleted, then reset ID
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM transactions")
-        count = cursor.fetchone()[0]
-        conn.close()
+    # 🟡 Optional: reset ID once the table is empty. The in-memory row count
+    # rules that out without a COUNT(*) on every clear (<= 1: the row being
+    # deleted below is still counted).
+    check_empty = not dashboard_totals.loaded or dashboard_totals.row_count() <= 1
+
+    if trans_id is None and not check_empty:
+        return
 
-        if count == 0:
-            conn = connect_db()
+    def db_work():
+        conn = require_connection()
+        try:
             cursor = conn.cursor()
-            cursor.execute("ALTER TABLE transactions AUTO_INCREMENT = 1")
-            conn.commit()
+            old_row = None
+            if trans_id is not None:
+                old_row = fetch_delta_row(cursor, trans_id)
+                ensure_live(old_row, trans_date)
+                cursor.execute("DELETE FROM transactions WHERE id = %s", (trans_id,))
+                ensure_deleted(cursor, trans_id)
+                conn.commit()
+
+            if check_empty:
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM transactions")
+                    count = cursor.fetchone()[0]
+                    # archived rows keep their ids, so never restart below them
+                    if count == 0 and not archive.has_archive():
+                        cursor.execute("ALTER TABLE transactions AUTO_INCREMENT = 1")
+                        conn.commit()
+                        print("✅ All rows deleted, ID reset to 1.")
+                except Exception as e:
+                    print("⚠️ Auto-Increment Reset Error:", e)
+            return old_row
+        finally:
             conn.close()
-            print("✅ All rows deleted, ID reset to 1.")
-    except Exception as e:
-        print("⚠️ Auto-Increment Reset Error:", e)
+
+    def on_done(old_row):
+        if trans_id is None:
+            return
+        own_write("D", trans_id)
+        data_changed(trans_date)
+        valuation.changed(product)
+        if old_row:
+            dashboard_totals.remove(*old_row)
+            update_dashboard()
+        for item in selected:
+            table_view.remove(item)
+        messagebox.showinfo("Deleted", "✅ Row deleted successfully.")
+
+    def on_error(e):
+        if trans_id is None:
+            print("⚠️ Auto-Increment Reset Error:", e)
+        else:
+            write_failed("Error", f"❌ DB Delete Error: {e}", e)
+
+    worker.submit(db_work, on_done=on_done, on_error=on_error)
 
 # ================== Dashboard Frame ==================
 
@@ -328,60 +522,62 @@ report_frame.place(x=20, y=5, width=950, height=70)
 
 def filter_report_by_date():
     try:
-        conn = connect_db()
-        cursor = conn.cursor()
-
         start = start_date.get_date().strftime('%Y-%m-%d')
         end = end_date.get_date().strftime('%Y-%m-%d')
 
-        cursor.execute("""
-            SELECT * FROM transactions
-            WHERE date BETWEEN %s AND %s
-        """, (start, end))
+        table_view.load(make_filter(start, end))
+        show_range_kpis(start, end)
+    except Exception as e:
+        messagebox.showerror("Error", f"❌ Failed to filter report data\n{str(e)}")
 
-        rows = cursor.fetchall()
 
-        tree.delete(*tree.get_children())
-        for row in rows:
-            tree.insert('', 'end', values=row)
+def show_range_kpis(start, end):
+    # Dashboard KPIs for the report range, from the roll-up prefix sums
+    global dashboard_range
+    dashboard_range = (start, end)
+    update_range_kpis()
 
-        conn.close()
-    except Exception as e:
-        messagebox.showerror("Error", f"❌ Failed to filter report data\n{str(e)}")
 
+def update_range_kpis():
+    def adopt(fresh):
+        range_totals.update_from(fresh)
+        render_dashboard()
+
+    source = api if api is not None else rollup_index
+    worker.submit(source.dashboard_totals, *dashboard_range, on_done=adopt,
+                  on_error=lambda e: print("Range KPI error:", e), key="dashboard_range")
 
-from fpdf import FPDF
+
+from report import generate_report
 
 def generate_pdf():
     try:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        pdf.cell(200, 10, txt="Inventory Report", ln=True, align="C")
-        
-        pdf.cell(200, 10, txt=f"From {start_date.get()} to {end_date.get()}", ln=True, align="C")
-        pdf.ln(10)
-
-        # Table Header
-        headers = ["ID", "Product", "Qty", "Type", "Rate", "Amount", "Date"]
-        col_widths = [10, 40, 20, 25, 25, 30, 35]
-
-        for i, header in enumerate(headers):
-            pdf.cell(col_widths[i], 10, header, border=1)
-
-        pdf.ln()
-
-        # Table Data
-        for child in tree.get_children():
-            values = tree.item(child)['values']
-            for i, val in enumerate(values):
-                pdf.cell(col_widths[i], 10, str(val), border=1)
-            pdf.ln()
-
-        pdf.output("Inventory_Report.pdf")
-        messagebox.showinfo("PDF Saved", "📄 Report saved as Inventory_Report.pdf")
+        start = start_date.get_date()
+        end = end_date.get_date()
+
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".pdf",
+            initialfile="Inventory_Report.pdf",
+            filetypes=[("PDF files", "*.pdf")],
+            title="Save report as"
+        )
+        if not file_path:
+            return  # Cancelled
     except Exception as e:
         messagebox.showerror("Error", f"❌ PDF generation failed\n{str(e)}")
+        return
+
+    def show_progress(done, total):
+        worker.post(lambda: busy_label.config(text=f"⏳ Report: {done} rows"))
+
+    # Rows for the range are streamed from the DB page by page on the worker,
+    # independent of what is loaded in the table
+    worker.submit(
+        generate_report, file_path, start, end, show_progress,
+        on_done=lambda count: messagebox.showinfo("PDF Saved", f"📄 Report ({count} rows) saved as\n{file_path}"),
+        on_error=lambda e: messagebox.showerror("Error", f"❌ PDF generation failed\n{str(e)}"),
+        key="pdf"
+    )
 
 
 
@@ -400,103 +596,214 @@ end_date.place(x=320, y=15)
 filter_btn = Button(report_frame, text="📅 Report Filter", font=("Arial", 10, "bold"), bg="#ffff00", command=filter_report_by_date)
 filter_btn.place(x=420, y=10)
 
-from PIL import Image, ImageTk
-# Load PDF icon
-pdf_icon_img = Image.open("pdf.png")
-pdf_icon_img = pdf_icon_img.resize((20, 20))  # Resize if needed
-pdf_icon = ImageTk.PhotoImage(pdf_icon_img)
+# Icons are loaded after the first paint (load_icons); until then buttons
+# hold an empty placeholder of the same size so the layout doesn't jump
+icon_placeholder = PhotoImage(width=20, height=20)
 
 # PDF Button with Icon
-pdf_btn = Button(report_frame, image=pdf_icon, text=" PDF", compound=LEFT,
+pdf_btn = Button(report_frame, image=icon_placeholder, text=" PDF", compound=LEFT,
                  font=("Arial", 9, "bold"), bg="#0000ff", fg="white", command=generate_pdf)
-pdf_btn.image = pdf_icon  # Prevent garbage collection
 pdf_btn.place(x=565, y=10)
 
 
-def update_dashboard():
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
+def load_dashboard_totals():
+    # Runs on the worker; journal.moving keeps a flush from moving rows
+    # between the DB totals and the pending ones while both are read
+    with journal.moving:
+        fresh = load_db_totals()
+        fresh.add_rows(journal.pending_kpi_rows())
+    return fresh
+
+
+def load_db_totals():
+    if api is not None:
+        return api.dashboard_totals()  # the server keeps them (archive included)
+
+    # With the local cache: delta sync + vectorized totals
+    # (the first call warm-starts from the cache file and saves it afterwards)
+    if txn_cache is not None:
+        first_sync = not txn_cache.ready
+        if first_sync:
+            txn_cache.load_file()
+        txn_cache.sync()
+        if first_sync:
+            txn_cache.save()
+        fresh = txn_cache.dashboard_totals()
+    else:
+        # Otherwise one grouped scan into a fresh totals object
+        conn = require_connection()
+        try:
+            fresh = DashboardTotals()
+            fresh.load(conn)
+        finally:
+            conn.close()
 
-        cursor.execute("SELECT SUM(amount) FROM transactions WHERE transaction_type = 'Purchase'")
-        purchase_total = cursor.fetchone()[0] or 0
+    # Archived months count too (their totals are precomputed)
+    fresh.add_rows(archive.archived_kpi_rows())
+    return fresh
+
+
+def update_dashboard(reload=False, on_loaded=None):
+    # One grouped scan on first use / explicit reload, otherwise in-memory totals
+    global dashboard_loading
+    update_valuation()
+    if on_loaded:
+        dashboard_waiters.append(on_loaded)
+    if reload or not dashboard_totals.loaded:
+        def adopt(fresh):
+            global dashboard_loading
+            dashboard_loading = False
+            dashboard_totals.update_from(fresh)
+            render_dashboard()
+            waiters = dashboard_waiters[:]
+            dashboard_waiters.clear()
+            for waiter in waiters:
+                waiter()
+
+        def failed(e):
+            global dashboard_loading
+            dashboard_loading = False   # waiters stay for the next load
+            print("Dashboard update error:", e)
+
+        dashboard_loading = True
+        worker.submit(load_dashboard_totals, on_done=adopt, on_error=failed, key="dashboard")
+        return
+    if on_loaded and not dashboard_loading:
+        dashboard_waiters.remove(on_loaded)
+        on_loaded()
 
-        cursor.execute("SELECT SUM(amount) FROM transactions WHERE transaction_type = 'Sale'")
-        sale_total = cursor.fetchone()[0] or 0
+    if dashboard_range is not None:
+        update_range_kpis()  # a write may have touched the shown range
+        return
+    render_dashboard()
 
-        profit = sale_total - purchase_total
-        # Update the existing dashboard labels
-        dashboard_labels[0].config(text=f"Purchase\n₹ {purchase_total:.2f}")
-        dashboard_labels[1].config(text=f"Sale\n₹ {sale_total:.2f}")
-        dashboard_labels[2].config(text=f"Profit\n₹ {profit:.2f}")
-        # Inventory (Quantity and Value)
-        cursor.execute("SELECT SUM(qty) FROM transactions WHERE transaction_type = 'Purchase'")
-        purchase_qty = cursor.fetchone()[0] or 0
-        cursor.execute("SELECT SUM(qty) FROM transactions WHERE transaction_type = 'Sale'")
-        sale_qty = cursor.fetchone()[0] or 0
-        
-        inventory_qty = purchase_qty - sale_qty
 
-        cursor.execute("SELECT SUM(qty * rate) FROM transactions WHERE transaction_type = 'Purchase'")
-        purchase_amt = cursor.fetchone()[0] or 0
-        cursor.execute("SELECT SUM(qty * rate) FROM transactions WHERE transaction_type = 'Sale'")
-        sale_amt = cursor.fetchone()[0] or 0
+def update_valuation():
+    # Replays only products marked dirty (the first call replays everything)
+    def adopt(summary):
+        global valuation_summary
+        valuation_summary = summary
+        render_dashboard()
+
+    worker.submit(valuation.refresh, on_done=adopt,
+                  on_error=lambda e: print("Valuation error:", e), key="valuation")
 
-        inventory_amt = purchase_amt - sale_amt
 
-        dashboard_labels[3].config(text=f"Inventory Qty\n{inventory_qty}")
-        dashboard_labels[4].config(text=f"Inventory Amt\n₹ {inventory_amt:.2f}")
-        conn.close()  # ✅ close the connection
+def show_stock():
+    worker.submit(lambda: (valuation.refresh(), valuation.rows()),
+                  on_done=lambda result: show_stock_window(root, result[1], result[0],
+                                                           catalog=product_catalog, on_edit=edit_product),
+                  on_error=lambda e: messagebox.showerror("Stock", f"❌ {e}"), key="stock")
 
 
+def edit_product(name, window):
+    # Double-click in the stock window: SKU / barcode and reorder level
+    entry = product_catalog.get(name)
+    sku = simpledialog.askstring("Product", f"{name} ka SKU / barcode:", parent=window,
+                                 initialvalue=entry.sku if entry is not None and entry.sku else "")
+    if sku is None:
+        return
+    reorder = simpledialog.askinteger("Product", f"{name} ka reorder level:", parent=window, minvalue=0,
+                                      initialvalue=entry.reorder_level if entry is not None else 0)
+    if reorder is None:
+        return
+
+    def saved(product):
+        product_catalog.put(product)
+        window.destroy()
+        show_stock()
+
+    worker.submit(save_product, name, sku, reorder, on_done=saved,
+                  on_error=lambda e: messagebox.showerror("Product", f"❌ {e}", parent=window))
+
+
+def render_dashboard():
+    try:
+        if dashboard_range is not None and range_totals.loaded:
+            kpis = range_totals.kpis()
+            dashboard_scope.config(text=f"{dashboard_range[0]}\nto\n{dashboard_range[1]}")
+        else:
+            kpis = dashboard_totals.kpis()
+            dashboard_scope.config(text="All time")
+            if valuation_summary is not None:
+                # Profit = sales - cost of goods sold, stock valued at its cost layers
+                kpis["profit"] = valuation_summary["gross_profit"]
+                kpis["inventory_amt"] = valuation_summary["stock_value"]
+
+        # Update the existing dashboard labels
+        dashboard_labels[0].config(text=f"Purchase\n₹ {kpis['purchase_total']:.2f}")
+        dashboard_labels[1].config(text=f"Sale\n₹ {kpis['sale_total']:.2f}")
+        dashboard_labels[2].config(text=f"Profit\n₹ {kpis['profit']:.2f}")
+        # Inventory (Quantity and Value)
+        dashboard_labels[3].config(text=f"Inventory Qty\n{kpis['inventory_qty']}")
+        dashboard_labels[4].config(text=f"Inventory Amt\n₹ {kpis['inventory_amt']:.2f}")
+
     except Exception as e:
         print("Dashboard update error:", e)
 
-import openpyxl
-from tkinter import filedialog
-
 def export_to_excel():
     try:
         # Ask where to save file
         file_path = filedialog.asksaveasfilename(
             defaultextension=".xlsx",
-            filetypes=[("Excel files", "*.xlsx")],
+            filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("Compressed CSV", "*.csv.gz")],
             title="Save as"
         )
 
         if not file_path:
             return  # Cancelled
 
-        # Create new workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Transactions"
+        # Export whatever filter is active in the table (date range / product / type)
+        flt = dict(table_view.filter)
 
-        # Header
-        headers = ["ID", "Product", "Qty", "Date", "Type", "Rate", "Amount"]
-        ws.append(headers)
+        def show_progress(done, total):
+            worker.post(lambda: busy_label.config(text=f"⏳ Exported {done}/{total} rows"))
 
-        # Fetch all rows from DB
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, product, qty, date, transaction_type, rate, amount FROM transactions")
-        rows = cursor.fetchall()
-        conn.close()
+        # Rows are streamed in chunks from the DB straight into the file, on the worker
+        worker.submit(
+            export_transactions, file_path, flt, show_progress,
+            on_done=lambda count: messagebox.showinfo("✅ Exported", f"{count} rows exported successfully to:\n{file_path}"),
+            on_error=lambda e: messagebox.showerror("❌ Error", f"Failed to export:\n{e}"),
+            key="export"
+        )
 
-        # Write to sheet
-        for row in rows:
-            ws.append(row)
+    except Exception as e:
+        messagebox.showerror("❌ Error", f"Failed to export:\n{e}")
 
-        # Save
-        wb.save(file_path)
 
-        messagebox.showinfo("✅ Exported", f"Data exported successfully to:\n{file_path}")
 
-    except Exception as e:
-        messagebox.showerror("❌ Error", f"Failed to export:\n{e}")
 
+def import_file():
+    file_path = filedialog.askopenfilename(
+        filetypes=[("CSV / Excel", "*.csv *.xlsx"), ("CSV files", "*.csv"), ("Excel files", "*.xlsx")],
+        title="Import transactions"
+    )
+    if not file_path:
+        return  # Cancelled
 
+    def show_progress(inserted, rejected):
+        worker.post(lambda: busy_label.config(text=f"⏳ Imported {inserted} rows"))
 
+    def run_import():
+        result = import_transactions(file_path, progress=show_progress)
+        if result["rejected"]:
+            result["rejects_path"] = write_rejects(file_path, result["rejected"])
+        return result
+
+    def on_imported(result):
+        # One dashboard regroup + table reload for the whole file, not per row
+        refresh_data()
+        message = f"✅ {result['inserted']} rows imported."
+        if result["rejected"]:
+            message += f"\n⚠️ {len(result['rejected'])} rows rejected, saved to:\n{result['rejects_path']}"
+        messagebox.showinfo("Import", message)
+
+    def on_failed(e):
+        # Batches committed before the error stay in the table
+        refresh_data()
+        messagebox.showerror("Import Error", f"❌ Import failed:\n{e}")
+
+    worker.submit(run_import, on_done=on_imported, on_error=on_failed, key="import")
 
 
 dashboard_labels = []
@@ -514,7 +821,23 @@ for text, xpos, color in dash_labels:
     lbl.place(x=xpos, y=80, width=150, height=50)
     dashboard_labels.append(lbl)
 
-# update_dashboard()
+# Which dates the KPIs cover (all time, or the report filter's range)
+dashboard_scope = Label(dashboard, text="All time", font=("Arial", 9, "bold"), bg="skyblue", justify=CENTER)
+dashboard_scope.place(x=865, y=80, width=90, height=50)
+
+
+def open_analytics():
+    # Trend charts and top products for the report frame's date range
+    start = start_date.get_date()
+    end = end_date.get_date()
+    if start > end:
+        messagebox.showwarning("Analytics", "Start date end date se pehle honi chahiye.")
+        return
+    show_analytics_window(root, worker, start, end)
+
+
+analytics_btn = Button(dashboard, text="📈 Analytics", font=("Arial", 9, "bold"), bg="white", command=open_analytics)
+analytics_btn.place(x=865, y=140, width=90, height=30)
 
 # ================== Form Frame ==================
 form_frame = LabelFrame(root, text="Sale / Purchase Entry", bg="skyblue", font=("Arial", 11, "bold"))
@@ -545,9 +868,26 @@ create_shadow_button(form_frame, "Update", 750, 45, "red", "white", update_trans
 
 
 Label(form_frame, text="Product", bg="skyblue", font=("Arial", 10)).grid(row=0, column=0, padx=10, pady=10, sticky="w")
-product_cb = ttk.Combobox(form_frame, values=["Pen", "Notebook", "Pencil"])
+product_cb = ttk.Combobox(form_frame, values=[])
 product_cb.grid(row=0, column=1, padx=10, pady=10)
 
+
+def on_product_typed(event=None):
+    # Prefix matches from the in-memory catalog, updated on every keystroke
+    product_cb["values"] = product_catalog.prefix(product_cb.get())
+
+
+def on_product_entered(event=None):
+    # A scanned barcode / typed SKU becomes the product name
+    product = product_catalog.by_sku(product_cb.get())
+    if product is not None:
+        product_cb.set(product.name)
+
+
+product_cb.bind("<KeyRelease>", on_product_typed)
+product_cb.bind("<Return>", on_product_entered)
+product_cb.bind("<FocusOut>", on_product_entered)
+
 Label(form_frame, text="Quantity", bg="skyblue", font=("Arial", 10)).grid(row=0, column=2, padx=10, pady=10, sticky="w")
 qty_entry = Entry(form_frame)
 qty_entry.grid(row=0, column=3, padx=10, pady=10)
@@ -579,32 +919,38 @@ def apply_filter():
         field = select_cb.get()
         keyword = filter_entry.get().strip().lower()  # lowercase for consistency
 
-        query = "SELECT * FROM transactions WHERE date BETWEEN %s AND %s"
-        params = [start, end]
+        flt = make_filter(start, end)
 
-        if field == "Product":
-            query += " AND product LIKE %s"
-            params.append(f"%{keyword}%")
+        if field == "Product" and keyword:
+            # Keyword is resolved against the in-memory index -> indexed IN (...) lookup
+            flt.update(product_index.product_filter(keyword))
         elif field == "Transaction Type":
-            query += " AND LOWER(transaction_type) = %s"
-            params.append(keyword)  # already lowercased
+            flt.update(make_filter(trans_type=keyword))
+
+        table_view.load(flt)
 
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute(query, tuple(params))
-        rows = cursor.fetchall()
+    except Exception as e:
+        messagebox.showerror("Filter Error", str(e))
 
-        tree.delete(*tree.get_children())
 
-        for row in rows:
-            tree.insert('', 'end', values=row)
 
-        conn.close()
+# ✅ As-you-type product search (debounced so fast typing runs one query)
+keyword_after_id = None
 
-    except Exception as e:
-        messagebox.showerror("Filter Error", str(e))
+def on_keyword_typed(event=None):
+    global keyword_after_id
+    if select_cb.get() != "Product":
+        return
+    if keyword_after_id is not None:
+        root.after_cancel(keyword_after_id)
+    keyword_after_id = root.after(300, run_keyword_search)
 
 
+def run_keyword_search():
+    global keyword_after_id
+    keyword_after_id = None
+    apply_filter()
+
 
 def update_filter_input(event=None):
     selected = select_cb.get()
@@ -622,6 +968,7 @@ def update_filter_input(event=None):
     else:
         filter_entry = Entry(filter_frame)
         filter_entry.grid(row=0, column=7, padx=(2, 10), pady=10)
+        filter_entry.bind("<KeyRelease>", on_keyword_typed)
 
 
 filter_entry = Entry(filter_frame)
@@ -632,6 +979,14 @@ filter_btn = Button(report_frame, text="Search Filter", font=("Arial", 10, "bold
                     bg="red", fg="white", command=apply_filter)
 filter_btn.place(x=650, y=12)  # 👈 Yaha x/y manually adjust karo as per your layout
 
+import_btn = Button(report_frame, text="📥 Import", font=("Arial", 10, "bold"),
+                    bg="green", fg="white", command=import_file)
+import_btn.place(x=760, y=10)
+
+stock_btn = Button(report_frame, text="📦 Stock", font=("Arial", 10, "bold"),
+                   bg="orange", fg="white", command=show_stock)
+stock_btn.place(x=845, y=10)
+
 
 # Filter section inside filter_frame
 Label(filter_frame, text="Start Date", bg="skyblue", font=("Arial", 10)).grid(row=0, column=0, padx=(10, 2), pady=10, sticky="e")
@@ -650,19 +1005,31 @@ select_cb.set("Select")
 Label(filter_frame, text="Keyword", bg="skyblue", font=("Arial", 10)).grid(row=0, column=6, padx=(10, 2), pady=10, sticky="e")
 filter_entry = Entry(filter_frame)
 filter_entry.grid(row=0, column=7, padx=(2, 10), pady=10)
+filter_entry.bind("<KeyRelease>", on_keyword_typed)
 
-try:
-    icon_refresh = PhotoImage(file="refresh.png")
-    icon_dustbin = PhotoImage(file="dustbin.png")
-    icon_excel = PhotoImage(file="excel.png")  
-    icon_edit = PhotoImage(file="edit.png")
+refresh_btn = Button(filter_frame, width=25, height=25, image=icon_placeholder, bg="white", command=refresh_data)
+refresh_btn.place(x=785, y=10)
+dustbin_btn = Button(filter_frame, width=30, height=30, image=icon_placeholder, bg="white", command=delete_transaction)
+dustbin_btn.place(x=820, y=8)
+excel_btn = Button(filter_frame, image=icon_placeholder, width=30, height=30, bg="white", command=export_to_excel)
+excel_btn.place(x=865, y=8)
+edit_btn = Button(filter_frame, image=icon_placeholder, width=30, height=30, bg="white", command=update_transaction)
+edit_btn.place(x=910, y=8)
 
-    Button(filter_frame, width=25, height=25, image=icon_refresh, bg="white", command=refresh_data).place(x=785, y=10)
-    Button(filter_frame, width=30, height=30, image=icon_dustbin, bg="white", command=delete_transaction).place(x=820, y=8)
-    Button(filter_frame, image=icon_excel, width=30, height=30, bg="white", command=export_to_excel).place(x=865, y=8)
-    Button(filter_frame, image=icon_edit, width=30, height=30, bg="white", command=update_transaction).place(x=910, y=8)
-except Exception as e:
-    print("Image Load Error:", e)
+
+def load_icons():
+    try:
+        pdf_icon = PhotoImage(file="pdf.png")
+        pdf_icon = pdf_icon.subsample(max(1, round(pdf_icon.width() / 20)))  # 512px -> ~20px, no PIL needed
+        for button, icon in ((pdf_btn, pdf_icon),
+                             (refresh_btn, PhotoImage(file="refresh.png")),
+                             (dustbin_btn, PhotoImage(file="dustbin.png")),
+                             (excel_btn, PhotoImage(file="excel.png")),
+                             (edit_btn, PhotoImage(file="edit.png"))):
+            button.config(image=icon)
+            button.image = icon  # Prevent garbage collection
+    except Exception as e:
+        print("Image Load Error:", e)
 
 
 # ================== Table Frame ==================
@@ -709,10 +1076,216 @@ tree.bind("<ButtonRelease-1>", on_row_select)
 
 
 scroll_y = Scrollbar(table_frame, orient=VERTICAL, command=tree.yview)
-tree.configure(yscrollcommand=scroll_y.set)
 scroll_y.pack(side=RIGHT, fill=Y)
 tree.pack(fill=BOTH, expand=True)
 
+# ✅ Virtualized table: only a few pages live in the Treeview at a time
+table_status = Label(root, text="", bg="skyblue", font=("Arial", 9))
+table_status.place(x=20, y=645)
+table_view = PagedTreeView(
+    tree, scroll_y, status_label=table_status, worker=worker,
+    source=api if api is not None else CachedSource(query_cache, archive.ArchiveSource(txn_cache)),
+    on_error=lambda e: messagebox.showerror("Error", f"❌ Failed to load transactions\n{e}")
+)
+
+# ✅ Heading click = sort (indexed ORDER BY + keyset pages, or the local
+# cache's presorted keys); right-click = quick filter for that column
+table_view.bind_headings(dict(zip(columns, SORT_COLUMNS)))
+
+
+def on_heading_right_click(event):
+    if tree.identify_region(event.x, event.y) != "heading":
+        return
+    heading = columns[int(tree.identify_column(event.x)[1:]) - 1]
+    column = SORT_COLUMNS[columns.index(heading)]
+    hints = {
+        "product": "naam ka hissa, e.g. pen",
+        "transaction_type": "sale / purchase",
+        "date": "2024-04-01..2024-04-30, >=2024-04-01 ya ek date",
+    }
+    text = simpledialog.askstring(
+        "Column Filter",
+        f"{heading} filter ({hints.get(column, '100..500, >=100, <=50 ya ek value')}):\nKhali chhodo = filter hatao",
+        parent=root
+    )
+    if text is None:
+        return
+    text = text.strip()
+    try:
+        if not text:
+            fields = {}
+        elif column == "product":
+            fields = product_index.product_filter(text.lower())
+        elif column == "transaction_type":
+            fields = make_filter(trans_type=text)
+        elif column == "date":
+            fields = make_filter(*parse_range(text, as_date))
+        else:
+            fields = make_filter(ranges={column: parse_range(text, int if column in ("id", "qty") else float)})
+    except ValueError:
+        messagebox.showwarning("Column Filter", f"⚠️ '{text}' samajh nahi aaya.")
+        return
+    table_view.filter_column(column, fields)
+
+
+tree.bind("<Button-3>", on_heading_right_click)
+
+# ================== Performance Stats ==================
+# F12 opens a live view of the timing histograms (see perf.py) plus pool and
+# cache counters; set INVENTORY_PERF=1 to collect from startup.
+def extra_perf_stats():
+    stats = {"startup ms": perf.startup_times, "pool": pool_stats(), "query cache": query_cache.stats()}
+    if txn_cache is not None:
+        stats["local cache rows"] = txn_cache.alive_count
+    return stats
+
+root.bind("<F12>", lambda event: perf.show_stats_window(root, extra_stats=extra_perf_stats))
+
+# ================== Startup ==================
+# The window is painted first; schema check, dashboard and table load start
+# afterwards on the worker.  `python project.py --measure-startup` prints the
+# timings as JSON and exits once the data is on screen.
+measure_startup = "--measure-startup" in sys.argv
+if measure_startup:
+    perf.enable()
+
+
+def on_first_paint():
+    root.update_idletasks()
+    perf.mark_startup("first_paint", startup_started)
+    load_icons()
+    # Create / migrate the schema and verify its indexes before the first load
+    worker.submit(prepare_database, on_done=on_schema_checked, on_error=on_schema_failed, key="schema")
+
+
+def prepare_database():
+    problems = ensure_schema()
+    conn = require_connection()
+    try:
+        prune_changes(conn)
+    finally:
+        conn.close()
+    if change_watcher is not None:
+        change_watcher.rebase(*change_position())  # before the first load, see refresh_data()
+    return problems
+
+
+def on_schema_failed(e):
+    print("⚠️ Schema check failed:", e)
+    journal_flusher.kick(0)  # keeps retrying (with backoff) until the DB is back
+
+
+def on_schema_checked(problems):
+    global schema_ready
+    schema_ready = True
+    journal_flusher.kick(0)  # replay whatever the last session couldn't flush
+    if problems:
+        print("⚠️ Schema problems:", problems)
+        messagebox.showwarning("Database Schema", "⚠️ Schema mismatch:\n" + "\n".join(problems))
+    update_dashboard(on_loaded=load_initial_table)
+    refresh_product_index()
+    refresh_catalog()
+    if api is not None:
+        follow_changes()
+    elif change_watcher is not None:
+        root.after(POLL_MS, watch_changes)
+
+
+def load_initial_table():
+    perf.mark_startup("dashboard", startup_started)
+    table_view.load(total=live_row_count(), on_loaded=on_startup_loaded)
+
+
+def on_startup_loaded():
+    perf.mark_startup("data_loaded", startup_started)
+    print("⏱️ Startup (ms):", perf.startup_times)
+    if measure_startup:
+        print(json.dumps({"metric": "startup", **perf.startup_times}))
+        root.quit()
+
+
+root.after_idle(on_first_paint)
+
+
+# ================== Server Change Feed ==================
+# One long poll at a time on the worker; each answer patches the table
+# (insert / update / delete of single rows) and reloads the KPIs.
+def follow_changes():
+    worker.submit(change_cursor.poll, on_done=apply_changes, on_error=on_feed_error, key="changes")
+
+
+def apply_changes(result):
+    reset, events = result
+    if reset:
+        refresh_data()  # missed events (server restart, bulk import, archiving)
+    elif events:
+        apply_events(events)
+    follow_changes()
+
+
+def apply_events(events):
+    # Rows other writers added / changed / deleted (server feed or change
+    # watcher); applying one twice changes nothing
+    matches = row_matcher(table_view.filter)
+    for event in events:
+        if event["op"] == "insert":
+            row = event["row"]
+            data_changed(row[3])
+            product_index.add(row[1])
+            valuation.add(row)
+            if product_catalog.get(row[1]) is None:
+                sync_catalog()
+            if not table_view.shown(row[0]) and matches(row):
+                table_view.prepend(row)
+        else:
+            # product / date the row had: from the markers (schema v11) or the table
+            before = [tuple(pair) for pair in event.get("was") or ()]
+            old = table_view.values(event["id"])
+            if old is not None:
+                before.append((old[1], old[3]))
+            if before:
+                valuation.changed(*(product for product, _ in before))
+                data_changed(*(trans_date for _, trans_date in before))
+            else:
+                valuation.mark_stale()  # older marker, row not on screen: unknown
+                query_cache.clear()
+                data_changed()
+            if event["op"] == "update":
+                valuation.changed(event["row"][1])
+                data_changed(event["row"][3])
+                table_view.update_row(event["row"])
+            elif old is not None:
+                table_view.remove(str(event["id"]))
+    update_dashboard(reload=True)
+
+
+def on_feed_error(e):
+    print("⚠️ Server change feed:", e)
+    root.after(5000, follow_changes)  # server restarting / unreachable: try again
+
+
+# ================== Change Version Polling ==================
+# Direct DB mode: every POLL_MS one MAX(change_id) lookup on the worker.
+# Unchanged -> nothing else happens; moved -> only the changed rows are
+# read and patched in like feed events (see changes.py).
+def watch_changes():
+    worker.submit(change_watcher.poll, on_done=on_changes_polled, on_error=on_watch_error,
+                  key="change_poll", quiet=True)
+
+
+def on_changes_polled(result):
+    changes = change_watcher.accept(result)
+    if changes == RESET:
+        refresh_data()  # archiving, a bulk import or a rebuilt change log
+    elif changes:
+        apply_events(changes)
+    root.after(POLL_MS, watch_changes)
+
+
+def on_watch_error(e):
+    print("⚠️ Change check:", e)
+    root.after(max(POLL_MS, 5000), watch_changes)  # DB down: try again later
+
 # ================== Run App ==================
 def global_exception_handler(type, value, tb):
     import traceback
@@ -727,5 +1300,14 @@ def global_exception_handler(type, value, tb):
 
 
 root.mainloop()
+worker.shutdown()
+if perf.ENABLED:
+    perf.dump(extra={"source": "exit"})
+if journal.pending_count():
+    print(f"🕒 {journal.pending_count()} journaled rows will be flushed on the next start.")
+journal.close()
+if txn_cache is not None:
+    txn_cache.save()
+close_pool()
 
 
@@ -0,0 +1,125 @@
+import threading
+from collections import OrderedDict
+
+import paged_view
+from filters import filter_key, as_date, without_sort
+from paged_view import PAGE_SIZE
+
+
+# ================== Query Result Cache ==================
+# Remembers page / count results per (query kind, normalized filter, paging
+# args) with LRU eviction under a memory cap.  A write only drops the entries
+# whose date range covers the written row's date, so flipping back to a
+# range that wasn't touched is answered without running the query again.
+
+MAX_BYTES = 32 * 1024 * 1024
+ROW_BYTES = 160          # rough size of one cached row tuple
+ENTRY_BYTES = 200        # key + bookkeeping overhead per entry
+
+
+def _range(flt):
+    # (first, last) date ordinals the filter can return; None = unbounded
+    flt = flt or {}
+    start = flt["start"].toordinal() if "start" in flt else None
+    end = flt["end"].toordinal() if "end" in flt else None
+    return start, end
+
+
+class QueryCache:
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (value, size, start, end)
+        self._bytes = 0
+        self._generation = 0            # bumped on every invalidation
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_load(self, key, flt, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            # A write landed while we were loading: the result may already be stale
+            if generation == self._generation:
+                self._store(key, flt, value)
+        return value
+
+    def _store(self, key, flt, value):
+        size = ENTRY_BYTES + (len(value) * ROW_BYTES if isinstance(value, list) else 0)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+
+        start, end = _range(flt)
+        self._entries[key] = (value, size, start, end)
+        self._bytes += size
+
+        while self._bytes > self.max_bytes:
+            _, (_, old_size, _, _) = self._entries.popitem(last=False)
+            self._bytes -= old_size
+            self.evictions += 1
+
+    def invalidate_dates(self, *dates):
+        # Drop every entry whose date range covers any of the written dates
+        ordinals = [as_date(d).toordinal() for d in dates if d]
+        with self._lock:
+            self._generation += 1
+            stale = [
+                key for key, (_, _, start, end) in self._entries.items()
+                if any((start is None or start <= o) and (end is None or o <= end) for o in ordinals)
+            ]
+            for key in stale:
+                self._bytes -= self._entries.pop(key)[1]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class CachedSource:
+    # Row source for PagedTreeView that goes through a QueryCache;
+    # inner is another source (the local transaction cache or the DB)
+
+    def __init__(self, cache, inner=None):
+        self.cache = cache
+        self.inner = inner if inner is not None else paged_view
+
+    def fetch_page(self, flt=None, before_id=None, after_id=None, limit=PAGE_SIZE):
+        key = ("page", filter_key(flt), before_id, after_id, limit)
+        return self.cache.get_or_load(key, flt, lambda: self.inner.fetch_page(flt, before_id, after_id, limit))
+
+    def count_rows(self, flt=None):
+        key = ("count", filter_key(without_sort(flt)))  # one count for every sort order
+        return self.cache.get_or_load(key, flt, lambda: self.inner.count_rows(flt))
@@ -0,0 +1,195 @@
+import zlib
+from datetime import date, datetime
+
+import perf
+from export import iter_transaction_chunks, CHUNK_SIZE
+from filters import make_filter
+
+
+# ================== Streaming PDF Writer ==================
+# FPDF keeps every page in memory until output(), so large reports grow
+# without bound.  This writer emits each page to disk as soon as it is laid
+# out; only the byte offsets of written objects are kept for the xref table.
+
+MM = 72 / 25.4
+PAGE_WIDTH, PAGE_HEIGHT = 595.28, 841.89  # A4 in points
+
+
+def _pdf_text(value):
+    text = str(value).replace("₹", "Rs.").encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+class StreamingPDF:
+
+    CATALOG, PAGES, FONT, FONT_BOLD = 1, 2, 3, 4
+
+    def __init__(self, file_path):
+        self._file = open(file_path, "wb")
+        self._offsets = {}
+        self._next_id = 5
+        self._kids = []
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data):
+        self._file.write(data)
+
+    def _begin(self, obj_id):
+        self._offsets[obj_id] = self._file.tell()
+        self._write(f"{obj_id} 0 obj\n".encode())
+
+    def _object(self, obj_id, body):
+        self._begin(obj_id)
+        self._write(body.encode("latin-1") + b"\nendobj\n")
+
+    def add_page(self, ops):
+        content = zlib.compress("\n".join(ops).encode("latin-1"))
+        content_id, page_id = self._next_id, self._next_id + 1
+        self._next_id += 2
+
+        self._begin(content_id)
+        self._write(f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode())
+        self._write(content)
+        self._write(b"\nendstream\nendobj\n")
+
+        self._object(page_id, (
+            f"<< /Type /Page /Parent {self.PAGES} 0 R "
+            f"/MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 {self.FONT} 0 R /F2 {self.FONT_BOLD} 0 R >> >> "
+            f"/Contents {content_id} 0 R >>"
+        ))
+        self._kids.append(page_id)
+
+    def close(self):
+        self._object(self.FONT, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        self._object(self.FONT_BOLD, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+        kids = " ".join(f"{kid} 0 R" for kid in self._kids)
+        self._object(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._kids)} >>")
+        self._object(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>")
+
+        xref_at = self._file.tell()
+        size = self._next_id
+        self._write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        for obj_id in range(1, size):
+            self._write(f"{self._offsets[obj_id]:010d} 00000 n \n".encode())
+        self._write(f"trailer\n<< /Size {size} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode())
+        self._file.close()
+
+
+# ================== Report Layout ==================
+HEADERS = ["ID", "Product", "Qty", "Type", "Rate", "Amount", "Date"]
+COL_WIDTHS = [w * MM for w in (10, 40, 20, 25, 25, 30, 35)]
+MARGIN = 15 * MM
+ROW_HEIGHT = 7 * MM
+FONT_SIZE = 9
+
+
+def _fmt(value):
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+class _ReportPage:
+
+    def __init__(self, number):
+        self.number = number
+        self.ops = []
+        self.y = PAGE_HEIGHT - MARGIN
+        self.totals = {"Purchase": [0, 0.0], "Sale": [0, 0.0]}
+
+    def text(self, x, y, value, bold=False, size=FONT_SIZE, max_width=None):
+        value = _fmt(value)
+        if max_width:
+            # Helvetica averages ~0.5em per character; good enough to keep text inside its cell
+            max_chars = int(max_width / (size * 0.5))
+            if len(value) > max_chars:
+                value = value[:max(1, max_chars - 1)] + "."
+        font = "F2" if bold else "F1"
+        self.ops.append(f"BT /{font} {size} Tf {x:.2f} {y:.2f} Td ({_pdf_text(value)}) Tj ET")
+
+    def centered(self, y, value, bold=False, size=FONT_SIZE):
+        width = len(str(value)) * size * 0.5
+        self.text((PAGE_WIDTH - width) / 2, y, value, bold=bold, size=size)
+
+    def row(self, values, bold=False):
+        x = MARGIN
+        top = self.y
+        for width, value in zip(COL_WIDTHS, values):
+            self.ops.append(f"{x:.2f} {top - ROW_HEIGHT:.2f} {width:.2f} {ROW_HEIGHT:.2f} re S")
+            self.text(x + 2, top - ROW_HEIGHT + 6, value, bold=bold, max_width=width - 4)
+            x += width
+        self.y -= ROW_HEIGHT
+
+    def fits(self, rows=1, reserve=3):
+        # keep room for the subtotal / grand total lines at the bottom
+        return self.y - (rows + reserve) * ROW_HEIGHT >= MARGIN
+
+
+def _totals_line(totals):
+    purchase_qty, purchase_amt = totals["Purchase"]
+    sale_qty, sale_amt = totals["Sale"]
+    return (f"Purchase: {purchase_qty} qty / Rs. {purchase_amt:.2f}    "
+            f"Sale: {sale_qty} qty / Rs. {sale_amt:.2f}")
+
+
+@perf.timed("export.pdf")
+def generate_report(file_path, start, end, progress=None, chunk_size=CHUNK_SIZE, flt=None, chunks=None,
+                    subtitle=None):
+    # Streams transactions between start and end (inclusive) from the DB and
+    # writes them page by page; returns the number of rows written.
+    #   flt       more filter fields on top of the date range (e.g. one product)
+    #   chunks    rows already read (lists in date, id order) instead of a query,
+    #             e.g. a batch run's shared snapshot (see cli.py)
+    #   subtitle  extra heading line, e.g. the product name
+    if chunks is None:
+        chunks = iter_transaction_chunks(dict(flt or {}, **make_filter(start, end)), chunk_size, order_by="date, id")
+    pdf = StreamingPDF(file_path)
+    grand = {"Purchase": [0, 0.0], "Sale": [0, 0.0]}
+    done = 0
+
+    def new_page(number):
+        page = _ReportPage(number)
+        if number == 1:
+            page.centered(page.y - 14, "Inventory Report", bold=True, size=14)
+            page.centered(page.y - 32, f"From {_fmt(start)} to {_fmt(end)}", size=11)
+            page.y -= 50
+            if subtitle:
+                page.centered(page.y + 4, subtitle, bold=True, size=11)
+                page.y -= 14
+        page.row(HEADERS, bold=True)  # header repeated on every page
+        return page
+
+    def finish_page(page, last=False):
+        page.y -= 4
+        page.text(MARGIN, page.y - 10, "Page subtotal  " + _totals_line(page.totals), bold=True)
+        page.y -= ROW_HEIGHT
+        if last:
+            page.text(MARGIN, page.y - 10, "Grand total     " + _totals_line(grand), bold=True)
+        page.text(PAGE_WIDTH - MARGIN - 40, MARGIN / 2, f"Page {page.number}", size=8)
+        pdf.add_page(page.ops)
+
+    page = new_page(1)
+    try:
+        for rows in chunks:
+            for trans_id, product, qty, trans_date, trans_type, rate, amount in rows:
+                if not page.fits():
+                    finish_page(page)
+                    page = new_page(page.number + 1)
+
+                page.row((trans_id, product, qty, trans_type, float(rate), float(amount), trans_date))
+                for totals in (page.totals, grand):
+                    if trans_type in totals:
+                        totals[trans_type][0] += int(qty)
+                        totals[trans_type][1] += float(amount)
+
+            done += len(rows)
+            if progress:
+                progress(done, None)
+
+        finish_page(page, last=True)
+    finally:
+        pdf.close()
+    return done
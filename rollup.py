@@ -0,0 +1,244 @@
+import sys
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+import archive
+from db import require_connection
+from dashboard import DashboardTotals, TRANSACTION_TYPES, _money
+from filters import as_date
+
+
+# ================== Daily Roll-up ==================
+# daily_rollup holds one row per (day, product, transaction_type) with the
+# count, qty, amount and qty * rate of that day's transactions.  Triggers
+# (schema v5) keep it current on every insert / update / delete, from any
+# counter.  In memory it is turned into prefix sums per transaction type,
+# so the totals of any date range are two binary searches and a subtraction,
+# however many years of history there are.
+#
+#   python rollup.py verify     compare the roll-up with transactions + archive
+#   python rollup.py rebuild    recompute it from scratch
+
+GROUPED_SQL = """
+    SELECT date, product, transaction_type, COUNT(*), SUM(qty), SUM(amount), SUM(qty * rate)
+    FROM transactions
+    GROUP BY date, product, transaction_type
+"""
+
+
+class _PrefixSeries:
+    # Sorted day ordinals plus running (count, qty, amount, value) totals;
+    # sums[i] covers days[:i], so sums[0] is all zeros
+
+    def __init__(self, rows):
+        # rows: (day, count, qty, amount, value) in day order
+        self.days = []
+        self.sums = [(0, 0, _money(0), _money(0))]
+        count = qty = 0
+        amount = value = _money(0)
+        for day, day_count, day_qty, day_amount, day_value in rows:
+            count += int(day_count or 0)
+            qty += int(day_qty or 0)
+            amount += _money(day_amount)
+            value += _money(day_value)
+            self.days.append(as_date(str(day)[:10]).toordinal())
+            self.sums.append((count, qty, amount, value))
+
+    def between(self, start=None, end=None):
+        # (count, qty, amount, value) for start <= day <= end (either side open)
+        lo = 0 if start is None else bisect_left(self.days, start.toordinal())
+        hi = len(self.days) if end is None else bisect_right(self.days, end.toordinal())
+        if hi <= lo:
+            return 0, 0, _money(0), _money(0)
+        top, bottom = self.sums[hi], self.sums[lo]
+        return tuple(a - b for a, b in zip(top, bottom))
+
+
+class RollupIndex:
+    # Prefix sums over daily_rollup: all products per type, plus per-product
+    # series built on first use.  Local writes mark it stale; the next query
+    # reloads (the roll-up has one row per day / product / type, not per sale).
+
+    MAX_PRODUCTS = 200   # per-product series kept before the oldest is dropped
+
+    def __init__(self):
+        self.ready = False
+        self.stale = False
+        self._lock = threading.Lock()
+        self._series = {}     # transaction_type -> _PrefixSeries
+        self._products = {}   # (product, transaction_type) -> _PrefixSeries
+
+    def mark_stale(self):
+        self.stale = True
+
+    def load(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT transaction_type, day, SUM(cnt), SUM(qty), SUM(amount), SUM(value)
+            FROM daily_rollup
+            GROUP BY transaction_type, day
+            ORDER BY transaction_type, day
+        """)
+        grouped = {}
+        for trans_type, *row in cursor.fetchall():
+            grouped.setdefault(trans_type, []).append(row)
+        cursor.close()
+
+        with self._lock:
+            self._series = {trans_type: _PrefixSeries(rows) for trans_type, rows in grouped.items()}
+            self._products = {}
+            self.ready = True
+            self.stale = False
+
+    def _ensure_fresh(self, conn):
+        if not self.ready or self.stale:
+            self.load(conn)
+
+    def _product_series(self, conn, product, trans_type):
+        key = (product, trans_type)
+        series = self._products.get(key)
+        if series is None:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT day, cnt, qty, amount, value FROM daily_rollup
+                WHERE product = %s AND transaction_type = %s
+                ORDER BY day
+            """, (product, trans_type))
+            series = _PrefixSeries(cursor.fetchall())
+            cursor.close()
+            with self._lock:
+                if len(self._products) >= self.MAX_PRODUCTS:
+                    self._products.pop(next(iter(self._products)))
+                self._products[key] = series
+        return series
+
+    # ---- queries (run on the worker) ----
+    def range_rows(self, start=None, end=None, product=None):
+        # KPI rows (transaction_type, count, SUM(amount), SUM(qty), SUM(qty * rate))
+        # for a date range, same shape as dashboard.KPI_SQL returns
+        start = as_date(start) if start else None
+        end = as_date(end) if end else None
+        conn = require_connection()
+        try:
+            self._ensure_fresh(conn)
+            rows = []
+            for trans_type in TRANSACTION_TYPES:
+                if product is None:
+                    series = self._series.get(trans_type)
+                    if series is None:
+                        continue
+                else:
+                    series = self._product_series(conn, product, trans_type)
+                count, qty, amount, value = series.between(start, end)
+                rows.append((trans_type, count, amount, qty, value))
+            return rows
+        finally:
+            conn.close()
+
+    def dashboard_totals(self, start=None, end=None, product=None):
+        totals = DashboardTotals()
+        totals.load_rows(self.range_rows(start, end, product))
+        return totals
+
+    def period_totals(self, start, end, period="month"):
+        # [(period_start, DashboardTotals)] for each month / quarter / year
+        # touching start..end, each answered from the prefix sums
+        start, end = as_date(start), as_date(end)
+        results = []
+        for first, last in _periods(start, end, period):
+            results.append((first, self.dashboard_totals(max(first, start), min(last, end))))
+        return results
+
+
+def _periods(start, end, period):
+    months = {"month": 1, "quarter": 3, "year": 12}[period]
+    month = (start.month - 1) // months * months + 1
+    first = date(start.year, month, 1)
+    while first <= end:
+        year, month = divmod(first.month - 1 + months, 12)
+        following = date(first.year + year, month + 1, 1)
+        yield first, date.fromordinal(following.toordinal() - 1)
+        first = following
+
+
+# ---------------- Rebuild / verify ----------------
+def rebuild(conn):
+    # Recompute the whole roll-up in one transaction; returns the row count
+    archived = archive.grouped_rows()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM daily_rollup")
+        cursor.execute(f"""
+            INSERT INTO daily_rollup (day, product, transaction_type, cnt, qty, amount, value)
+            {GROUPED_SQL}
+        """)
+        # Archived days: add the archive's rows to whatever is still live on those days
+        for record in archive.load_months(conn).values():
+            cursor.execute("SELECT day, product, transaction_type, cnt, qty, amount, value "
+                           "FROM daily_rollup WHERE day BETWEEN %s AND %s", (record.start, record.end))
+            for day, product, trans_type, cnt, qty, amount, value in cursor.fetchall():
+                bucket = archived.setdefault((str(day)[:10], product, trans_type), [0, 0, 0, 0])
+                bucket[0] += cnt
+                bucket[1] += qty
+                bucket[2] += _money(amount)
+                bucket[3] += _money(value)
+            cursor.execute("DELETE FROM daily_rollup WHERE day BETWEEN %s AND %s", (record.start, record.end))
+        cursor.executemany(
+            "INSERT INTO daily_rollup (day, product, transaction_type, cnt, qty, amount, value) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            [(as_date(day), product, trans_type, *bucket) for (day, product, trans_type), bucket in archived.items()]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    cursor.execute("SELECT COUNT(*) FROM daily_rollup")
+    return cursor.fetchone()[0]
+
+
+def verify(conn):
+    # Returns a list of mismatches between daily_rollup and a fresh GROUP BY
+    def normalize(rows):
+        return {
+            (str(day)[:10], product, trans_type): (int(cnt), int(qty or 0), _money(amount), _money(value))
+            for day, product, trans_type, cnt, qty, amount, value in rows
+            if int(cnt)  # days whose rows were all deleted stay behind with cnt = 0
+        }
+
+    cursor = conn.cursor()
+    cursor.execute(GROUPED_SQL)
+    expected = normalize(cursor.fetchall())
+    for (day, product, trans_type), (cnt, qty, amount, value) in archive.grouped_rows().items():
+        live = expected.get((day, product, trans_type), (0, 0, 0, 0))
+        expected[(day, product, trans_type)] = (live[0] + cnt, live[1] + qty,
+                                                _money(live[2] + amount), _money(live[3] + value))
+    cursor.execute("SELECT day, product, transaction_type, cnt, qty, amount, value FROM daily_rollup")
+    actual = normalize(cursor.fetchall())
+
+    problems = []
+    for key in sorted(expected.keys() | actual.keys()):
+        if expected.get(key) != actual.get(key):
+            problems.append(f"{key}: expected {expected.get(key)}, roll-up has {actual.get(key)}")
+    return problems
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    conn = require_connection()
+    try:
+        if command == "rebuild":
+            print(f"✅ Roll-up rebuilt: {rebuild(conn)} rows")
+        elif command == "verify":
+            problems = verify(conn)
+            for problem in problems[:50]:
+                print("  -", problem)
+            if problems:
+                print(f"⚠️ {len(problems)} roll-up rows differ; run `python rollup.py rebuild`")
+                sys.exit(1)
+            print("✅ Roll-up matches the transactions table")
+        else:
+            print("Usage: python rollup.py [verify|rebuild]")
+            sys.exit(2)
+    finally:
+        conn.close()
@@ -0,0 +1,520 @@
+import json
+
+from db import require_connection
+
+
+# ================== Schema & Migrations ==================
+# The schema is versioned in a small schema_version table.  Each migration
+# runs once, in order; ensure_schema() applies whatever is missing and then
+# checks that the tables, columns and indexes the app's queries rely on exist.
+
+TRANSACTIONS_COLUMNS = ("id", "product", "qty", "date", "transaction_type", "rate", "amount", "idempotency_key",
+                        "product_id")
+
+# name -> (table, columns); every index here is checked at startup
+EXPECTED_INDEXES = {
+    # dashboard GROUP BY transaction_type, type + date range reports
+    "idx_type_date": ("transactions", "transaction_type, date"),
+    # date BETWEEN filters (report filter, search filter), optionally by product
+    "idx_date_product": ("transactions", "date, product"),
+    # DISTINCT product for the search index, product IN (...) lookups
+    "idx_product_date": ("transactions", "product, date"),
+    # per-product range totals from the daily roll-up
+    "idx_rollup_product": ("daily_rollup", "product, transaction_type, day"),
+    # write-behind journal: a retried batch must not insert the same entry twice
+    "idx_idempotency_key": ("transactions", "idempotency_key"),
+    # integer product key: per-product history, joins with the catalog
+    "idx_product_id_date": ("transactions", "product_id, date"),
+    "idx_products_sku": ("products", "sku"),
+    # click-to-sort on the transactions grid: ORDER BY column, id + keyset paging
+    "idx_sort_product": ("transactions", "product, id"),
+    "idx_sort_qty": ("transactions", "qty, id"),
+    "idx_sort_date": ("transactions", "date, id"),
+    "idx_sort_type": ("transactions", "transaction_type, id"),
+    "idx_sort_rate": ("transactions", "rate, id"),
+    "idx_sort_amount": ("transactions", "amount, id"),
+}
+UNIQUE_INDEXES = {"idx_idempotency_key", "idx_products_sku"}
+
+
+# name -> (event, op recorded in transaction_changes); with the insert marker
+# (schema v9) MAX(change_id) moves on every write, see changes.py
+EXPECTED_TRIGGERS = {
+    "trg_transactions_update": ("UPDATE", "U"),
+    "trg_transactions_delete": ("DELETE", "D"),
+    "trg_transactions_insert": ("INSERT", "I"),
+}
+
+# The columns whose changes the change log and the roll-up care about.  On
+# SQLite the UPDATE triggers are limited to these (schema v8), so filling in
+# product_id doesn't look like an edit; MySQL sets it in a BEFORE trigger.
+DATA_COLUMNS = "product, qty, date, transaction_type, rate, amount"
+
+# name -> (event, [(row alias, sign), ...]) applied to daily_rollup (schema v5)
+EXPECTED_ROLLUP_TRIGGERS = {
+    "trg_rollup_insert": ("INSERT", [("NEW", 1)]),
+    "trg_rollup_update": ("UPDATE", [("OLD", -1), ("NEW", 1)]),
+    "trg_rollup_delete": ("DELETE", [("OLD", -1)]),
+}
+
+# name -> event; keep transactions.product_id pointing at the catalog row
+# for transactions.product, creating that row for a new name (schema v8)
+EXPECTED_CATALOG_TRIGGERS = {
+    "trg_product_id_insert": "INSERT",
+    "trg_product_id_update": "UPDATE",
+}
+
+
+def _index_exists(cursor, dialect, table, name):
+    if dialect == "sqlite":
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s",
+                       (table, name))
+    else:
+        cursor.execute("""
+            SELECT 1 FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            LIMIT 1
+        """, (table, name))
+    return cursor.fetchone() is not None
+
+
+def create_index(cursor, dialect, name):
+    # MySQL has no CREATE INDEX IF NOT EXISTS, so check first on both backends
+    table, columns = EXPECTED_INDEXES[name]
+    unique = "UNIQUE " if name in UNIQUE_INDEXES else ""
+    if not _index_exists(cursor, dialect, table, name):
+        cursor.execute(f"CREATE {unique}INDEX {name} ON {table} ({columns})")
+
+
+def _columns(cursor, dialect, table):
+    if dialect == "sqlite":
+        cursor.execute(f"SELECT name FROM pragma_table_info('{table}')")
+    else:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s
+        """, (table,))
+    return {row[0].lower() for row in cursor.fetchall()}
+
+
+def _trigger_exists(cursor, dialect, name):
+    if dialect == "sqlite":
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = %s", (name,))
+    else:
+        cursor.execute("""
+            SELECT 1 FROM information_schema.triggers
+            WHERE trigger_schema = DATABASE() AND trigger_name = %s
+        """, (name,))
+    return cursor.fetchone() is not None
+
+
+def _trigger_event(dialect, event):
+    if dialect == "sqlite" and event == "UPDATE":
+        return f"UPDATE OF {DATA_COLUMNS}"
+    return event
+
+
+def create_change_trigger(cursor, dialect, name):
+    event, op = EXPECTED_TRIGGERS[name]
+    if _trigger_exists(cursor, dialect, name):
+        return
+    row = "NEW" if event == "INSERT" else "OLD"
+    if "product" in _columns(cursor, dialect, "transaction_changes"):
+        # schema v11: the product / date the row had, so readers can drop
+        # just that product's and that day's cached results
+        statement = (f"INSERT INTO transaction_changes (txn_id, op, product, trans_date) "
+                     f"VALUES ({row}.id, '{op}', {row}.product, {row}.date)")
+    else:
+        statement = f"INSERT INTO transaction_changes (txn_id, op) VALUES ({row}.id, '{op}')"
+    if dialect == "sqlite":
+        statement = f"BEGIN {statement}; END"
+    cursor.execute(f"CREATE TRIGGER {name} AFTER {_trigger_event(dialect, event)} ON transactions "
+                   f"FOR EACH ROW {statement}")
+
+
+def _rollup_upsert(dialect, row, sign):
+    # Add (sign = 1) or subtract (-1) one transaction row from its roll-up bucket
+    minus = "-" if sign < 0 else ""
+    statement = (
+        "INSERT INTO daily_rollup (day, product, transaction_type, cnt, qty, amount, value) "
+        f"VALUES ({row}.date, {row}.product, {row}.transaction_type, {sign}, "
+        f"{minus}{row}.qty, {minus}{row}.amount, {minus}({row}.qty * {row}.rate))"
+    )
+    if dialect == "sqlite":
+        return statement + (
+            " ON CONFLICT (day, product, transaction_type) DO UPDATE SET"
+            " cnt = cnt + excluded.cnt, qty = qty + excluded.qty,"
+            " amount = amount + excluded.amount, value = value + excluded.value"
+        )
+    return statement + (
+        " ON DUPLICATE KEY UPDATE"
+        " cnt = cnt + VALUES(cnt), qty = qty + VALUES(qty),"
+        " amount = amount + VALUES(amount), value = value + VALUES(value)"
+    )
+
+
+def create_rollup_trigger(cursor, dialect, name):
+    event, changes = EXPECTED_ROLLUP_TRIGGERS[name]
+    if _trigger_exists(cursor, dialect, name):
+        return
+    body = " ".join(_rollup_upsert(dialect, row, sign) + ";" for row, sign in changes)
+    cursor.execute(f"CREATE TRIGGER {name} AFTER {_trigger_event(dialect, event)} ON transactions "
+                   f"FOR EACH ROW BEGIN {body} END")
+
+
+def create_catalog_trigger(cursor, dialect, name):
+    event = EXPECTED_CATALOG_TRIGGERS[name]
+    if _trigger_exists(cursor, dialect, name):
+        return
+    lookup = "(SELECT id FROM products WHERE name = NEW.product)"
+    if dialect == "sqlite":
+        # SQLite can't assign NEW.*: patch the stored row afterwards
+        # (product_id isn't in DATA_COLUMNS, so no change / roll-up trigger fires)
+        when = "NEW.product_id IS NULL" if event == "INSERT" else "NEW.product IS NOT OLD.product"
+        cursor.execute(f"""
+            CREATE TRIGGER {name} AFTER {_trigger_event(dialect, event)} ON transactions
+            FOR EACH ROW WHEN {when} BEGIN
+                INSERT OR IGNORE INTO products (name) VALUES (NEW.product);
+                UPDATE transactions SET product_id = {lookup} WHERE id = NEW.id;
+            END
+        """)
+    else:
+        when = "NEW.product_id IS NULL" if event == "INSERT" else "NEW.product <> OLD.product"
+        cursor.execute(f"""
+            CREATE TRIGGER {name} BEFORE {event} ON transactions
+            FOR EACH ROW BEGIN
+                IF {when} THEN
+                    INSERT IGNORE INTO products (name) VALUES (NEW.product);
+                    SET NEW.product_id = {lookup};
+                END IF;
+            END
+        """)
+
+
+# ---------------- Migrations ----------------
+def _v1_create_transactions(cursor, dialect):
+    if dialect == "sqlite":
+        id_column = "id INTEGER PRIMARY KEY AUTOINCREMENT"
+    else:
+        id_column = "id INT AUTO_INCREMENT PRIMARY KEY"
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS transactions (
+            {id_column},
+            product VARCHAR(100) NOT NULL,
+            qty INT NOT NULL,
+            date DATE NOT NULL,
+            transaction_type VARCHAR(20) NOT NULL,
+            rate DECIMAL(10, 2) NOT NULL,
+            amount DECIMAL(12, 2) NOT NULL
+        )
+    """)
+
+
+def _v2_filter_indexes(cursor, dialect):
+    create_index(cursor, dialect, "idx_type_date")
+    create_index(cursor, dialect, "idx_date_product")
+
+
+def _v3_product_index(cursor, dialect):
+    create_index(cursor, dialect, "idx_product_date")
+
+
+def _v4_change_log(cursor, dialect):
+    # Every UPDATE / DELETE (from any counter) leaves a marker so local
+    # caches can sync changed rows; new rows are found by id > last seen id
+    if dialect == "sqlite":
+        id_column = "change_id INTEGER PRIMARY KEY AUTOINCREMENT"
+    else:
+        id_column = "change_id BIGINT AUTO_INCREMENT PRIMARY KEY"
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS transaction_changes (
+            {id_column},
+            txn_id INT NOT NULL,
+            op CHAR(1) NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    for name in ("trg_transactions_update", "trg_transactions_delete"):
+        create_change_trigger(cursor, dialect, name)
+
+
+def _v5_daily_rollup(cursor, dialect):
+    # Per day / product / type totals for range reports (see rollup.py),
+    # backfilled from the existing rows and then kept current by triggers
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_rollup (
+            day DATE NOT NULL,
+            product VARCHAR(100) NOT NULL,
+            transaction_type VARCHAR(20) NOT NULL,
+            cnt INT NOT NULL,
+            qty BIGINT NOT NULL,
+            amount DECIMAL(16, 2) NOT NULL,
+            value DECIMAL(18, 2) NOT NULL,
+            PRIMARY KEY (day, product, transaction_type)
+        )
+    """)
+    create_index(cursor, dialect, "idx_rollup_product")
+    cursor.execute("DELETE FROM daily_rollup")
+    cursor.execute("""
+        INSERT INTO daily_rollup (day, product, transaction_type, cnt, qty, amount, value)
+        SELECT date, product, transaction_type, COUNT(*), SUM(qty), SUM(amount), SUM(qty * rate)
+        FROM transactions
+        GROUP BY date, product, transaction_type
+    """)
+    for name in EXPECTED_ROLLUP_TRIGGERS:
+        create_rollup_trigger(cursor, dialect, name)
+
+
+def _v6_archived_months(cursor, dialect):
+    # One row per month moved to an archive file (see archive.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archived_months (
+            month CHAR(7) NOT NULL PRIMARY KEY,
+            file VARCHAR(255) NOT NULL,
+            row_count INT NOT NULL,
+            min_id INT NOT NULL,
+            max_id INT NOT NULL,
+            totals TEXT NOT NULL,
+            products TEXT NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _v7_idempotency_key(cursor, dialect):
+    # Set by the write-behind journal (see journal.py); NULL for other writers
+    if "idempotency_key" not in _columns(cursor, dialect, "transactions"):
+        cursor.execute("ALTER TABLE transactions ADD COLUMN idempotency_key VARCHAR(36) NULL")
+    create_index(cursor, dialect, "idx_idempotency_key")
+
+
+def _canonical_names(names):
+    # {stored spelling: canonical spelling}; spellings that only differ in
+    # case / spacing are one product, named by its most used spelling
+    groups = {}
+    for name, count in names:
+        cleaned = " ".join(str(name).split())
+        groups.setdefault(cleaned.casefold(), []).append((name, cleaned, count))
+    mapping = {}
+    for spellings in groups.values():
+        totals = {}
+        for _, cleaned, count in spellings:
+            totals[cleaned] = totals.get(cleaned, 0) + count
+        canonical = min(totals, key=lambda cleaned: (-totals[cleaned], cleaned))
+        for name, _, _ in spellings:
+            mapping[name] = canonical
+    return mapping
+
+
+def _v8_product_catalog(cursor, dialect):
+    # products: integer key, SKU / barcode, reorder level (see catalog.py).
+    # transactions keeps its product name (archives, roll-up and filters
+    # read it) and gains product_id, maintained by triggers for every writer.
+    if dialect == "sqlite":
+        id_column = "id INTEGER PRIMARY KEY AUTOINCREMENT"
+        name_column = "name VARCHAR(100) NOT NULL COLLATE NOCASE UNIQUE"
+    else:
+        id_column = "id INT AUTO_INCREMENT PRIMARY KEY"
+        name_column = "name VARCHAR(100) NOT NULL UNIQUE"   # default collation is case-insensitive
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS products (
+            {id_column},
+            {name_column},
+            sku VARCHAR(64) NULL,
+            reorder_level INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    create_index(cursor, dialect, "idx_products_sku")
+    if "product_id" not in _columns(cursor, dialect, "transactions"):
+        cursor.execute("ALTER TABLE transactions ADD COLUMN product_id INT NULL")
+
+    # Merge spellings; the renames go through the roll-up / change-log triggers
+    cursor.execute("SELECT product, COUNT(*) FROM transactions GROUP BY product")
+    mapping = _canonical_names(cursor.fetchall())
+    for name, canonical in mapping.items():
+        if name != canonical:
+            cursor.execute("UPDATE transactions SET product = %s WHERE product = %s", (canonical, name))
+
+    names = set(mapping.values())
+    cursor.execute("SELECT products FROM archived_months")
+    for (products,) in cursor.fetchall():
+        names.update(" ".join(name.split()) for name in json.loads(products))
+    insert = "INSERT OR IGNORE" if dialect == "sqlite" else "INSERT IGNORE"
+    cursor.executemany(f"{insert} INTO products (name) VALUES (%s)", [(name,) for name in sorted(names)])
+
+    # The backfill is not an edit: no change markers / roll-up churn for it.
+    # On SQLite the UPDATE triggers come back limited to DATA_COLUMNS.
+    for name in ("trg_transactions_update", "trg_rollup_update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute("""
+        UPDATE transactions
+        SET product_id = (SELECT id FROM products WHERE products.name = transactions.product)
+        WHERE product_id IS NULL
+    """)
+    create_change_trigger(cursor, dialect, "trg_transactions_update")
+    create_rollup_trigger(cursor, dialect, "trg_rollup_update")
+    create_index(cursor, dialect, "idx_product_id_date")
+    for name in EXPECTED_CATALOG_TRIGGERS:
+        create_catalog_trigger(cursor, dialect, name)
+
+
+def _v9_insert_markers(cursor, dialect):
+    # New rows leave a marker too, so the latest change_id is a version for
+    # the whole table; consumers that find new rows by id ignore 'I' markers
+    create_change_trigger(cursor, dialect, "trg_transactions_insert")
+
+
+def _v10_sort_indexes(cursor, dialect):
+    # One (column, id) index per sortable column, see paged_view.fetch_page()
+    for name in EXPECTED_INDEXES:
+        if name.startswith("idx_sort_"):
+            create_index(cursor, dialect, name)
+
+
+def _v11_change_details(cursor, dialect):
+    # Markers carry the row's product / date before the write, and readers
+    # record how far they have read so the log can be pruned (see changes.py)
+    columns = _columns(cursor, dialect, "transaction_changes")
+    if "product" not in columns:
+        cursor.execute("ALTER TABLE transaction_changes ADD COLUMN product VARCHAR(100) NULL")
+    if "trans_date" not in columns:
+        cursor.execute("ALTER TABLE transaction_changes ADD COLUMN trans_date DATE NULL")
+    for name in EXPECTED_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        create_change_trigger(cursor, dialect, name)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_readers (
+            reader VARCHAR(100) NOT NULL PRIMARY KEY,
+            change_id BIGINT NOT NULL,
+            seen_at BIGINT NOT NULL
+        )
+    """)
+
+
+def _v12_archive_ranges(cursor, dialect):
+    # Min / max of each sortable column per archived month; filled in by
+    # archive.load_months() for months archived before this version
+    if "ranges" not in _columns(cursor, dialect, "archived_months"):
+        cursor.execute("ALTER TABLE archived_months ADD COLUMN ranges TEXT NULL")
+
+
+def _v13_rollup_spellings(cursor, dialect):
+    # v8 renamed live rows only; archived days kept their roll-up rows under
+    # the old spellings.  Re-key them to the catalog spelling (see archive.py)
+    cursor.execute("SELECT name FROM products")
+    catalog = {" ".join(name.split()).casefold(): name for (name,) in cursor.fetchall()}
+    cursor.execute("SELECT DISTINCT product FROM daily_rollup")
+    for (name,) in cursor.fetchall():
+        canonical = catalog.get(" ".join(name.split()).casefold())
+        if canonical is None or canonical == name:
+            continue
+        if dialect == "sqlite":
+            # case-sensitive key: "pen" and "Pen" rows of one day are merged
+            cursor.execute("""
+                INSERT INTO daily_rollup (day, product, transaction_type, cnt, qty, amount, value)
+                SELECT day, %s, transaction_type, cnt, qty, amount, value FROM daily_rollup WHERE product = %s
+                ON CONFLICT (day, product, transaction_type) DO UPDATE SET
+                cnt = cnt + excluded.cnt, qty = qty + excluded.qty,
+                amount = amount + excluded.amount, value = value + excluded.value
+            """, (canonical, name))
+            cursor.execute("DELETE FROM daily_rollup WHERE product = %s", (name,))
+        else:
+            # the key's collation already treats the spellings as one product
+            cursor.execute("UPDATE daily_rollup SET product = %s WHERE product = %s", (canonical, name))
+
+
+MIGRATIONS = [
+    (1, "create transactions table", _v1_create_transactions),
+    (2, "indexes for type / date / product filters", _v2_filter_indexes),
+    (3, "product index for search lookups", _v3_product_index),
+    (4, "change log for updates / deletes", _v4_change_log),
+    (5, "daily roll-up with maintenance triggers", _v5_daily_rollup),
+    (6, "archived months", _v6_archived_months),
+    (7, "idempotency keys for journaled writes", _v7_idempotency_key),
+    (8, "product catalog with integer keys", _v8_product_catalog),
+    (9, "insert markers in the change log", _v9_insert_markers),
+    (10, "sort indexes for the transactions grid", _v10_sort_indexes),
+    (11, "old product / date in change markers, change log pruning", _v11_change_details),
+    (12, "sort key ranges for archived months", _v12_archive_ranges),
+    (13, "catalog spellings in the roll-up of archived days", _v13_rollup_spellings),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT NOT NULL,
+            description VARCHAR(200),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    return cursor.fetchone()[0] or 0
+
+
+def migrate(conn):
+    # Applies pending migrations; returns the list of versions applied
+    cursor = conn.cursor()
+    version = current_version(cursor)
+    conn.commit()
+
+    applied = []
+    for number, description, apply in MIGRATIONS:
+        if number <= version:
+            continue
+        apply(cursor, conn.dialect)
+        cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                       (number, description))
+        conn.commit()
+        print(f"✅ Schema migrated to v{number}: {description}")
+        applied.append(number)
+    return applied
+
+
+def verify_schema(conn):
+    # Returns a list of problems; empty means the schema matches what the app expects
+    cursor = conn.cursor()
+    problems = []
+    columns = _columns(cursor, conn.dialect, "transactions")
+
+    if not columns:
+        return ["Table 'transactions' does not exist"]
+    for column in TRANSACTIONS_COLUMNS:
+        if column not in columns:
+            problems.append(f"Column transactions.{column} is missing")
+
+    for name, (table, _) in EXPECTED_INDEXES.items():
+        if not _index_exists(cursor, conn.dialect, table, name):
+            problems.append(f"Index {name} on {table} is missing")
+
+    for name in list(EXPECTED_TRIGGERS) + list(EXPECTED_ROLLUP_TRIGGERS) + list(EXPECTED_CATALOG_TRIGGERS):
+        if not _trigger_exists(cursor, conn.dialect, name):
+            problems.append(f"Trigger {name} is missing")
+
+    version = current_version(cursor)
+    if version < LATEST_VERSION:
+        problems.append(f"Schema is at v{version}, app expects v{LATEST_VERSION}")
+    return problems
+
+
+def ensure_schema():
+    # Startup hook: migrate, then verify
+    conn = require_connection()
+    try:
+        migrate(conn)
+        return verify_schema(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    problems = ensure_schema()
+    if problems:
+        print("⚠️ Schema problems:")
+        for problem in problems:
+            print("  -", problem)
+    else:
+        print(f"✅ Schema is up to date (v{LATEST_VERSION})")
@@ -0,0 +1,104 @@
+from bisect import bisect_left
+
+import archive
+from db import require_connection
+
+
+# ================== Product Search Index ==================
+# An in-memory index over the distinct product names: a sorted list for
+# prefix lookups and a trigram -> names map for "contains" lookups.  A
+# keyword is resolved to the exact matching names here, so the DB query
+# becomes an indexed `product IN (...)` instead of `LIKE '%keyword%'`.
+
+MAX_IN_LIST = 500  # more matches than this -> plain LIKE is the better plan
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ProductIndex:
+
+    def __init__(self):
+        self.loaded = False
+        self._names = {}      # lowercase -> stored spelling(s)
+        self._sorted = []     # sorted lowercase names for prefix search
+        self._trigrams = {}   # trigram -> set of lowercase names
+
+    def load(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT product FROM transactions")
+        for (name,) in cursor.fetchall():
+            self.add(name)
+        cursor.close()
+        self.loaded = True
+
+    def add(self, name):
+        if not name:
+            return
+        key = name.lower()
+        spellings = self._names.get(key)
+        if spellings is None:
+            self._names[key] = spellings = set()
+            self._sorted.insert(bisect_left(self._sorted, key), key)
+            for gram in _trigrams(key):
+                self._trigrams.setdefault(gram, set()).add(key)
+        spellings.add(name)
+
+    def __len__(self):
+        return len(self._names)
+
+    # ---- lookups ----
+    def prefix(self, keyword):
+        keyword = keyword.lower()
+        start = bisect_left(self._sorted, keyword)
+        matches = []
+        for key in self._sorted[start:]:
+            if not key.startswith(keyword):
+                break
+            matches.append(key)
+        return matches
+
+    def search(self, keyword):
+        # Same semantics as LIKE '%keyword%' (case-insensitive); returns stored names
+        keyword = keyword.strip().lower()
+        if not keyword:
+            return []
+
+        if len(keyword) < 3:
+            keys = [key for key in self._sorted if keyword in key]
+        else:
+            grams = sorted(_trigrams(keyword), key=lambda g: len(self._trigrams.get(g, ())))
+            candidates = set(self._trigrams.get(grams[0], ()))
+            for gram in grams[1:]:
+                candidates &= self._trigrams.get(gram, set())
+                if not candidates:
+                    break
+            keys = sorted(key for key in candidates if keyword in key)
+
+        # prefix matches first, they are what the user is usually typing towards
+        keys.sort(key=lambda key: not key.startswith(keyword))
+        return [name for key in keys for name in sorted(self._names[key])]
+
+    def product_filter(self, keyword):
+        # Filter fields (see filters.py) for a product keyword
+        if not self.loaded:
+            return {"product_like": keyword}
+
+        names = self.search(keyword)
+        if len(names) > MAX_IN_LIST:
+            return {"product_like": keyword}
+        return {"products": names}
+
+
+def load_product_index():
+    # Runs on the worker; the caller swaps the fresh index in on the UI thread
+    conn = require_connection()
+    try:
+        index = ProductIndex()
+        index.load(conn)
+        for name in archive.archived_products():  # so filters still find archived-only products
+            index.add(name)
+        return index
+    finally:
+        conn.close()
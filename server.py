@@ -0,0 +1,866 @@
+import os
+import re
+import sys
+import json
+import uuid
+import asyncio
+import argparse
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+import archive
+import perf
+from catalog import canonical_names, canonical_rows
+from changes import (current_version, reader_name, report_position, pruned_floor, prune_changes, was,
+                     Gaps, gaps_below, in_list)
+from db import require_connection, close_pool, pool_stats, is_duplicate_key
+from dashboard import DashboardTotals, fetch_delta_row
+from export import export_csv, export_xlsx
+from filters import make_filter, sort_order, as_date, RANGE_COLUMNS
+from journal import INSERT_SQL
+from paged_view import SELECT_COLUMNS, PAGE_SIZE
+from query_cache import QueryCache, CachedSource
+from report import generate_report
+from rollup import RollupIndex
+from schema import ensure_schema
+from search import ProductIndex, load_product_index
+from txn_cache import TransactionCache, available as cache_available
+from validation import validate_transaction, parse_date, ValidationError
+
+
+# ================== Inventory API Server ==================
+# Optional shared process for several counters: it owns the connection
+# pool, the result / columnar caches, the roll-up and the dashboard totals,
+# and serves them as JSON over HTTP (stdlib asyncio, no framework).  Every
+# write from any source - this server, a Tk app talking to the DB directly,
+# the importer - shows up in the transaction_changes markers / new ids, which
+# a watcher turns into a numbered change feed; clients long-poll
+# GET /changes?since=N and patch their view instead of reloading.
+#
+#   python server.py [--host 127.0.0.1] [--port 8765]
+#
+#   GET    /health                      pool + feed status
+#   GET    /transactions                newest first; filters, before_id / after_id, limit
+#   GET    /transactions/count          row count for the same filters
+#   GET    /transactions/<id>
+#   POST   /transactions                {"product", "qty", "date", "transaction_type", "rate",
+#                                        "idempotency_key"?}
+#   PUT    /transactions/<id>           same fields
+#   DELETE /transactions/<id>
+#   GET    /dashboard                   KPIs; start / end / product use the daily roll-up
+#   GET    /products?q=pen              product name search
+#   GET    /export?format=csv|csv.gz|xlsx   file download, same filters
+#   GET    /report?start=&end=          PDF report
+#   GET    /changes?since=N&timeout=25  change feed (long poll)
+#   GET    /stats                       timing histograms and cache counters
+#
+# Filters (query string): start, end (YYYY-MM-DD), product (repeatable, exact),
+# keyword (resolved by the product index), product_like, type, min_<col> /
+# max_<col> for id, qty, rate, amount.  sort=amount / -amount orders the
+# pages; their cursors are then before_id + before_value (after_id + after_value).
+
+HOST = os.environ.get("INVENTORY_API_HOST", "127.0.0.1")
+PORT = int(os.environ.get("INVENTORY_API_PORT", "8765"))
+CACHE_FILE = os.environ.get("INVENTORY_SERVER_CACHE_FILE", "server_transactions.cache")
+WORKERS = 8              # threads for DB / file work
+WATCH_SECONDS = 1.0      # how often other writers' changes are picked up
+FEED_SIZE = 10000        # events kept for clients that fall behind
+FEED_MAX_ROWS = 2000     # more new rows than this in one poll -> "reset" (e.g. a bulk import)
+MAX_POLL_SECONDS = 60
+MAX_PAGE = 1000
+MAX_BODY = 1 << 20
+FILE_CHUNK = 1 << 16
+
+
+class HttpError(Exception):
+
+    def __init__(self, status, message, field=None):
+        super().__init__(message)
+        self.status = status
+        self.field = field
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()[:10]
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def to_json(value):
+    return json.dumps(value, default=_json_default, ensure_ascii=False).encode("utf-8")
+
+
+def row_json(row):
+    # (id, product, qty, date, type, rate, amount) -> JSON-friendly list
+    trans_id, product, qty, trans_date, trans_type, rate, amount = row
+    return [int(trans_id), product, int(qty), str(trans_date)[:10], trans_type, float(rate), float(amount)]
+
+
+def totals_json(totals):
+    return {
+        "totals": {trans_type: dict(bucket) for trans_type, bucket in totals.totals.items()},
+        "kpis": totals.kpis(),
+        "row_count": totals.row_count(),
+    }
+
+
+# ---------------- Data layer (executor threads) ----------------
+class InventoryService:
+    # Blocking DB / cache work; every method runs on the server's thread pool
+
+    def __init__(self):
+        self.query_cache = QueryCache()
+        self.txn_cache = TransactionCache(CACHE_FILE) if cache_available() else None
+        self.rollup_index = RollupIndex()
+        self.product_index = ProductIndex()
+        self.source = CachedSource(self.query_cache, archive.ArchiveSource(self.txn_cache))
+        self.totals = None               # all-time DashboardTotals, reloaded after changes
+        self._totals_lock = threading.Lock()
+        self.last_seen_id = 0            # change watcher position
+        self.last_change_id = 0
+        self.id_gaps = Gaps()            # ids / change_ids the watermarks passed
+        self.change_gaps = Gaps()        # before they committed (changes.Gaps)
+        self.reader = reader_name("server")
+        self.archive_signature = None
+
+    def start(self):
+        problems = ensure_schema()
+        if self.txn_cache is not None:
+            self.txn_cache.load_file()
+            self.txn_cache.sync()
+            self.txn_cache.save()
+        self.product_index = load_product_index()
+
+        conn = require_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(id) FROM transactions")
+            self.last_seen_id = cursor.fetchone()[0] or 0
+            cursor.execute("SELECT MAX(change_id) FROM transaction_changes")
+            self.last_change_id = cursor.fetchone()[0] or 0
+            self._gaps_below(cursor)
+            self.archive_signature = self._archive_signature(cursor)
+            report_position(cursor, self.reader, self.last_change_id)
+            conn.commit()
+            prune_changes(conn)
+        finally:
+            conn.close()
+        return problems
+
+    def stop(self):
+        if self.txn_cache is not None:
+            self.txn_cache.save()
+
+    # ---- reads ----
+    def fetch_page(self, flt, before_id=None, after_id=None, limit=PAGE_SIZE):
+        return self.source.fetch_page(flt, before_id, after_id, limit)
+
+    def count_rows(self, flt):
+        return self.source.count_rows(flt)
+
+    def get_row(self, trans_id):
+        conn = require_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {SELECT_COLUMNS} FROM transactions WHERE id = %s", (trans_id,))
+            return cursor.fetchone()
+        finally:
+            conn.close()
+
+    def dashboard(self, start=None, end=None, product=None):
+        if start or end or product:
+            return self.rollup_index.dashboard_totals(start, end, product)
+        with self._totals_lock:
+            if self.totals is None:
+                self.totals = self._load_totals()
+            return self.totals
+
+    def _load_totals(self):
+        if self.txn_cache is not None:
+            self.txn_cache.sync()
+            totals = self.txn_cache.dashboard_totals()
+        else:
+            conn = require_connection()
+            try:
+                totals = DashboardTotals()
+                totals.load(conn)
+            finally:
+                conn.close()
+        totals.add_rows(archive.archived_kpi_rows())
+        return totals
+
+    def search_products(self, keyword, limit=20):
+        if not keyword:
+            return []
+        return self.product_index.search(keyword)[:limit]
+
+    def product_filter(self, keyword):
+        return self.product_index.product_filter(keyword)
+
+    # ---- writes ----
+    def _clean(self, data):
+        product, trans_type, qty, rate = validate_transaction(
+            data.get("product"), data.get("transaction_type"), data.get("qty"), data.get("rate")
+        )
+        trans_date = parse_date(data.get("date") or date.today())
+        return product, qty, trans_date, trans_type, rate, round(qty * rate, 2)
+
+    def create(self, data):
+        # -> (row, created); a repeated idempotency_key returns the stored row
+        values = self._clean(data)
+        key = str(data.get("idempotency_key") or uuid.uuid4().hex)[:36]
+        conn = require_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {SELECT_COLUMNS} FROM transactions WHERE idempotency_key = %s", (key,))
+            existing = cursor.fetchone()
+            if existing is not None:
+                return existing, False
+            values = canonical_rows(cursor, [values])[0]
+            try:
+                cursor.execute(INSERT_SQL, values + (key,))
+            except Exception as e:
+                # a concurrent retry with the same key inserted it first
+                if not is_duplicate_key(e):
+                    raise
+                conn.rollback()
+                cursor.execute(f"SELECT {SELECT_COLUMNS} FROM transactions WHERE idempotency_key = %s", (key,))
+                return cursor.fetchone(), False
+            conn.commit()
+            cursor.execute(f"SELECT {SELECT_COLUMNS} FROM transactions WHERE idempotency_key = %s", (key,))
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+        self.product_index.add(values[0])
+        return row, True
+
+    def update(self, trans_id, data):
+        product, qty, trans_date, trans_type, rate, amount = self._clean(data)
+        conn = require_connection()
+        try:
+            cursor = conn.cursor()
+            product = canonical_names(cursor, [product])[product]
+            if fetch_delta_row(cursor, trans_id) is None:
+                raise self._missing(trans_id, trans_date)
+            cursor.execute("""
+                UPDATE transactions
+                SET product=%s, qty=%s, date=%s, transaction_type=%s, rate=%s, amount=%s
+                WHERE id=%s
+            """, (product, qty, trans_date, trans_type, rate, amount, trans_id))
+            conn.commit()
+        finally:
+            conn.close()
+        self.product_index.add(product)
+        return (trans_id, product, qty, trans_date, trans_type, rate, amount)
+
+    def delete(self, trans_id):
+        conn = require_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {SELECT_COLUMNS} FROM transactions WHERE id = %s", (trans_id,))
+            row = cursor.fetchone()
+            if row is None:
+                raise self._missing(trans_id)
+            cursor.execute("DELETE FROM transactions WHERE id = %s", (trans_id,))
+            conn.commit()
+            return row
+        finally:
+            conn.close()
+
+    def _missing(self, trans_id, trans_date=None):
+        if trans_date is not None and archive.is_archived(trans_date):
+            return HttpError(409, f"🔒 {str(trans_date)[:7]} archive ho chuka hai, closed month ki entry change nahi hogi.")
+        return HttpError(404, f"Transaction {trans_id} nahi mili.")
+
+    # ---- change watcher ----
+    def _archive_signature(self, cursor):
+        cursor.execute("SELECT COUNT(*), SUM(row_count), MAX(max_id) FROM archived_months")
+        return tuple(cursor.fetchone())
+
+    def poll_changes(self):
+        # New / changed / deleted rows since the last poll, from any writer.
+        # Returns feed events; also drops whatever the caches hold for them.
+        events = []
+        conn = require_connection()
+        try:
+            cursor = conn.cursor()
+            # every write moves the change version (schema v9): idle polls stop here
+            max_change = current_version(cursor)
+            late_ids, late_changes = self.id_gaps.due(), self.change_gaps.due()
+            if max_change == self.last_change_id and not late_ids and not late_changes:
+                return events
+            signature = self._archive_signature(cursor)
+            cursor.execute("SELECT MAX(id) FROM transactions")
+            max_id = cursor.fetchone()[0] or 0
+
+            if (signature != self.archive_signature or max_change < self.last_change_id
+                    or self.last_change_id < pruned_floor(cursor)
+                    or max_id - self.last_seen_id > FEED_MAX_ROWS):
+                # Months archived, change log / table rebuilt, or a bulk import:
+                # clients reload instead of replaying row by row
+                self.archive_signature = signature
+                self.last_change_id = max_change
+                self.last_seen_id = max_id
+                self._gaps_below(cursor)
+                events.append({"op": "reset"})
+            else:
+                if max_change > self.last_change_id or late_changes:
+                    extra, params = in_list("change_id", late_changes)
+                    cursor.execute(
+                        "SELECT change_id, txn_id, op, product, trans_date FROM transaction_changes "
+                        f"WHERE (change_id > %s AND change_id <= %s){extra}",
+                        tuple([self.last_change_id, max_change] + params)
+                    )
+                    rows = cursor.fetchall()
+                    seen = {int(row[0]) for row in rows}
+                    self.change_gaps.filled(seen)
+                    self.change_gaps.note(self.last_change_id, max_change, seen)
+                    markers = [row[1:] for row in rows]
+                    before = was(markers)
+                    changed = sorted({int(txn_id) for txn_id, op, _, _ in markers
+                                      if op in ("U", "D") and txn_id <= self.last_seen_id})
+                    for start in range(0, len(changed), 1000):
+                        chunk = changed[start:start + 1000]
+                        cursor.execute(
+                            f"SELECT {SELECT_COLUMNS} FROM transactions WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+                            tuple(chunk)
+                        )
+                        current = {int(row[0]): row for row in cursor.fetchall()}
+                        for txn_id in chunk:
+                            row = current.get(txn_id)
+                            old = [list(pair) for pair in before.get(txn_id, [])]
+                            if row is None:
+                                events.append({"op": "delete", "id": txn_id, "was": old})
+                            else:
+                                events.append({"op": "update", "id": txn_id, "row": row_json(row), "was": old})
+                    self.last_change_id = max_change
+                    report_position(cursor, self.reader, max_change)
+                    conn.commit()
+
+                if max_id > self.last_seen_id or late_ids:
+                    extra, params = in_list("id", late_ids)
+                    cursor.execute(
+                        f"SELECT {SELECT_COLUMNS} FROM transactions WHERE (id > %s AND id <= %s){extra} ORDER BY id",
+                        tuple([self.last_seen_id, max_id] + params)
+                    )
+                    rows = cursor.fetchall()
+                    for row in rows:
+                        events.append({"op": "insert", "id": int(row[0]), "row": row_json(row)})
+                    seen = {int(row[0]) for row in rows}
+                    self.id_gaps.filled(seen)
+                    self.id_gaps.note(self.last_seen_id, max_id, seen)
+                    self.last_seen_id = max(self.last_seen_id, max_id)
+        finally:
+            conn.close()
+
+        if events:
+            self._invalidate(events)
+        return events
+
+    def _gaps_below(self, cursor):
+        # watermarks just read from MAX(): what below them hasn't committed yet
+        self.id_gaps = gaps_below(cursor, "transactions", "id", self.last_seen_id)
+        self.change_gaps = gaps_below(cursor, "transaction_changes", "change_id",
+                                      self.last_change_id, pruned_floor(cursor))
+
+    def _invalidate(self, events):
+        # dates the rows have now and had before ("was", schema v11 markers)
+        if events[0]["op"] == "reset":
+            self.query_cache.clear()
+            archive.reload()
+            self.product_index = load_product_index()
+        elif any(event["op"] != "insert" and not event["was"] for event in events):
+            self.query_cache.clear()   # pre-v11 marker: the old date is unknown
+        else:
+            self.query_cache.invalidate_dates(
+                *(event["row"][3] for event in events if "row" in event),
+                *(trans_date for event in events for _, trans_date in event.get("was", ()))
+            )
+        self.rollup_index.mark_stale()
+        if self.txn_cache is not None:
+            self.txn_cache.mark_stale()
+        with self._totals_lock:
+            self.totals = None
+
+    def stats(self):
+        stats = {"pool": pool_stats(), "query_cache": self.query_cache.stats()}
+        if self.txn_cache is not None:
+            stats["txn_cache_rows"] = self.txn_cache.alive_count
+        return stats
+
+
+# ---------------- Change feed ----------------
+class ChangeFeed:
+    # Numbered events in memory; waiters are woken when new ones arrive.
+    # A client that asks for a seq older than the buffer (or from another
+    # server run, see instance) gets "reset" and reloads.
+
+    def __init__(self, size=FEED_SIZE):
+        self.instance = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.events = deque(maxlen=size)
+        self._changed = asyncio.Condition()
+
+    async def publish(self, events):
+        async with self._changed:
+            for event in events:
+                self.seq += 1
+                event["seq"] = self.seq
+                self.events.append(event)
+            self._changed.notify_all()
+
+    def since(self, seq):
+        # events after seq, or None when the client has to reload
+        if seq > self.seq:
+            return None
+        oldest = self.events[0]["seq"] if self.events else self.seq + 1
+        if seq < oldest - 1:
+            return None
+        return [event for event in self.events if event["seq"] > seq]
+
+    async def wait(self, seq, timeout):
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(lambda: self.seq != seq), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.since(seq)
+
+
+# ---------------- HTTP ----------------
+class Request:
+
+    def __init__(self, method, target, headers, body):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = parts.path.rstrip("/") or "/"
+        self.query = parse_qs(parts.query, keep_blank_values=True)   # product= is an empty product list
+        self.headers = headers
+        self.body = body
+
+    def arg(self, name, default=None):
+        values = self.query.get(name)
+        return values[-1] if values and values[-1] != "" else default
+
+    def int_arg(self, name, default=None):
+        value = self.arg(name)
+        if value in (None, ""):
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise HttpError(400, f"{name} must be an integer", name)
+
+    def json(self):
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError:
+            raise HttpError(400, "Body must be JSON")
+        if not isinstance(data, dict):
+            raise HttpError(400, "Body must be a JSON object")
+        return data
+
+
+class FileResponse:
+
+    def __init__(self, path, content_type, filename):
+        self.path = path
+        self.content_type = content_type
+        self.filename = filename
+
+
+ROUTES = []
+
+
+def route(method, pattern):
+    def register(handler):
+        ROUTES.append((method, re.compile(pattern + "$"), handler))
+        return handler
+    return register
+
+
+class InventoryServer:
+
+    def __init__(self, service=None, host=HOST, port=PORT):
+        self.service = service or InventoryService()
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="api")
+        self.feed = None
+        self._server = None
+        self._watcher = None
+        self._poke = None
+        self._poll_lock = None
+
+    async def call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    # ---- lifecycle ----
+    async def start(self):
+        self.feed = ChangeFeed()
+        self._poke = asyncio.Event()
+        self._poll_lock = asyncio.Lock()
+        problems = await self.call(self.service.start)
+        for problem in problems:
+            print("⚠️ Schema:", problem, file=sys.stderr)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]   # port 0 = any free port
+        self._watcher = asyncio.create_task(self._watch())
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.call(self.service.stop)
+        self.executor.shutdown(wait=True)
+
+    # ---- change watcher ----
+    async def _watch(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._poke.wait(), WATCH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._poke.clear()
+            try:
+                await self.sync_changes()
+            except Exception as e:
+                print("⚠️ Change watcher:", e, file=sys.stderr)
+                await asyncio.sleep(WATCH_SECONDS * 5)   # DB down: don't spin
+
+    async def sync_changes(self):
+        # Called after every write too, so a client reading right after its
+        # own write never gets a stale cached page
+        async with self._poll_lock:
+            events = await self.call(self.service.poll_changes)
+            if events:
+                await self.feed.publish(events)
+
+    # ---- connections ----
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                with perf.span(f"api.{request.method} {request.path.split('/')[1] or '/'}"):
+                    status, payload = await self._dispatch(request)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        except HttpError as e:
+            await self._respond(writer, e.status, {"error": str(e)}, False)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Bad request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HttpError(400, "Bad Content-Length")
+        if length > MAX_BODY:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return Request(method.upper(), target, headers, body)
+
+    async def _dispatch(self, request):
+        allowed = []
+        for method, pattern, handler in ROUTES:
+            match = pattern.match(request.path)
+            if not match:
+                continue
+            if method != request.method:
+                allowed.append(method)
+                continue
+            try:
+                return await handler(self, request, *match.groups())
+            except HttpError as e:
+                return e.status, {"error": str(e), "field": e.field}
+            except ValidationError as e:
+                return 400, {"error": str(e), "field": e.field}
+            except Exception as e:
+                print(f"❌ {request.method} {request.path}: {e!r}", file=sys.stderr)
+                return 500, {"error": str(e)}
+        if allowed:
+            return 405, {"error": f"Use {', '.join(allowed)}"}
+        return 404, {"error": f"No route for {request.path}"}
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        reason = HTTPStatus(status).phrase
+        headers = [f"HTTP/1.1 {status} {reason}",
+                   "Connection: " + ("keep-alive" if keep_alive else "close")]
+        if isinstance(payload, FileResponse):
+            try:
+                size = os.path.getsize(payload.path)
+                headers += [f"Content-Type: {payload.content_type}",
+                            f"Content-Length: {size}",
+                            f'Content-Disposition: attachment; filename="{payload.filename}"']
+                writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1"))
+                with open(payload.path, "rb") as f:
+                    while True:
+                        chunk = f.read(FILE_CHUNK)
+                        if not chunk:
+                            break
+                        writer.write(chunk)
+                        await writer.drain()
+            finally:
+                os.remove(payload.path)
+            return
+
+        body = to_json(payload)
+        headers += ["Content-Type: application/json; charset=utf-8", f"Content-Length: {len(body)}"]
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    # ---- filters ----
+    async def filter_from(self, request):
+        ranges = {
+            column: (request.arg(f"min_{column}"), request.arg(f"max_{column}"))
+            for column in RANGE_COLUMNS if request.arg(f"min_{column}") or request.arg(f"max_{column}")
+        }
+        products = request.query.get("product")
+        if products is not None:
+            products = [product for product in products if product]   # [""]: no product matches
+        flt = make_filter(
+            request.arg("start"), request.arg("end"),
+            products, request.arg("product_like"), request.arg("type"),
+            ranges, request.arg("sort")
+        )
+        keyword = request.arg("keyword")
+        if keyword:
+            flt.update(await self.call(self.service.product_filter, keyword))
+        return flt
+
+
+# ---------------- Routes ----------------
+def _filter_error(e):
+    return HttpError(400, f"Bad filter: {e}")
+
+
+def _cursor(request, side, flt):
+    # before_id / after_id, plus the row's sort value when the pages are sorted
+    trans_id = request.int_arg(f"{side}_id")
+    column, _ = sort_order(flt)
+    if trans_id is None or column == "id":
+        return trans_id
+    value = request.arg(f"{side}_value")
+    try:
+        if column == "date":
+            value = as_date(value)
+        elif column == "qty":
+            value = int(value)
+        elif column in ("rate", "amount"):
+            value = float(value)
+        elif value is None:
+            raise ValueError("missing")
+    except (TypeError, ValueError):
+        raise HttpError(400, f"{side}_value must be the cursor row's {column}", f"{side}_value")
+    return (value, trans_id)
+
+
+@route("GET", r"/health")
+async def health(server, request):
+    stats = await server.call(pool_stats)
+    return 200, {"ok": True, "instance": server.feed.instance, "seq": server.feed.seq, "pool": stats}
+
+
+@route("GET", r"/transactions")
+async def list_transactions(server, request):
+    try:
+        flt = await server.filter_from(request)
+    except ValueError as e:
+        raise _filter_error(e)
+    limit = min(max(1, request.int_arg("limit", PAGE_SIZE)), MAX_PAGE)
+    rows = await server.call(server.service.fetch_page, flt,
+                             _cursor(request, "before", flt), _cursor(request, "after", flt), limit)
+    return 200, {"rows": [row_json(row) for row in rows], "seq": server.feed.seq}
+
+
+@route("GET", r"/transactions/count")
+async def count_transactions(server, request):
+    try:
+        flt = await server.filter_from(request)
+    except ValueError as e:
+        raise _filter_error(e)
+    return 200, {"count": await server.call(server.service.count_rows, flt)}
+
+
+@route("GET", r"/transactions/(\d+)")
+async def get_transaction(server, request, trans_id):
+    row = await server.call(server.service.get_row, int(trans_id))
+    if row is None:
+        raise HttpError(404, f"Transaction {trans_id} nahi mili.")
+    return 200, {"row": row_json(row)}
+
+
+@route("POST", r"/transactions")
+async def create_transaction(server, request):
+    row, created = await server.call(server.service.create, request.json())
+    await server.sync_changes()
+    return (201 if created else 200), {"row": row_json(row), "created": created, "seq": server.feed.seq}
+
+
+@route("PUT", r"/transactions/(\d+)")
+async def update_transaction(server, request, trans_id):
+    row = await server.call(server.service.update, int(trans_id), request.json())
+    await server.sync_changes()
+    return 200, {"row": row_json(row), "seq": server.feed.seq}
+
+
+@route("DELETE", r"/transactions/(\d+)")
+async def delete_transaction(server, request, trans_id):
+    row = await server.call(server.service.delete, int(trans_id))
+    await server.sync_changes()
+    return 200, {"row": row_json(row), "seq": server.feed.seq}
+
+
+@route("GET", r"/dashboard")
+async def dashboard(server, request):
+    try:
+        totals = await server.call(server.service.dashboard,
+                                   request.arg("start"), request.arg("end"), request.arg("product"))
+    except ValueError as e:
+        raise _filter_error(e)
+    return 200, dict(totals_json(totals), seq=server.feed.seq)
+
+
+@route("GET", r"/products")
+async def products(server, request):
+    names = await server.call(server.service.search_products, request.arg("q", ""),
+                              request.int_arg("limit", 20))
+    return 200, {"products": names}
+
+
+EXPORT_FORMATS = {
+    "csv": (export_csv, ".csv", "text/csv"),
+    "csv.gz": (export_csv, ".csv.gz", "application/gzip"),
+    "xlsx": (export_xlsx, ".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def _temp_path(suffix):
+    handle, path = tempfile.mkstemp(prefix="inventory_", suffix=suffix)
+    os.close(handle)
+    return path
+
+
+@route("GET", r"/export")
+async def export(server, request):
+    fmt = request.arg("format", "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HttpError(400, f"format must be one of {', '.join(EXPORT_FORMATS)}", "format")
+    try:
+        flt = await server.filter_from(request)
+    except ValueError as e:
+        raise _filter_error(e)
+    writer, suffix, content_type = EXPORT_FORMATS[fmt]
+    path = _temp_path(suffix)
+    try:
+        await server.call(writer, path, flt)
+    except Exception:
+        os.remove(path)
+        raise
+    return 200, FileResponse(path, content_type, "transactions" + suffix)
+
+
+@route("GET", r"/report")
+async def report(server, request):
+    try:
+        start = parse_date(request.arg("start"))
+        end = parse_date(request.arg("end"))
+    except ValidationError as e:
+        raise HttpError(400, str(e), "start/end")
+    path = _temp_path(".pdf")
+    try:
+        await server.call(generate_report, path, start, end)
+    except Exception:
+        os.remove(path)
+        raise
+    return 200, FileResponse(path, "application/pdf", f"Inventory_Report_{start}_{end}.pdf")
+
+
+@route("GET", r"/changes")
+async def changes(server, request):
+    since = request.int_arg("since", 0)
+    timeout = min(max(0, request.int_arg("timeout", 25)), MAX_POLL_SECONDS)
+    feed = server.feed
+    if request.arg("instance", feed.instance) != feed.instance:
+        events = None   # the server restarted since the client's last poll
+    else:
+        events = await feed.wait(since, timeout)
+    if events is None or any(event["op"] == "reset" for event in events):
+        return 200, {"instance": feed.instance, "seq": feed.seq, "reset": True, "events": []}
+    return 200, {"instance": feed.instance, "seq": feed.seq, "reset": False, "events": events}
+
+
+@route("GET", r"/stats")
+async def stats(server, request):
+    extra = await server.call(server.service.stats)
+    return 200, {"perf": perf.snapshot(), **extra}
+
+
+# ---------------- Main ----------------
+async def serve(host=HOST, port=PORT):
+    server = await InventoryServer(host=host, port=port).start()
+    print(f"✅ Inventory API on http://{server.host}:{server.port} (feed {server.feed.instance})")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared HTTP/JSON API over the inventory database")
+    parser.add_argument("--host", default=HOST, help="bind address (default %(default)s, local only)")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--perf", action="store_true", help="collect timing histograms (GET /stats)")
+    args = parser.parse_args(argv)
+
+    if args.perf:
+        perf.enable()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,512 @@
+import os
+import pickle
+import importlib.util
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import date
+
+np = None  # numpy is imported on first sync / load (worker thread), not at app startup
+
+import paged_view
+from changes import GAP_WINDOW, Gaps, gaps_below, in_list, reader_name, report_position, pruned_floor
+from db import require_connection, get_pool
+from dashboard import DashboardTotals
+from filters import RANGE_COLUMNS, sort_order
+from paged_view import SELECT_COLUMNS, PAGE_SIZE
+
+
+# ================== Local Transaction Cache ==================
+# A column-per-array copy of the transactions table kept in this process:
+#
+#   ids / dates (ordinals) / qty / rate / amount   typed arrays
+#   product_codes / type_codes                     interned string codes
+#   alive                                          0 for deleted rows
+#
+# It syncs by delta: new rows via id > last_seen_id, updated / deleted rows
+# via the transaction_changes markers (schema v4); ids / markers that were
+# still uncommitted when a watermark passed them are re-read (changes.Gaps).
+# Filters, paging and dashboard totals are then answered with numpy over the
+# arrays, and the whole cache is pickled to a local file so warm starts only
+# fetch the delta.
+# Sorted views use a (column, id) permutation per column that is computed
+# once and then only merged with appended rows, not re-sorted per page.
+
+CACHE_FILE = os.environ.get("INVENTORY_CACHE_FILE", "transactions.cache")
+CACHE_FORMAT = 1
+SYNC_CHUNK = 50000
+
+
+def available():
+    # The cache is optional; without numpy everything goes to the DB
+    return importlib.util.find_spec("numpy") is not None
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+def _db_identity():
+    config = get_pool().config
+    if config["backend"] == "sqlite":
+        return f"sqlite:{os.path.abspath(config['sqlite_path'])}"
+    return f"mysql:{config['host']}:{config['port']}:{config['database']}"
+
+
+def _ordinal(value):
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+class TransactionCache:
+
+    ARRAYS = ("ids", "dates", "qty", "rate", "amount", "product_codes", "type_codes")
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.reader = reader_name("cache")
+        self.ready = False     # False until the first sync; queries fall back to SQL
+        self.stale = False     # set after local writes; next query syncs first
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.ids = array("q")
+        self.dates = array("i")
+        self.qty = array("q")
+        self.rate = array("d")
+        self.amount = array("d")
+        self.product_codes = array("i")
+        self.type_codes = array("i")
+        self.alive = bytearray()
+        self.alive_count = 0
+
+        self.products, self._product_codes = [], {}
+        self.types, self._type_codes = [], {}
+
+        self.last_seen_id = 0
+        self.last_change_id = 0
+        self.id_gaps = Gaps()       # row ids below last_seen_id not seen yet
+        self.change_gaps = Gaps()   # change_ids below last_change_id not seen yet
+
+        self._orders = {}       # column -> (positions in sort order, rows covered, epoch, names)
+        self._epoch = 0         # bumped when existing positions change value or move
+
+    # ---- interning ----
+    def _code(self, value, names, codes):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(names)
+            names.append(value)
+        return code
+
+    def _store(self, pos, row):
+        _, product, qty, trans_date, trans_type, rate, amount = row
+        self.dates[pos] = _ordinal(trans_date)
+        self.qty[pos] = int(qty)
+        self.rate[pos] = float(rate)
+        self.amount[pos] = float(amount)
+        self.product_codes[pos] = self._code(product, self.products, self._product_codes)
+        self.type_codes[pos] = self._code(trans_type, self.types, self._type_codes)
+
+    def _append(self, row):
+        for name in self.ARRAYS:
+            getattr(self, name).append(0)
+        self.alive.append(1)
+        self.alive_count += 1
+        pos = len(self.ids) - 1
+        self.ids[pos] = int(row[0])
+        self._store(pos, row)
+
+    def _insert(self, row):
+        # A row that committed after last_seen_id passed it: keep ids sorted
+        trans_id = int(row[0])
+        pos = bisect_left(self.ids, trans_id)
+        if pos < len(self.ids) and self.ids[pos] == trans_id:
+            return False
+        for name in self.ARRAYS:
+            getattr(self, name).insert(pos, 0)
+        self.alive.insert(pos, 1)
+        self.alive_count += 1
+        self.ids[pos] = trans_id
+        self._store(pos, row)
+        self._epoch += 1  # every later position moved
+        return True
+
+    def _position(self, trans_id):
+        # ids are appended in ascending order, so a binary search finds a row
+        pos = bisect_left(self.ids, trans_id)
+        if pos < len(self.ids) and self.ids[pos] == trans_id:
+            return pos
+        return None
+
+    # ---- sync ----
+    def sync(self):
+        # Pull the delta from the DB; returns {"added": n, "changed": n, "removed": n}
+        stats = {"added": 0, "changed": 0, "removed": 0}
+        _load_numpy()
+        conn = require_connection()
+        try:
+            with self._lock:
+                cursor = conn.cursor()
+
+                cursor.execute("SELECT MAX(change_id) FROM transaction_changes")
+                max_change = cursor.fetchone()[0] or 0
+                if max_change < self.last_change_id:
+                    self._reset()  # change log was reset -> different / rebuilt database
+                elif self.last_seen_id and self.last_change_id < pruned_floor(cursor):
+                    self._reset()  # markers this copy still needed were pruned
+
+                # 1) rows updated / deleted since the last sync (+ late markers)
+                late = self.change_gaps.due()
+                if max_change > self.last_change_id or late:
+                    extra, params = in_list("change_id", late)
+                    cursor.execute(
+                        "SELECT change_id, txn_id FROM transaction_changes "
+                        f"WHERE (change_id > %s AND change_id <= %s){extra}",
+                        tuple([self.last_change_id, max_change] + params)
+                    )
+                    markers = cursor.fetchall()
+                    seen = {int(change_id) for change_id, _ in markers}
+                    self.change_gaps.filled(seen)
+                    self.change_gaps.note(self.last_change_id, max_change, seen)
+                    changed = sorted({int(txn_id) for _, txn_id in markers if txn_id <= self.last_seen_id})
+                    for start in range(0, len(changed), 1000):
+                        self._apply_changes(cursor, changed[start:start + 1000], stats)
+                    self.last_change_id = max_change
+                    report_position(cursor, self.reader, max_change)
+                    conn.commit()
+
+                # IDs restart at 1 once the table is emptied (see clear_fields)
+                if self.alive_count == 0 and self.last_seen_id:
+                    self._reset()
+                    self.last_change_id = max_change
+                    self.change_gaps = gaps_below(cursor, "transaction_changes", "change_id",
+                                                  max_change, pruned_floor(cursor))
+
+                # 2) rows that committed below last_seen_id after it moved on
+                late = self.id_gaps.due()
+                if late:
+                    cursor.execute(
+                        f"SELECT {SELECT_COLUMNS} FROM transactions WHERE id IN ({', '.join(['%s'] * len(late))})",
+                        tuple(late)
+                    )
+                    rows = cursor.fetchall()
+                    self.id_gaps.filled(int(row[0]) for row in rows)
+                    stats["added"] += sum(self._insert(row) for row in rows)
+
+                # 3) new rows
+                seen_before = self.last_seen_id
+                while True:
+                    cursor.execute(
+                        f"SELECT {SELECT_COLUMNS} FROM transactions WHERE id > %s ORDER BY id LIMIT %s",
+                        (self.last_seen_id, SYNC_CHUNK)
+                    )
+                    rows = cursor.fetchall()
+                    for row in rows:
+                        self._append(row)
+                    if rows:
+                        self.last_seen_id = int(rows[-1][0])
+                        stats["added"] += len(rows)
+                    if len(rows) < SYNC_CHUNK:
+                        break
+                if self.last_seen_id > seen_before:
+                    window = bisect_left(self.ids, max(seen_before, self.last_seen_id - GAP_WINDOW) + 1)
+                    self.id_gaps.note(seen_before, self.last_seen_id, set(self.ids[window:]))
+
+                self.ready = True
+                self.stale = False
+        finally:
+            conn.close()
+        return stats
+
+    def _apply_changes(self, cursor, txn_ids, stats):
+        cursor.execute(
+            f"SELECT {SELECT_COLUMNS} FROM transactions WHERE id IN ({', '.join(['%s'] * len(txn_ids))})",
+            tuple(txn_ids)
+        )
+        current = {int(row[0]): row for row in cursor.fetchall()}
+
+        for txn_id in txn_ids:
+            pos = self._position(txn_id)
+            if pos is None or not self.alive[pos]:
+                continue
+            row = current.get(txn_id)
+            if row is None:
+                self.alive[pos] = 0
+                self.alive_count -= 1
+                stats["removed"] += 1
+            else:
+                self._store(pos, row)
+                self._epoch += 1
+                stats["changed"] += 1
+
+    def mark_stale(self):
+        self.stale = True
+
+    def _ensure_fresh(self):
+        if self.stale:
+            self.sync()
+
+    # ---- persistence ----
+    def save(self):
+        with self._lock:
+            if not self.ready:
+                return
+            self._compact()
+            state = {
+                "format": CACHE_FORMAT,
+                "identity": _db_identity(),
+                "last_seen_id": self.last_seen_id,
+                "last_change_id": self.last_change_id,
+                "id_gaps": self.id_gaps.pending,
+                "change_gaps": self.change_gaps.pending,
+                "products": self.products,
+                "types": self.types,
+                "alive": self.alive,
+            }
+            for name in self.ARRAYS:
+                state[name] = getattr(self, name)
+
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)  # never leave a half-written cache behind
+
+    def load_file(self):
+        # Warm start; returns True if a usable cache file was loaded
+        if not os.path.exists(self.path):
+            return False
+        _load_numpy()
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print("⚠️ Cache file unreadable, rebuilding:", e)
+            return False
+        if state.get("format") != CACHE_FORMAT or state.get("identity") != _db_identity():
+            return False
+
+        with self._lock:
+            self._reset()
+            for name in self.ARRAYS:
+                setattr(self, name, state[name])
+            self.alive = state["alive"]
+            self.alive_count = self.alive.count(1)
+            self.products = state["products"]
+            self.types = state["types"]
+            self._product_codes = {name: code for code, name in enumerate(self.products)}
+            self._type_codes = {name: code for code, name in enumerate(self.types)}
+            self.last_seen_id = state["last_seen_id"]
+            self.last_change_id = state["last_change_id"]
+            self.id_gaps = Gaps(state.get("id_gaps"))
+            self.change_gaps = Gaps(state.get("change_gaps"))
+        return True
+
+    def _compact(self):
+        # Drop deleted rows once they are a noticeable share of the arrays
+        dead = len(self.alive) - self.alive_count
+        if dead == 0 or dead < len(self.alive) // 10:
+            return
+        keep = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        for name in self.ARRAYS:
+            old = getattr(self, name)
+            kept = np.frombuffer(old, dtype=np.dtype(old.typecode))[keep]
+            new = array(old.typecode)
+            new.frombytes(kept.tobytes())
+            setattr(self, name, new)
+        self.alive = bytearray(b"\x01" * self.alive_count)
+        self._epoch += 1
+
+    # ---- vectorized queries ----
+    def _column(self, name, dtype):
+        return np.frombuffer(getattr(self, name), dtype=dtype)
+
+    def _codes_for(self, names, codes):
+        return [codes[name] for name in names if name in codes]
+
+    def _mask(self, flt):
+        flt = flt or {}
+        mask = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+
+        if "start" in flt or "end" in flt:
+            dates = self._column("dates", np.int32)
+            if "start" in flt:
+                mask &= dates >= flt["start"].toordinal()
+            if "end" in flt:
+                mask &= dates <= flt["end"].toordinal()
+
+        if "products" in flt:
+            codes = self._codes_for(flt["products"], self._product_codes)
+            mask &= np.isin(self._column("product_codes", np.int32), codes)
+
+        if "product_like" in flt:
+            keyword = flt["product_like"].lower()
+            codes = [code for code, name in enumerate(self.products) if keyword in name.lower()]
+            mask &= np.isin(self._column("product_codes", np.int32), codes)
+
+        if "trans_type" in flt:
+            codes = self._codes_for([flt["trans_type"]], self._type_codes)
+            mask &= np.isin(self._column("type_codes", np.int32), codes)
+
+        for column in RANGE_COLUMNS:
+            if f"min_{column}" in flt or f"max_{column}" in flt:
+                values = self._column(*self.SORT_ARRAYS[column])
+                if f"min_{column}" in flt:
+                    mask &= values >= flt[f"min_{column}"]
+                if f"max_{column}" in flt:
+                    mask &= values <= flt[f"max_{column}"]
+
+        return mask
+
+    # ---- sorting ----
+    # column -> (array, dtype); product / type are ranked by name, not by code
+    SORT_ARRAYS = {
+        "id": ("ids", "i8"),
+        "qty": ("qty", "i8"),
+        "date": ("dates", "i4"),
+        "rate": ("rate", "f8"),
+        "amount": ("amount", "f8"),
+        "product": ("product_codes", "i4"),
+        "transaction_type": ("type_codes", "i4"),
+    }
+    NAMED = {"product": "products", "transaction_type": "types"}
+
+    def _sort_keys(self, column):
+        values = self._column(*self.SORT_ARRAYS[column])
+        if column not in self.NAMED:
+            return values
+        names = getattr(self, self.NAMED[column])
+        ranks = np.empty(len(names), dtype=np.int64)
+        ranks[sorted(range(len(names)), key=names.__getitem__)] = np.arange(len(names))
+        return ranks[values]
+
+    def _sort_value(self, column, value):
+        # A cursor's sort value on the same scale as _sort_keys()
+        if column == "date":
+            return _ordinal(value)
+        if column not in self.NAMED:
+            return float(value)
+        ordered = sorted(getattr(self, self.NAMED[column]))
+        rank = bisect_left(ordered, value)
+        return rank if rank < len(ordered) and ordered[rank] == value else rank - 0.5
+
+    def _sorted_positions(self, column):
+        # All positions in (column, id) order.  Rows are appended in id
+        # order, so a stable argsort breaks ties by id; rows appended since
+        # the last call are merged in with one searchsorted instead.
+        size = len(self.ids)
+        names = len(getattr(self, self.NAMED[column])) if column in self.NAMED else 0
+        keys = self._sort_keys(column)
+        cached = self._orders.get(column)
+        if cached is not None and cached[2] == self._epoch and cached[3] == names:
+            order, covered = cached[0], cached[1]
+            if covered < size:
+                new = np.arange(covered, size)
+                new = new[np.argsort(keys[new], kind="stable")]
+                order = np.insert(order, np.searchsorted(keys[order], keys[new], side="right"), new)
+        else:
+            order = np.argsort(keys, kind="stable")
+        self._orders[column] = (order, size, self._epoch, names)
+        return order, keys
+
+    def _row(self, pos):
+        return (
+            self.ids[pos],
+            self.products[self.product_codes[pos]],
+            self.qty[pos],
+            date.fromordinal(self.dates[pos]),
+            self.types[self.type_codes[pos]],
+            self.rate[pos],
+            self.amount[pos],
+        )
+
+    # Same signatures as paged_view.fetch_page / count_rows, so the cache can
+    # be handed to PagedTreeView as its row source.
+    def fetch_page(self, flt=None, before_id=None, after_id=None, limit=PAGE_SIZE):
+        if not self.ready:
+            return paged_view.fetch_page(flt, before_id, after_id, limit)
+        with self._lock:
+            if before_id is None and after_id is None:
+                self._ensure_fresh()
+            column, descending = sort_order(flt)
+            if column != "id":
+                return self._fetch_sorted(flt, before_id, after_id, limit)
+
+            positions = np.flatnonzero(self._mask(flt))  # ascending id order
+            upwards = before_id is None and after_id is not None
+            cursor = before_id if before_id is not None else after_id
+            if cursor is None:
+                below, above = positions, positions
+            else:
+                ids = self._column("ids", np.int64)
+                below = positions[ids[positions] < cursor]
+                above = positions[ids[positions] > cursor]
+                del ids
+            # same walk as _fetch_sorted, with the id as the sort key
+            positions = below[-limit:][::-1] if descending != upwards else above[:limit]
+            if upwards:
+                positions = positions[::-1]
+            return [self._row(int(pos)) for pos in positions]
+
+    def _fetch_sorted(self, flt, before_id, after_id, limit):
+        column, descending = sort_order(flt)
+        order, keys = self._sorted_positions(column)
+        order = order[self._mask(flt)[order]]   # matching rows, ascending (column, id)
+
+        upwards = before_id is None and after_id is not None
+        cursor = before_id if before_id is not None else after_id
+        if cursor is None:
+            below, above = order, order
+        else:
+            value, trans_id = cursor
+            value = self._sort_value(column, value)
+            ordered_keys = keys[order]
+            low = int(np.searchsorted(ordered_keys, value, side="left"))
+            high = int(np.searchsorted(ordered_keys, value, side="right"))
+            ties = self._column("ids", np.int64)[order[low:high]]
+            below = order[:low + int(np.searchsorted(ties, trans_id, side="left"))]
+            above = order[low + int(np.searchsorted(ties, trans_id, side="right")):]
+
+        # below / above: ascending-order rows before / after the cursor
+        if descending != upwards:
+            positions = below[-limit:][::-1]
+        else:
+            positions = above[:limit]
+        if upwards:
+            positions = positions[::-1]
+        return [self._row(int(pos)) for pos in positions]
+
+    def count_rows(self, flt=None):
+        if not self.ready:
+            return paged_view.count_rows(flt)
+        with self._lock:
+            self._ensure_fresh()
+            return int(np.count_nonzero(self._mask(flt)))
+
+    def dashboard_totals(self, flt=None):
+        # DashboardTotals computed from the arrays (one bincount per measure)
+        totals = DashboardTotals()
+        with self._lock:
+            mask = self._mask(flt)
+            type_codes = self._column("type_codes", np.int32)[mask]
+            qty = self._column("qty", np.int64)[mask]
+            rate = self._column("rate", np.float64)[mask]
+            amount = self._column("amount", np.float64)[mask]
+            size = len(self.types)
+
+            counts = np.bincount(type_codes, minlength=size)
+            qty_sums = np.bincount(type_codes, weights=qty, minlength=size)
+            amount_sums = np.bincount(type_codes, weights=amount, minlength=size)
+            value_sums = np.bincount(type_codes, weights=qty * rate, minlength=size)
+
+            rows = [
+                (name, int(counts[code]), float(amount_sums[code]), int(qty_sums[code]), float(value_sums[code]))
+                for code, name in enumerate(self.types)
+            ]
+        totals.load_rows(rows)
+        return totals
@@ -0,0 +1,62 @@
+import math
+from datetime import date, datetime
+
+
+# ================== Transaction Validation ==================
+# Shared by the entry form (add_transaction) and the bulk importer, so both
+# accept exactly the same rows.
+
+TRANSACTION_TYPES = ("Sale", "Purchase")
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%m/%d/%y", "%Y/%m/%d")
+
+
+class ValidationError(ValueError):
+
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.field = field
+
+
+def validate_transaction(product, trans_type, qty, rate):
+    # Returns (product, trans_type, qty, rate) cleaned, or raises ValidationError
+    product = " ".join(str(product or "").split())   # catalog spelling: see catalog.canonical_names()
+    trans_type = str(trans_type or "").strip()
+
+    if not product:
+        raise ValidationError("product", "Product select/enter karo.")
+
+    if trans_type not in TRANSACTION_TYPES:
+        raise ValidationError("trans_type", "Transaction Type select karo (Sale / Purchase).")
+
+    try:
+        if isinstance(qty, float) and qty.is_integer():
+            qty = int(qty)  # spreadsheets store whole numbers as floats
+        qty = int(str(qty).strip())
+        if qty <= 0:
+            raise ValueError
+    except ValueError:
+        raise ValidationError("qty", "Quantity valid positive integer hona chahiye.")
+
+    try:
+        rate = float(str(rate).strip())
+        if not math.isfinite(rate) or rate <= 0:   # "nan" / "inf" parse as floats
+            raise ValueError
+    except ValueError:
+        raise ValidationError("rate", "Rate valid positive number hona chahiye.")
+
+    return product, trans_type, qty, rate
+
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+
+    text = str(value or "").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValidationError("date", f"Date samajh nahi aayi: {text!r}")
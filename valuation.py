@@ -0,0 +1,384 @@
+import os
+import sys
+import threading
+from collections import deque
+
+import archive
+from changes import (change_position, current_version, pruned_floor, reader_name, report_position,
+                     MAX_EVENTS, in_list)
+from db import require_connection
+from dashboard import _money
+from export import iter_transaction_chunks
+from filters import as_date
+from paged_view import SELECT_COLUMNS
+
+
+# ================== Stock Valuation ==================
+# Per-product stock quantity and cost, built by replaying transactions in
+# (date, id) order:
+#
+#   fifo      purchases are cost layers; a sale consumes the oldest first
+#   average   moving weighted-average cost per product
+#
+# A row that comes after a product's last replayed one (the usual case: a
+# new sale today) is applied in O(1) amortized.  A back-dated add, an edit
+# or a delete marks only that product dirty; it is replayed from its own
+# history on the next refresh().  Profit is then sales minus the cost of
+# the goods sold (COGS), and "Inventory Amt" the remaining stock at cost.
+#
+# Other writers are picked up from the change log (changes.py): refresh()
+# reads the markers since the last one it saw, adds the new rows and marks
+# the edited / deleted rows' products (old and new, schema v11) dirty.  The
+# whole history is replayed only the first time or when the log can't tell.
+#
+#   INVENTORY_VALUATION=fifo|average    (default fifo)
+#   python valuation.py [fifo|average]  print the per-product stock
+
+MODES = ("fifo", "average")
+MODE = os.environ.get("INVENTORY_VALUATION", "fifo").lower()
+CHUNK_SIZE = 5000
+
+HISTORY_SQL = f"SELECT {SELECT_COLUMNS} FROM transactions"
+
+
+def _sort_key(row):
+    return (as_date(str(row[3])[:10]), int(row[0]))
+
+
+class ProductStock:
+    # One product's running position.  Selling more than is in stock drives
+    # qty negative: the shortfall is costed at the last known unit cost and
+    # later purchases first cover it, then start new layers.
+
+    __slots__ = ("mode", "qty", "value", "cogs", "sales", "sold_qty", "last_cost", "last_key", "layers")
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.qty = 0
+        self.value = _money(0)        # stock at cost
+        self.cogs = _money(0)
+        self.sales = _money(0)        # sale amounts
+        self.sold_qty = 0
+        self.last_cost = _money(0)    # unit cost of the latest purchase
+        self.last_key = None          # (date, id) of the last replayed row
+        self.layers = deque()         # fifo: [qty, unit_cost], oldest first
+
+    def apply(self, trans_type, qty, rate, amount):
+        qty = int(qty)
+        if trans_type == "Purchase":
+            self._purchase(qty, _money(rate))
+        elif trans_type == "Sale":
+            self._sale(qty, _money(amount))
+
+    def _purchase(self, qty, unit_cost):
+        self.last_cost = unit_cost
+        if self.qty < 0:
+            # fills the shortfall; what it was costed at is trued up in COGS
+            covered = min(qty, -self.qty)
+            shortfall_cost = self.value / self.qty
+            self.cogs += _money(covered * (unit_cost - shortfall_cost))
+            self.qty += covered
+            self.value = _money(0) if self.qty == 0 else self.value + _money(covered * shortfall_cost)
+            qty -= covered
+        if qty <= 0:
+            return
+        self.qty += qty
+        self.value += qty * unit_cost
+        if self.mode == "fifo":
+            self.layers.append([qty, unit_cost])
+
+    def _sale(self, qty, amount):
+        self.sales += amount
+        self.sold_qty += qty
+        if self.mode == "fifo":
+            cost = _money(0)
+            remaining = qty
+            while remaining and self.layers:
+                layer = self.layers[0]
+                used = min(remaining, layer[0])
+                cost += used * layer[1]
+                layer[0] -= used
+                remaining -= used
+                if not layer[0]:
+                    self.layers.popleft()
+            cost += remaining * self.last_cost   # shortfall
+        elif self.qty > 0:
+            cost = _money(self.value * min(qty, self.qty) / self.qty) + max(0, qty - self.qty) * self.last_cost
+        else:
+            cost = qty * self.last_cost
+        self.qty -= qty
+        self.value = _money(0) if self.qty == 0 else self.value - cost
+        self.cogs += cost
+
+    def unit_cost(self):
+        if self.qty > 0:
+            return _money(self.value / self.qty)
+        return self.last_cost
+
+    def profit(self):
+        return self.sales - self.cogs
+
+
+class ValuationEngine:
+
+    def __init__(self, mode=MODE):
+        if mode not in MODES:
+            raise ValueError(f"valuation mode must be one of {', '.join(MODES)}")
+        self.mode = mode
+        self.ready = False
+        self.stale = False           # full replay on the next refresh
+        self.products = {}           # product -> ProductStock
+        self.dirty = set()           # products to replay from their history
+        self.max_id = 0
+        self.version = None          # change log position the products reflect
+        self.gaps = None             # change_ids below version not committed yet
+        self.reader = reader_name("valuation")
+        self._added = set()          # ids add()ed whose I marker sync() hasn't seen: skip it
+        self._backlog = []           # rows added while the first replay runs
+        self._touched = set()        # products changed while a replay runs
+        self._loading = False
+        self._lock = threading.RLock()
+        self._replaying = threading.Lock()   # one refresh() at a time
+
+    # ---- UI thread: keep it current ----
+    def add(self, row):
+        # New transaction (id, product, qty, date, type, rate, amount)
+        with self._lock:
+            if self._loading or not self.ready:
+                self._backlog.append(row)
+                return
+            self._apply(row)
+
+    def _apply(self, row):
+        trans_id, product, qty, trans_date, trans_type, rate, amount = row
+        self._added.add(int(trans_id))
+        if product in self.dirty:
+            self._touched.add(product)
+            return
+        key = _sort_key(row)
+        stock = self.products.get(product)
+        if stock is None:
+            stock = self.products[product] = ProductStock(self.mode)
+        if stock.last_key is not None and key <= stock.last_key:
+            if key < stock.last_key:
+                self.dirty.add(product)    # back-dated: costs after it change too
+            return                         # == : already replayed (change watcher got there first)
+        stock.apply(trans_type, qty, rate, amount)
+        stock.last_key = key
+        self.max_id = max(self.max_id, int(trans_id))
+
+    def changed(self, *products):
+        # Edited / deleted rows of these products
+        with self._lock:
+            self.dirty.update(products)
+            self._touched.update(products)
+
+    def mark_stale(self):
+        self.stale = True
+
+    # ---- worker: replays ----
+    def refresh(self):
+        # Full replay the first time (or when stale), then only dirty products.
+        # A refresh that arrives while another one replays waits for it and
+        # then finds little or nothing left to do, instead of replaying too.
+        with self._replaying:
+            if self.ready and not self.stale and not self._loading:
+                self.sync()
+            if not self.ready or self.stale:
+                self.load()
+            elif self.dirty:
+                with self._lock:
+                    products = sorted(self.dirty)
+                self.rebuild(products)
+        return self.summary()
+
+    def sync(self):
+        # Other writers' rows since the last sync / load, from the change log
+        conn = require_connection()
+        try:
+            cursor = conn.cursor()
+            version = current_version(cursor)
+            late = self.gaps.due()
+            if version == self.version and not late:
+                return
+            if self.version is None or version < self.version or self.version < pruned_floor(cursor):
+                self.stale = True
+                return
+            extra, params = in_list("change_id", late)
+            cursor.execute(
+                "SELECT change_id, txn_id, op, product FROM transaction_changes "
+                f"WHERE (change_id > %s AND change_id <= %s){extra} LIMIT %s",
+                tuple([self.version, version] + params + [MAX_EVENTS + 1])
+            )
+            found = cursor.fetchall()
+            markers = [row[1:] for row in found]
+            if len(markers) > MAX_EVENTS or any(op in ("U", "D") and product is None
+                                                for _, op, product in markers):
+                self.stale = True   # bulk change, or pre-v11 markers without the old product
+                return
+
+            seen = {int(row[0]) for row in found}
+            self.gaps.filled(seen)
+            self.gaps.note(self.version, version, seen)
+            new_ids = {int(txn_id) for txn_id, op, _ in markers if op == "I"}
+            with self._lock:
+                inserted = sorted(new_ids - self._added)
+                self._added -= new_ids   # an add() whose marker is still late keeps its entry
+            edited = sorted({int(txn_id) for txn_id, op, _ in markers if op in ("U", "D")})
+            products = {product for _, op, product in markers if op in ("U", "D")}
+            rows = []
+            for ids, keep in ((inserted, True), (edited, False)):
+                for start in range(0, len(ids), 1000):
+                    chunk = ids[start:start + 1000]
+                    cursor.execute(HISTORY_SQL + f" WHERE id IN ({', '.join(['%s'] * len(chunk))})", tuple(chunk))
+                    for row in cursor.fetchall():
+                        if keep:
+                            rows.append(row)
+                        else:
+                            products.add(row[1])   # the product an edit moved the row to
+            report_position(cursor, self.reader, version)
+            conn.commit()
+        finally:
+            conn.close()
+
+        with self._lock:
+            self.changed(*products)
+            for row in sorted(rows, key=_sort_key):
+                self._apply(row)
+            self.version = version
+
+    def load(self):
+        with self._lock:
+            self._touched = set()
+            self._loading = True
+        version, gaps = change_position()   # rows written during the replay come back via sync()
+        products, max_id = {}, 0
+        for rows in iter_transaction_chunks(order_by="date, id", chunk_size=CHUNK_SIZE):
+            for row in rows:
+                product = row[1]
+                stock = products.get(product)
+                if stock is None:
+                    stock = products[product] = ProductStock(self.mode)
+                stock.apply(row[4], row[2], row[5], row[6])
+                stock.last_key = _sort_key(row)
+                max_id = max(max_id, int(row[0]))
+
+        with self._lock:
+            self.products = products
+            self.max_id = max_id
+            self.version = version
+            self.gaps = gaps
+            self._added.clear()
+            self.dirty = set(self._touched)   # changed while the replay ran
+            self.ready = True
+            self.stale = False
+            self._loading = False
+            backlog, self._backlog = self._backlog, []
+            for row in backlog:
+                if int(row[0]) > max_id:
+                    self._apply(row)
+
+    def rebuild(self, products):
+        with self._lock:
+            self._touched.difference_update(products)
+        conn = require_connection()
+        try:
+            for product in products:
+                cursor = conn.cursor()
+                cursor.execute(HISTORY_SQL + " WHERE product_id = (SELECT id FROM products WHERE name = %s)",
+                               (product,))
+                rows = cursor.fetchall()
+                cursor.close()
+                rows += list(archive.iter_archived_rows({"products": [product]}))
+                rows.sort(key=_sort_key)
+
+                stock = ProductStock(self.mode)
+                for row in rows:
+                    stock.apply(row[4], row[2], row[5], row[6])
+                    stock.last_key = _sort_key(row)
+
+                with self._lock:
+                    if product in self._touched:
+                        continue  # changed again while replaying: stays dirty
+                    if stock.last_key is None:
+                        self.products.pop(product, None)
+                    else:
+                        self.products[product] = stock
+                    self.dirty.discard(product)
+        finally:
+            conn.close()
+
+    # ---- results ----
+    def stock(self, product):
+        with self._lock:
+            return self.products.get(product)
+
+    def rows(self):
+        # [(product, qty, unit_cost, value, cogs, profit)] sorted by product
+        with self._lock:
+            return [
+                (product, s.qty, s.unit_cost(), s.value, s.cogs, s.profit())
+                for product, s in sorted(self.products.items())
+            ]
+
+    def summary(self):
+        with self._lock:
+            stocks = list(self.products.values())
+        sales = sum((s.sales for s in stocks), _money(0))
+        cogs = sum((s.cogs for s in stocks), _money(0))
+        return {
+            "mode": self.mode,
+            "stock_qty": sum(s.qty for s in stocks),
+            "stock_value": sum((s.value for s in stocks), _money(0)),
+            "sales": sales,
+            "cogs": cogs,
+            "gross_profit": sales - cogs,
+        }
+
+
+# ---------------- Stock window ----------------
+STOCK_COLUMNS = ("Product", "SKU", "Stock Qty", "Reorder", "Unit Cost", "Stock Value", "COGS", "Profit")
+
+
+def show_stock_window(root, rows, summary, catalog=None, on_edit=None):
+    # rows / summary as returned by ValuationEngine.rows() / summary();
+    # catalog (catalog.ProductCatalog) adds SKU / reorder level and marks
+    # products at or below it; double-click calls on_edit(product, window)
+    from tkinter import Toplevel, Label, ttk
+
+    window = Toplevel(root)
+    window.title(f"Stock Valuation ({summary['mode'].upper()})")
+    window.geometry("900x420")
+
+    table = ttk.Treeview(window, columns=STOCK_COLUMNS, show="headings", height=15)
+    for column in STOCK_COLUMNS:
+        table.heading(column, text=column)
+        table.column(column, width=200 if column == "Product" else 95, anchor="w" if column in ("Product", "SKU") else "e")
+    table.tag_configure("low", background="#ffd6d6")
+    for product, qty, unit_cost, value, cogs, profit in rows:
+        entry = catalog.get(product) if catalog is not None else None
+        sku = entry.sku if entry is not None and entry.sku else ""
+        reorder = entry.reorder_level if entry is not None else 0
+        tags = ("low",) if reorder and qty <= reorder else ()
+        table.insert("", "end", tags=tags, values=(
+            product, sku, qty, reorder or "", f"{unit_cost:.2f}", f"{value:.2f}", f"{cogs:.2f}", f"{profit:.2f}"
+        ))
+    table.pack(fill="both", expand=True, padx=8, pady=(8, 4))
+    if on_edit is not None:
+        table.bind("<Double-1>", lambda event: table.focus() and on_edit(table.item(table.focus(), "values")[0], window))
+
+    Label(window, font=("Arial", 10, "bold"), anchor="w", text=(
+        f"Stock: {summary['stock_qty']} pcs, ₹ {summary['stock_value']:.2f} at cost   |   "
+        f"Sales ₹ {summary['sales']:.2f} - COGS ₹ {summary['cogs']:.2f} = Profit ₹ {summary['gross_profit']:.2f}"
+    )).pack(fill="x", padx=8, pady=(0, 8))
+    return window
+
+
+if __name__ == "__main__":
+    engine = ValuationEngine(sys.argv[1] if len(sys.argv) > 1 else MODE)
+    summary = engine.refresh()
+    print(f"{'Product':<30}{'Qty':>10}{'Unit cost':>12}{'Value':>14}{'COGS':>14}{'Profit':>14}")
+    for product, qty, unit_cost, value, cogs, profit in engine.rows():
+        print(f"{product[:29]:<30}{qty:>10}{unit_cost:>12.2f}{value:>14.2f}{cogs:>14.2f}{profit:>14.2f}")
+    print(f"\n{summary['mode'].upper()}: stock {summary['stock_qty']} pcs = ₹ {summary['stock_value']:.2f}, "
+          f"COGS ₹ {summary['cogs']:.2f}, gross profit ₹ {summary['gross_profit']:.2f}")
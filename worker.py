@@ -0,0 +1,158 @@
+import time
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import perf
+
+
+# ================== Background Worker ==================
+# Runs DB queries, exports and report generation on a small thread pool so
+# the Tk mainloop never waits on I/O.  Results are queued and handed back to
+# the UI thread by a root.after() poll, so callbacks may touch widgets.
+
+class Task:
+
+    def __init__(self, key, quiet=False):
+        self.key = key
+        self.name = key
+        self.quiet = quiet      # background chores (polls) don't show the busy label
+        self.submitted = time.perf_counter()
+        self.future = None
+        self.cancelled = False
+
+    def cancel(self):
+        # Work that already started cannot be interrupted, but its result is dropped
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+
+class BackgroundWorker:
+
+    def __init__(self, root, max_workers=4, busy_label=None, busy_text="⏳ Working...", poll_ms=30):
+        self.root = root
+        self.busy_label = busy_label
+        self.busy_text = busy_text
+        self.poll_ms = poll_ms
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-worker")
+        self._results = queue.Queue()
+        self._posts = queue.Queue()     # UI callbacks posted from worker threads
+        self._latest = {}    # key -> newest Task, older ones are superseded
+        self._pending = 0
+        self._quiet = 0
+        self._lock = threading.Lock()
+        self._polling = False
+        self._shown = None
+
+    # ---- submit from the UI thread ----
+    def submit(self, func, *args, on_done=None, on_error=None, key=None, quiet=False):
+        task = Task(key, quiet)
+        task.name = getattr(func, "__name__", None) or key or "job"
+        if key is not None:
+            previous = self._latest.get(key)
+            if previous is not None:
+                previous.cancel()
+            self._latest[key] = task
+
+        with self._lock:
+            self._pending += 1
+            self._quiet += quiet
+        self._show_busy()
+
+        task.future = self._executor.submit(self._run, task, func, args, on_done, on_error)
+        task.future.add_done_callback(lambda f: self._on_future_cancelled(f, task))
+        self._start_polling()
+        return task
+
+    def cancel(self, key):
+        task = self._latest.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def post(self, callback, *args):
+        # Thread-safe: run callback(*args) on the UI thread, e.g. progress updates
+        self._posts.put((callback, args))
+
+    def busy(self):
+        with self._lock:
+            return self._pending > self._quiet
+
+    def shutdown(self):
+        for task in list(self._latest.values()):
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ---- worker thread ----
+    def _run(self, task, func, args, on_done, on_error):
+        if task.cancelled:
+            self._results.put((task, None, None))
+            return
+        started = time.perf_counter()
+        perf.record("worker.queued", (started - task.submitted) * 1000)
+        try:
+            result = func(*args)
+        except Exception as e:
+            traceback.print_exc()
+            self._results.put((task, on_error, e))
+        else:
+            self._results.put((task, on_done, result))
+        finally:
+            perf.record(f"job.{task.name}", (time.perf_counter() - started) * 1000)
+
+    def _on_future_cancelled(self, future, task):
+        # Cancelled before it ever ran: _run() never reports back, so do it here
+        if future.cancelled():
+            self._results.put((task, None, None))
+
+    # ---- back on the UI thread ----
+    def _start_polling(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        while True:
+            try:
+                callback, args = self._posts.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception:
+                traceback.print_exc()
+
+        while True:
+            try:
+                task, callback, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            with self._lock:
+                self._pending -= 1
+                self._quiet -= task.quiet
+
+            if task.key is not None and self._latest.get(task.key) is task:
+                del self._latest[task.key]
+
+            if callback is None or task.cancelled:
+                continue
+            try:
+                with perf.span(f"ui.{getattr(callback, '__name__', 'callback')}"):
+                    callback(value)
+            except Exception:
+                traceback.print_exc()
+
+        self._show_busy()
+        if self._pending:
+            self.root.after(self.poll_ms, self._poll)
+        else:
+            self._polling = False
+
+    def _show_busy(self):
+        text = self.busy_text if self.busy() else ""
+        if self.busy_label is not None and text != self._shown:
+            self._shown = text
+            self.busy_label.config(text=text)